@@ -0,0 +1,187 @@
+"""
+In-process stand-ins for the model- and storage-backed components, so the API and
+benchmarks can run without model weights, a Chroma directory or network access.
+The LLM stand-in lives in the app itself: src.generation.providers.StubProvider.
+"""
+import re
+import time
+import zlib
+import threading
+from typing import List, Dict, Any, Optional, Union
+
+import numpy as np
+
+class HashingEmbedder:
+    """
+    Feature-hashing bag-of-words embedder with the same interface as MultimodalEmbedder.
+    Similar texts share tokens and therefore land close together.
+    """
+    def __init__(self, dim: int = 512, latency_s: float = 0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.model_name = f"hashing-{dim}"
+        self.device = "cpu"
+
+    def _vector(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            vec[zlib.crc32(token.encode()) % self.dim] += 1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def encode_text(self, texts: Union[str, List[str]]) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return np.stack([self._vector(t) for t in texts])
+
+    def encode_image(self, images) -> np.ndarray:
+        if not isinstance(images, list):
+            images = [images]
+        return np.stack([self._vector(str(img)) for img in images])
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluates the subset of Chroma's where-syntax used by the API ($and/$or, $eq/$ne/$in/$nin).
+    """
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, c) for c in cond):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            for op, expected in cond.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+    return True
+
+class InMemoryVectorStore:
+    """
+    Brute-force vector store exposing the ChromaManager methods the API relies on.
+    Distances are squared L2, matching Chroma's default space.
+    """
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.collection_name = "in_memory"
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._metadatas: List[Dict[str, Any]] = []
+        self._documents: List[str] = []
+
+    def add_embeddings(self, ids, embeddings, metadatas, documents, publish=True):
+        rows = []
+        for emb in embeddings:
+            if isinstance(emb, list) and emb and isinstance(emb[0], list):
+                emb = emb[0]
+            rows.append(np.asarray(emb, dtype=np.float32))
+        with self._lock:
+            stacked = np.stack(rows)
+            self._vectors = stacked if not len(self._ids) else np.vstack([self._vectors, stacked])
+            self._ids.extend(ids)
+            self._metadatas.extend(metadatas)
+            self._documents.extend(documents)
+
+    def publish(self) -> None:
+        # Nothing else shares the store
+        pass
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        with self._lock:
+            if not self._ids:
+                return {}
+            mask = np.array([_matches(m, where) for m in self._metadatas]) if where else np.ones(len(self._ids), bool)
+            candidates = np.flatnonzero(mask)
+            out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            for q in np.asarray(query_embeddings, dtype=np.float32):
+                dists = ((self._vectors[candidates] - q) ** 2).sum(axis=1)
+                order = candidates[np.argsort(dists)[:n_results]]
+                top = np.sort(dists)[:n_results]
+                out["ids"].append([self._ids[i] for i in order])
+                out["documents"].append([self._documents[i] for i in order])
+                out["metadatas"].append([self._metadatas[i] for i in order])
+                out["distances"].append([float(d) for d in top])
+            return out
+
+    def relevance_score(self, distance: float) -> float:
+        return 1.0 - distance / np.sqrt(2)
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        with self._lock:
+            index = {item_id: i for i, item_id in enumerate(self._ids)}
+            return {i: self._vectors[index[i]].tolist() for i in ids if i in index}
+
+    def get_items(self, ids: List[str] = None, where: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            wanted = set(ids) if ids else None
+            return {
+                item_id: {"content": self._documents[i], "metadata": self._metadatas[i]}
+                for i, item_id in enumerate(self._ids)
+                if (wanted is None or item_id in wanted) and _matches(self._metadatas[i], where)
+            }
+
+    def get_count(self) -> int:
+        return len(self._ids)
+
+def synthetic_corpus(store: InMemoryVectorStore, embedder: HashingEmbedder, questions: List[Dict[str, str]],
+                     chunks_per_source: int = 200, seed: int = 0) -> None:
+    """
+    Fills the store with text and image chunks for every expected source in the question set,
+    seeded with the questions' vocabulary so retrieval returns meaningful hits.
+    Chunks carry the same adjacency metadata as real ingestion (see src.ingestion.adjacency).
+    """
+    from src.ingestion.adjacency import link_chunks
+
+    rng = np.random.default_rng(seed)
+    vocabulary = sorted({w for q in questions for w in re.findall(r"[a-z]+", q["query"].lower())})
+    sources = sorted({q["expected_source"] for q in questions})
+    for source in sources:
+        topic = " ".join(q["query"] for q in questions if q["expected_source"] == source)
+        ids, texts, chunks = [], [], []
+        for i in range(chunks_per_source):
+            content_type = "image" if i % 10 == 0 else "text"
+            filler = " ".join(rng.choice(vocabulary, size=12))
+            text = f"{topic} {filler}" if i % 3 == 0 else filler
+            ids.append(f"{source}_{i}_{content_type}")
+            texts.append(text)
+            metadata = {
+                "source": f"sample_documents/{source}.pdf",
+                "page_number": int(i // 20) + 1,
+                "content_type": content_type,
+            }
+            if content_type == "image":
+                metadata["image_path"] = f"data/processed/images/{source}_{i}.png"
+                metadata["ocr_text"] = filler
+            chunks.append({"doc_id": source, "page": metadata["page_number"], "type": content_type,
+                           "content": text, "metadata": metadata})
+        link_chunks(chunks, ids)
+        store.add_embeddings(ids, embedder.encode_text(texts).tolist(), [c["metadata"] for c in chunks], texts)
+
+class FakeIngestionPipeline:
+    """
+    Accepts files like IngestionPipeline.process_file but only simulates the work.
+    """
+    def __init__(self, latency_s: float = 0.05, chunks_per_file: int = 10):
+        self.latency_s = latency_s
+        self.chunks_per_file = chunks_per_file
+
+    def process_file(self, file_path: str, publish: bool = True, max_new_chunks: int = None) -> int:
+        time.sleep(self.latency_s)
+        return self.chunks_per_file
@@ -0,0 +1,242 @@
+"""
+Concurrent asyncio load generator for the FastAPI service.
+
+Drives /query, /query with metadata filters and /ingest with a weighted mix, either
+closed-loop (fixed concurrency) or open-loop (fixed arrival rate, latency measured from
+the scheduled send time so a stalled server is not hidden by coordinated omission).
+
+    # Against a running server
+    python -m benchmarks.load_test --url http://localhost:8000 --concurrency 32 --duration 30
+
+    # Fully in-process: real FastAPI app, fake embedder / vector store / LLM / ingest
+    python -m benchmarks.load_test --in-process --rate 200 --concurrency 64 --llm-latency-ms 50
+
+    # Tenant isolation: a small tenant's query latency while a large tenant ingests
+    python -m benchmarks.load_test --tenant big --mix ingest=1 --concurrency 2 --duration 60 &
+    python -m benchmarks.load_test --tenant small --mix query=1 --retrieval-only --duration 60
+"""
+import json
+import time
+import logging
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+import httpx
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+FILTERS = [
+    {"content_type": "text"},
+    {"content_type": "image"},
+    {"content_type": {"$in": ["text", "table"]}},
+]
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """
+    "query=0.7,query_filtered=0.25,ingest=0.05" -> [(op, weight), ...]
+    """
+    mix = []
+    for part in spec.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in ("query", "query_filtered", "ingest"):
+            raise argparse.ArgumentTypeError(f"Unknown operation in mix: {op}")
+        mix.append((op, float(weight or 1)))
+    return mix
+
+class LimitedASGITransport(httpx.ASGITransport):
+    """
+    ASGITransport has no connection pool, so httpx.Limits don't apply to it: this caps the requests
+    in flight at limits.max_connections, as the pool does against a real server.
+    """
+    def __init__(self, app, limits: httpx.Limits):
+        super().__init__(app=app)
+        self._slots = asyncio.Semaphore(limits.max_connections) if limits.max_connections else None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._slots is None:
+            return await super().handle_async_request(request)
+        # The app runs to completion (body included) inside the call, so the slot covers the whole request
+        async with self._slots:
+            return await super().handle_async_request(request)
+
+def build_in_process_app(args, questions: List[Dict[str, str]]):
+    """
+    Imports the real FastAPI app and injects fakes so no models, Chroma or network are needed.
+    """
+    from benchmarks.fakes import HashingEmbedder, InMemoryVectorStore, FakeIngestionPipeline, synthetic_corpus
+    from src.api import main as api
+    from src.generation.generator import MultimodalGenerator
+    from src.generation.providers import StubProvider
+
+    embedder = HashingEmbedder(latency_s=args.embed_latency_ms / 1000)
+    store = InMemoryVectorStore(latency_s=args.search_latency_ms / 1000)
+    synthetic_corpus(store, embedder, questions, chunks_per_source=args.corpus_chunks)
+    api.init_components(
+        embedder=embedder,
+        vector_store=store,
+        generator=MultimodalGenerator(provider=StubProvider(latency_s=args.llm_latency_ms / 1000)),
+        ingestion_pipeline=FakeIngestionPipeline(latency_s=args.ingest_latency_ms / 1000),
+    )
+    print(f"[+] In-process app ready with {store.get_count()} synthetic chunks")
+    return api.app
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, op: str, latency: float, error: str = None) -> None:
+        self.samples.setdefault(op, []).append(latency)
+        if error:
+            op_errors = self.errors.setdefault(op, {})
+            op_errors[error] = op_errors.get(error, 0) + 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        def summarize(latencies: List[float], errors: Dict[str, int]) -> Dict[str, Any]:
+            n_errors = sum(errors.values())
+            arr = np.asarray(latencies) * 1000
+            return {
+                "requests": len(latencies),
+                "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+                "error_rate": n_errors / len(latencies) if latencies else 0.0,
+                "errors": errors,
+                "p50_ms": float(np.percentile(arr, 50)) if len(arr) else 0.0,
+                "p90_ms": float(np.percentile(arr, 90)) if len(arr) else 0.0,
+                "p99_ms": float(np.percentile(arr, 99)) if len(arr) else 0.0,
+                "max_ms": float(arr.max()) if len(arr) else 0.0,
+            }
+
+        all_latencies = [v for values in self.samples.values() for v in values]
+        all_errors: Dict[str, int] = {}
+        for op_errors in self.errors.values():
+            for k, v in op_errors.items():
+                all_errors[k] = all_errors.get(k, 0) + v
+        return {
+            "duration_s": elapsed,
+            "overall": summarize(all_latencies, all_errors),
+            "operations": {op: summarize(values, self.errors.get(op, {})) for op, values in sorted(self.samples.items())},
+        }
+
+async def send(client: httpx.AsyncClient, op: str, questions: List[Dict[str, str]], n_results: int,
+               retrieval_only: bool = False) -> httpx.Response:
+    if op == "ingest":
+        return await client.post("/ingest")
+    payload = {"query": random.choice(questions)["query"], "n_results": n_results, "retrieval_only": retrieval_only}
+    if op == "query_filtered":
+        payload["filters"] = random.choice(FILTERS)
+    return await client.post("/query", json=payload)
+
+async def run_request(client, op, questions, n_results, recorder: Recorder, scheduled_at: float,
+                      retrieval_only: bool = False) -> None:
+    error = None
+    try:
+        response = await send(client, op, questions, n_results, retrieval_only)
+        if response.status_code >= 400:
+            error = f"http_{response.status_code}"
+    except httpx.TimeoutException:
+        error = "timeout"
+    except httpx.HTTPError as e:
+        error = type(e).__name__
+    recorder.record(op, time.perf_counter() - scheduled_at, error)
+
+async def closed_loop(client, args, mix, questions, recorder: Recorder) -> None:
+    ops, weights = zip(*mix)
+    deadline = time.perf_counter() + args.duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            op = random.choices(ops, weights)[0]
+            await run_request(client, op, questions, args.n_results, recorder, time.perf_counter(), args.retrieval_only)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+async def open_loop(client, args, mix, questions, recorder: Recorder) -> None:
+    ops, weights = zip(*mix)
+    in_flight = asyncio.Semaphore(args.concurrency)
+    tasks = []
+    started = time.perf_counter()
+    n_requests = int(args.rate * args.duration)
+
+    async def fire(op, scheduled_at):
+        async with in_flight:
+            await run_request(client, op, questions, args.n_results, recorder, scheduled_at, args.retrieval_only)
+
+    for i in range(n_requests):
+        scheduled_at = started + i / args.rate
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire(random.choices(ops, weights)[0], scheduled_at)))
+    await asyncio.gather(*tasks)
+
+async def main_async(args) -> Dict[str, Any]:
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    mix = parse_mix(args.mix)
+    random.seed(args.seed)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    headers = {"X-Tenant-ID": args.tenant} if args.tenant else None
+    if args.in_process:
+        transport = LimitedASGITransport(build_in_process_app(args, questions), limits)
+        client = httpx.AsyncClient(transport=transport, base_url="http://in-process", timeout=timeout, headers=headers)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout, headers=headers)
+
+    recorder = Recorder()
+    async with client:
+        mode = f"open-loop {args.rate}/s" if args.rate else "closed-loop"
+        print(f"[*] Running {mode}, concurrency {args.concurrency}, {args.duration}s, mix {args.mix}")
+        started = time.perf_counter()
+        if args.rate:
+            await open_loop(client, args, mix, questions, recorder)
+        else:
+            await closed_loop(client, args, mix, questions, recorder)
+        elapsed = time.perf_counter() - started
+
+    report = recorder.report(elapsed)
+    report["config"] = {k: v for k, v in vars(args).items()}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the Multimodal RAG API.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:8000")
+    target.add_argument("--in-process", action="store_true", help="Run the app in-process with fake backends.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Workers (closed-loop) or max in-flight (open-loop).")
+    parser.add_argument("--rate", type=float, default=0.0, help="Target requests/sec; 0 = closed-loop.")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", default="query=0.7,query_filtered=0.25,ingest=0.05")
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--retrieval-only", action="store_true", help="Skip the LLM in /query (measures the serving path alone).")
+    parser.add_argument("--tenant", help="Send every request as this tenant (X-Tenant-ID).")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--questions", default=str(BENCH_DIR / "questions.json"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here.")
+    fakes = parser.add_argument_group("in-process fakes")
+    fakes.add_argument("--llm-latency-ms", type=float, default=50.0)
+    fakes.add_argument("--embed-latency-ms", type=float, default=2.0)
+    fakes.add_argument("--search-latency-ms", type=float, default=0.0)
+    fakes.add_argument("--ingest-latency-ms", type=float, default=20.0)
+    fakes.add_argument("--corpus-chunks", type=int, default=200, help="Synthetic chunks per source document.")
+    args = parser.parse_args()
+
+    # One INFO line per request would dominate the output and skew client-side timings
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps({k: v for k, v in report.items() if k != "config"}, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[+] Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
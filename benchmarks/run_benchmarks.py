@@ -0,0 +1,288 @@
+"""
+Offline benchmark and retrieval-quality suite over sample_documents.
+
+Runs against a throwaway vector store and a stubbed LLM, so no network or
+API key is needed (the CLIP and EasyOCR weights must already be cached locally).
+
+    python -m benchmarks.run_benchmarks --suite all
+    python -m benchmarks.run_benchmarks --suite retrieval --compare benchmarks/results/<previous>.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Dict, Any
+
+import numpy as np
+
+from src.generation.providers import StubProvider
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+
+# Everything below must work without network access
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": (sum(latencies) / len(latencies) * 1000) if latencies else 0.0,
+    }
+
+def stage_breakdown(registry) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregates rag_stage_duration_seconds by stage (+modality) from the metrics registry.
+    """
+    stages = {}
+    series = registry.snapshot()["histograms"].get("rag_stage_duration_seconds", {})
+    for labels, hist in series.items():
+        labels = dict(labels)
+        name = labels.pop("stage")
+        if labels:
+            name += "[" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "]"
+        stages[name] = {
+            "count": hist["count"],
+            "total_s": hist["sum"],
+            "mean_ms": hist["sum"] / hist["count"] * 1000 if hist["count"] else 0.0,
+        }
+    return dict(sorted(stages.items(), key=lambda kv: -kv[1]["total_s"]))
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def build_components(work_dir: Path, llm_latency_s: float):
+    # Point all persisted state at the scratch directory before components read their env
+    os.environ["VECTOR_DB_PATH"] = str(work_dir / "chroma")
+    os.environ["PROCESSED_DATA_PATH"] = str(work_dir / "processed")
+
+    from src.embeddings.model_loader import LangChainCLIPEmbeddings
+    from src.vector_store.chroma_manager import ChromaManager
+    from src.vector_store.table_store import TableStore
+    from src.retrieval.retriever import MultimodalRetriever
+    from src.generation.generator import MultimodalGenerator
+    from src.ingestion.pipeline import IngestionPipeline
+
+    clip_lc = LangChainCLIPEmbeddings()
+    vector_store = ChromaManager(embedding_function=clip_lc)
+    table_store = TableStore()
+    return SimpleNamespace(
+        embedder=clip_lc.embedder,
+        vector_store=vector_store,
+        pipeline=IngestionPipeline(clip_lc.embedder, vector_store, table_store=table_store),
+        retriever=MultimodalRetriever(clip_lc.embedder, vector_store, table_store=table_store),
+        generator=MultimodalGenerator(provider=StubProvider(latency_s=llm_latency_s)),
+    )
+
+def bench_ingest(components, docs_dir: str, registry) -> Dict[str, Any]:
+    from src.ingestion.pipeline import list_source_files
+
+    files = list_source_files(docs_dir)
+    registry.reset()
+    rss_before = current_rss_mb()
+    per_file = []
+    total_chunks = 0
+    started = time.perf_counter()
+    for file_path in files:
+        t0 = time.perf_counter()
+        n_chunks = components.pipeline.process_file(file_path)
+        per_file.append({"file": os.path.basename(file_path), "chunks": n_chunks, "seconds": time.perf_counter() - t0})
+        total_chunks += n_chunks
+    elapsed = time.perf_counter() - started
+
+    return {
+        "files": len(files),
+        "chunks": total_chunks,
+        "seconds": elapsed,
+        "files_per_sec": len(files) / elapsed if elapsed else 0.0,
+        "chunks_per_sec": total_chunks / elapsed if elapsed else 0.0,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stage_breakdown(registry),
+        "per_file": per_file,
+    }
+
+def load_questions(path: str) -> List[Dict[str, str]]:
+    """
+    Reads a question set: a JSON list of {"query", "expected_source"}, where expected_source is
+    matched against the file name of each retrieved item's source (see rank_of()).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    if not isinstance(questions, list) or not questions:
+        raise ValueError(f"{path}: expected a non-empty JSON list of questions")
+    for i, q in enumerate(questions):
+        if not isinstance(q, dict) or not q.get("query") or not q.get("expected_source"):
+            raise ValueError(f"{path}: question {i} needs a non-empty 'query' and 'expected_source'")
+    return questions
+
+def rank_of(results: List[Dict[str, Any]], expected_source: str) -> int:
+    for i, item in enumerate(results):
+        if expected_source in os.path.basename(str(item["metadata"].get("source", ""))):
+            return i + 1
+    return 0
+
+def bench_retrieval(components, questions: List[Dict[str, str]], k_values: List[int], repeats: int, registry) -> Dict[str, Any]:
+    max_k = max(k_values)
+    components.retriever.retrieve(questions[0]["query"], n_results=max_k)  # warm-up
+    registry.reset()
+
+    latencies, ranks = [], []
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for q in questions:
+            t0 = time.perf_counter()
+            results = components.retriever.retrieve(q["query"], n_results=max_k)
+            latencies.append(time.perf_counter() - t0)
+            if len(ranks) < len(questions):
+                ranks.append(rank_of(results, q["expected_source"]))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "queries": len(latencies),
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": latency_summary(latencies),
+        "recall": {f"recall@{k}": sum(1 for r in ranks if 0 < r <= k) / len(ranks) for k in k_values},
+        "mrr": sum(1 / r for r in ranks if r > 0) / len(ranks),
+        "misses": [q["query"] for q, r in zip(questions, ranks) if r == 0],
+        "stages": stage_breakdown(registry),
+    }
+
+def bench_e2e(components, questions: List[Dict[str, str]], n_results: int, repeats: int, registry) -> Dict[str, Any]:
+    registry.reset()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for q in questions:
+            t0 = time.perf_counter()
+            items = components.retriever.retrieve(q["query"], n_results=n_results)
+            if items:
+                components.generator.generate_answer(q["query"], items)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "queries": len(latencies),
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": latency_summary(latencies),
+        "stages": stage_breakdown(registry),
+    }
+
+# (section, key path, higher_is_better) pairs compared by --compare
+COMPARED_METRICS = [
+    ("ingest", ("files_per_sec",), True),
+    ("ingest", ("chunks_per_sec",), True),
+    ("ingest", ("peak_rss_mb",), False),
+    ("retrieval", ("qps",), True),
+    ("retrieval", ("latency", "p50_ms"), False),
+    ("retrieval", ("latency", "p99_ms"), False),
+    ("retrieval", ("recall", "recall@5"), True),
+    ("retrieval", ("mrr",), True),
+    ("e2e", ("qps",), True),
+    ("e2e", ("latency", "p99_ms"), False),
+]
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\n=== Compared to {baseline.get('commit')} ({baseline.get('timestamp')}) ===")
+    for section, path, higher_is_better in COMPARED_METRICS:
+        try:
+            new, old = current[section], baseline[section]
+            for key in path:
+                new, old = new[key], old[key]
+        except (KeyError, TypeError):
+            continue
+        change = ((new - old) / old * 100) if old else 0.0
+        regressed = (change < 0) if higher_is_better else (change > 0)
+        flag = "  <-- regression" if regressed and abs(change) >= 5 else ""
+        print(f"  {section}.{'.'.join(path):<22} {old:>10.3f} -> {new:>10.3f} ({change:+.1f}%){flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest / retrieval / end-to-end benchmarks.")
+    parser.add_argument("--suite", choices=["ingest", "retrieval", "e2e", "all"], default="all")
+    parser.add_argument("--docs", default=str(REPO_ROOT / "sample_documents"))
+    parser.add_argument("--questions", default=str(BENCH_DIR / "questions.json"))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the question set for latency stats.")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated stub LLM latency.")
+    parser.add_argument("--work-dir", help="Scratch dir for the index (default: a new temp dir).")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results"))
+    parser.add_argument("--compare", help="Previous results JSON to diff against.")
+    args = parser.parse_args()
+
+    from src.observability.metrics import registry
+
+    questions = load_questions(args.questions)
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="rag_bench_"))
+    print(f"[*] Benchmark scratch directory: {work_dir}")
+
+    components = build_components(work_dir, args.llm_latency_ms / 1000)
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "embedding_model": components.embedder.model_name,
+        "device": components.embedder.device,
+        "rss_after_model_load_mb": current_rss_mb(),
+    }
+
+    # Retrieval and e2e need an index, so they always ingest first (reported only if asked)
+    ingest = bench_ingest(components, args.docs, registry)
+    if args.suite in ("ingest", "all"):
+        results["ingest"] = ingest
+    if args.suite in ("retrieval", "all"):
+        results["retrieval"] = bench_retrieval(components, questions, args.k, args.repeats, registry)
+    if args.suite in ("e2e", "all"):
+        results["e2e"] = bench_e2e(components, questions, max(args.k), args.repeats, registry)
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{results['commit']}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    summary = {k: v for k, v in results.items() if not isinstance(v, dict)}
+    for section in ("ingest", "retrieval", "e2e"):
+        if section in results:
+            summary[section] = {k: v for k, v in results[section].items() if k not in ("stages", "per_file", "misses")}
+    print(json.dumps(summary, indent=2))
+    print(f"[+] Results written to {output_path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
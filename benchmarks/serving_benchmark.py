@@ -0,0 +1,172 @@
+"""
+Per-worker memory and aggregate query throughput of a multi-worker deployment (Linux only).
+
+Starts the API with N query workers against the index at VECTOR_DB_PATH, waits until every
+worker answers, samples the memory of the master and each worker, drives /query with
+load_test (retrieval-only by default, so the LLM is out of the picture) and samples again:
+serving dirties copy-on-write pages, so the second sample is the one that matters.
+
+    # Pre-fork: the gunicorn master loads CLIP once, workers share it (gunicorn.conf.py)
+    python -m benchmarks.serving_benchmark --mode gunicorn --workers 4
+    # Baseline: uvicorn's own process manager, every worker loads its own copy
+    python -m benchmarks.serving_benchmark --mode uvicorn --workers 4
+
+RSS counts shared pages in every process that maps them; PSS splits them between those
+processes, so the PSS total is the real footprint of the deployment. USS is what each
+process alone would give back on exit.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import List, Dict, Any
+
+import httpx
+
+from benchmarks.run_benchmarks import git_commit
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+
+def read_memory_mb(pid: int) -> Dict[str, float]:
+    fields: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss_mb": fields.get("Rss", 0) / 1024,
+        "pss_mb": fields.get("Pss", 0) / 1024,
+        "uss_mb": (fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024,
+    }
+
+def child_pids(parent: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid is the second field after it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent:
+            children.append(int(entry))
+    return sorted(children)
+
+def sample_memory(master: int, worker_pids: List[int]) -> Dict[str, Any]:
+    processes = {"master": read_memory_mb(master)}
+    for pid in worker_pids:
+        try:
+            processes[f"worker_{pid}"] = read_memory_mb(pid)
+        except OSError:
+            pass
+    workers = [v for k, v in processes.items() if k.startswith("worker_")]
+    return {
+        "processes": processes,
+        "worker_rss_mb_avg": sum(w["rss_mb"] for w in workers) / len(workers) if workers else 0.0,
+        "worker_pss_mb_avg": sum(w["pss_mb"] for w in workers) / len(workers) if workers else 0.0,
+        "total_rss_mb": sum(p["rss_mb"] for p in processes.values()),
+        "total_pss_mb": sum(p["pss_mb"] for p in processes.values()),
+    }
+
+def server_command(args) -> List[str]:
+    if args.mode == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", args.gunicorn_config, "--bind", f"127.0.0.1:{args.port}", "src.api.main:app"]
+    return [sys.executable, "-m", "uvicorn", "src.api.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+            "--workers", str(args.workers)]
+
+def wait_for_workers(url: str, workers: int, timeout: float) -> List[int]:
+    """
+    Polls /status until that many distinct worker PIDs have answered.
+    """
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            seen.add(httpx.get(f"{url}/status", timeout=5).json()["worker_pid"])
+            if len(seen) >= workers:
+                return sorted(seen)
+        except (httpx.HTTPError, KeyError, ValueError):
+            time.sleep(0.5)
+    raise TimeoutError(f"Only {len(seen)} of {workers} workers answered within {timeout:.0f}s")
+
+def run_load(url: str, args) -> Dict[str, Any]:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        report_path = f.name
+    command = [sys.executable, "-m", "benchmarks.load_test", "--url", url, "--mix", "query=1",
+               "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+               "--n-results", str(args.n_results), "--output", report_path]
+    if not args.with_llm:
+        command.append("--retrieval-only")
+    subprocess.run(command, cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL)
+    with open(report_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    os.unlink(report_path)
+    return report["overall"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory and aggregate QPS of multi-worker serving.")
+    parser.add_argument("--mode", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--with-llm", action="store_true", help="Include generation (needs a reachable LLM provider).")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--gunicorn-config", default=str(REPO_ROOT / "gunicorn.conf.py"))
+    parser.add_argument("--output", default=str(BENCH_DIR / "results"))
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, SERVING_ROLE="query", WEB_CONCURRENCY=str(args.workers))
+    print(f"[*] Starting {args.mode} with {args.workers} query workers on {url}")
+    server = subprocess.Popen(server_command(args), cwd=REPO_ROOT, env=env)
+    try:
+        answered = wait_for_workers(url, args.workers, args.startup_timeout)
+        # uvicorn's supervisor may also own helper processes; only count the ones serving requests
+        worker_pids = [pid for pid in child_pids(server.pid) if pid in answered]
+        idle = sample_memory(server.pid, worker_pids)
+        print(f"[*] Idle: {idle['worker_rss_mb_avg']:.0f} MB RSS / {idle['worker_pss_mb_avg']:.0f} MB PSS per worker, "
+              f"{idle['total_pss_mb']:.0f} MB PSS total")
+        load = run_load(url, args)
+        loaded = sample_memory(server.pid, worker_pids)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": args.mode,
+        "workers": args.workers,
+        "cpu_count": os.cpu_count(),
+        "concurrency": args.concurrency,
+        "retrieval_only": not args.with_llm,
+        "qps": load["throughput_rps"],
+        "qps_per_worker": load["throughput_rps"] / args.workers,
+        "load": load,
+        "memory_idle": idle,
+        "memory_after_load": loaded,
+    }
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"serving_{args.mode}_{args.workers}w_{results['commit']}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps({k: v for k, v in results.items() if k not in ("load", "memory_idle", "memory_after_load")}, indent=2))
+    print(f"[*] After load: {loaded['worker_rss_mb_avg']:.0f} MB RSS / {loaded['worker_pss_mb_avg']:.0f} MB PSS per worker, "
+          f"{loaded['total_pss_mb']:.0f} MB PSS total; p99 {load['p99_ms']:.1f} ms")
+    print(f"[+] Results written to {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Pre-fork serving for query workers:
+
+    SERVING_ROLE=query gunicorn -c gunicorn.conf.py src.api.main:app
+
+The master loads the CLIP weights once and forks WEB_CONCURRENCY workers that share them
+copy-on-write. Each worker opens its own read-only Chroma handle and LLM client on startup.
+Ingestion runs in a separate single process with SERVING_ROLE=ingest (see docker-compose.yml).
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Covers LLM_DEADLINE_S, so a slow generation isn't mistaken for a hung worker
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+def on_starting(server):
+    from src.api import main
+    main.preload_models()
+    # Objects loaded so far are never collected: keeps the GC from touching (and un-sharing) their pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Without this every worker runs one intra-op thread per core and they oversubscribe the CPU
+    import torch
+    torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS") or max(1, (os.cpu_count() or 1) // workers)))
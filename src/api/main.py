@@ -1,40 +1,268 @@
 import os
-import glob
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import time
+import uuid
+import json
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, ExitStack
+from fastapi import FastAPI, HTTPException, Request, Response, Header, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Literal
 from pathlib import Path
 from dotenv import load_dotenv
 
+from src.ingestion.pipeline import IngestionPipeline, IndexQuotaExceeded, list_source_files
 from src.ingestion.document_parser import PDFParser
-from src.ingestion.image_processor import ImageProcessor
+from src.ingestion.scheduler import IngestScheduler, IngestQueueFull
 from src.embeddings.model_loader import MultimodalEmbedder, LangChainCLIPEmbeddings
 from src.vector_store.chroma_manager import ChromaManager
+from src.vector_store.maintenance import CollectionMaintenance
+from src.vector_store.snapshot import iter_snapshot, import_snapshot
+from src.vector_store.table_store import TableStore, tables_path
+from src.vector_store.tenants import (
+    DEFAULT_TENANT, TenantPool, TenantNotFoundError, validate_tenant_id, tenant_paths, tenant_exists, list_tenants
+)
 from src.retrieval.retriever import MultimodalRetriever
 from src.generation.generator import MultimodalGenerator
+from src.generation.llm_client import LLMError, LLMTimeoutError, LLMUnavailableError
+from src.observability.metrics import registry, request_id_var
 
 # Load environment variables
 load_dotenv()
 
+# LOG_LEVEL=DEBUG also emits one JSON line per pipeline span on the "rag.trace" logger
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
 app = FastAPI(title="Multimodal RAG API (LangChain + Groq)", version="1.1.0")
 
+REQUEST_ID_HEADER = "X-Request-ID"
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Assigns a request ID (or propagates the caller's), echoes it back in the response
+    headers and records per-route latency and status counts.
+    """
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        # Label by route template, not raw path, to keep series cardinality bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        labels = {"method": request.method, "path": path}
+        elapsed = time.perf_counter() - started
+        registry.observe("rag_http_request_duration_seconds", elapsed, labels=labels)
+        registry.inc("rag_http_requests_total", labels={**labels, "status": status_code})
+        # Set by the tenant dependency once the tenant is known to exist, so IDs can't inflate the series
+        tenant_id = getattr(request.state, "tenant", None)
+        if tenant_id:
+            registry.observe("rag_tenant_request_duration_seconds", elapsed, labels={"tenant": tenant_id, "path": path})
+        request_id_var.reset(token)
+
 # --- Initialize Project Components ---
-# Using LangChain-compatible embedding wrapper
-clip_lc = LangChainCLIPEmbeddings()
-embedder = clip_lc.embedder # Keep access to the raw embedder for internal tasks
+# all: one process serves queries and ingests (default).
+# query: read-only index view and no ingestion pipeline (no EasyOCR); run several under gunicorn.conf.py.
+# ingest: the single writer next to query workers; every write publishes a new index generation.
+SERVING_ROLE = os.getenv("SERVING_ROLE", "all")
+if SERVING_ROLE not in ("all", "query", "ingest"):
+    raise ValueError(f"SERVING_ROLE must be one of all, query, ingest; got '{SERVING_ROLE}'")
+
+# Built on startup, or injected up-front via init_components() (e.g. fakes for in-process load tests)
+embedder = None
+vector_store = None
+retriever = None
+generator = None
+ingestion_pipeline = None
+table_store = None
+tenant_pool = None
+ingest_scheduler = None
+
+# Per-tenant quotas (0 = unlimited): chunks in a tenant's index, and /query requests a tenant may
+# have in flight in this process, so one busy tenant can't hold every threadpool thread
+TENANT_MAX_CHUNKS = int(os.getenv("TENANT_MAX_CHUNKS", "0"))
+TENANT_MAX_CONCURRENT_QUERIES = int(os.getenv("TENANT_MAX_CONCURRENT_QUERIES", "0"))
+
+registry.describe("rag_tenant_request_duration_seconds", "HTTP request latency by tenant and route.")
+registry.describe("rag_tenant_rejected_total", "Requests or files refused by a tenant quota.")
+registry.describe("rag_tenant_chunks", "Chunks in a tenant's index after its last ingested file.")
+
+class Tenant:
+    """
+    One tenant's index and the components built around it. The CLIP embedder, the OCR reader and
+    the LLM client are shared by every tenant; anything that holds tenant data is not.
+    """
+    def __init__(self, tenant_id: str, vector_store: Any, table_store: TableStore, retriever: MultimodalRetriever,
+                 ingestion_pipeline: Optional[IngestionPipeline], paths: Dict[str, str]):
+        self.id = tenant_id
+        self.vector_store = vector_store
+        self.table_store = table_store
+        self.retriever = retriever
+        self.ingestion_pipeline = ingestion_pipeline
+        self.paths = paths
+
+    def maintenance(self) -> CollectionMaintenance:
+        # Shares the pipeline's near-duplicate index, so deletes apply to the next ingest
+        dedup_index = getattr(getattr(self.ingestion_pipeline, "image_processor", None), "dedup_index", None)
+        return CollectionMaintenance(self.vector_store, table_store=self.table_store, processed_dir=self.paths["processed"],
+                                     dedup_index=dedup_index)
+
+    def close(self) -> None:
+        close = getattr(self.vector_store, "close", None)
+        if close:
+            close()
+
+def init_components(**overrides):
+    """
+    Builds the pipeline components. Any of embedder, vector_store, table_store, retriever, generator
+    or ingestion_pipeline passed as a keyword argument is used as-is instead of being built.
+    These make up the default tenant; other tenants are opened on first use (open_tenant()).
+    """
+    global embedder, vector_store, retriever, generator, ingestion_pipeline, table_store, tenant_pool, ingest_scheduler
+
+    read_only = SERVING_ROLE == "query"
+    # Reuses the weights from preload_models() when gunicorn loaded them before forking
+    embedder = overrides.get("embedder") or embedder or MultimodalEmbedder()
+    # Initialize Vector Store with the LangChain-compatible wrapper around the same CLIP model
+    vector_store = overrides.get("vector_store") or ChromaManager(
+        embedding_function=LangChainCLIPEmbeddings(embedder=embedder), read_only=read_only
+    )
+    table_store = overrides.get("table_store") or TableStore()
+    retriever = overrides.get("retriever") or MultimodalRetriever(embedder, vector_store, table_store=table_store)
+    generator = overrides.get("generator") or MultimodalGenerator()
+    ingestion_pipeline = overrides.get("ingestion_pipeline") or (
+        None if read_only else IngestionPipeline(embedder, vector_store, table_store=table_store)
+    )
 
-# Initialize Vector Store with LangChain wrapper
-vector_store = ChromaManager(embedding_function=clip_lc)
+    ingest_scheduler = IngestScheduler(ingest_file, on_drained=finish_ingest)
+    # A tenant with queued ingest work stays open: a reopened handle would be a second writer
+    tenant_pool = TenantPool(open_tenant, is_busy=ingest_scheduler.busy)
+    tenant_pool.pin(DEFAULT_TENANT, Tenant(DEFAULT_TENANT, vector_store, table_store, retriever, ingestion_pipeline,
+                                           tenant_paths(DEFAULT_TENANT)))
+
+def open_tenant(tenant_id: str) -> Tenant:
+    """
+    Builds a tenant's components on first use (the TenantPool opener). Its pipeline reuses the
+    default pipeline's OCR reader, so an extra tenant costs a Chroma handle, not another model.
+    """
+    paths = tenant_paths(tenant_id)
+    read_only = SERVING_ROLE == "query"
+    tenant_store = ChromaManager(
+        persist_directory=paths["vector_db"], collection_name=paths["collection"],
+        embedding_function=LangChainCLIPEmbeddings(embedder=embedder), read_only=read_only
+    )
+    tenant_tables = TableStore(tables_path(paths["processed"]))
+    tenant_pipeline = None
+    if not read_only:
+        ocr_reader = getattr(getattr(ingestion_pipeline, "image_processor", None), "reader", None)
+        parser = PDFParser(output_dir=paths["processed"], ocr_reader=ocr_reader)
+        tenant_pipeline = IngestionPipeline(embedder, tenant_store, pdf_parser=parser, table_store=tenant_tables)
+    print(f"[+] Opened tenant '{tenant_id}' (collection {paths['collection']})")
+    return Tenant(tenant_id, tenant_store, tenant_tables, MultimodalRetriever(embedder, tenant_store, table_store=tenant_tables),
+                  tenant_pipeline, paths)
 
-retriever = MultimodalRetriever(embedder, vector_store)
-generator = MultimodalGenerator()
-pdf_parser = PDFParser()
-image_processor = ImageProcessor()
+def preload_models():
+    """
+    Loads the CLIP weights in the gunicorn master (preload_app), so forked query workers share
+    one copy of them. Chroma and the LLM client are still built per worker on startup:
+    neither survives a fork.
+    """
+    global embedder
+    if embedder is None:
+        embedder = MultimodalEmbedder()
+
+def require_writer():
+    if SERVING_ROLE == "query":
+        raise HTTPException(status_code=403, detail="This worker only serves queries (SERVING_ROLE=query); send writes to the ingest worker.")
+
+TENANT_HEADER = "X-Tenant-ID"
+
+def resolve_tenant_id(request: Request, tenant_id: Optional[str], create: bool) -> str:
+    """
+    The tenant named by the X-Tenant-ID header (the default tenant without one): 400 for a malformed
+    ID, 404 for one that isn't allowed or, unless create is set, has no index yet.
+    """
+    try:
+        tenant_id = validate_tenant_id(tenant_id)
+    except TenantNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not create and tenant_pool.peek(tenant_id) is None and not tenant_exists(tenant_id):
+        raise HTTPException(status_code=404, detail=f"Tenant '{tenant_id}' has no index yet; ingest documents first.")
+    request.state.tenant = tenant_id
+    return tenant_id
+
+def get_tenant(request: Request, x_tenant_id: Optional[str] = Header(None)) -> Tenant:
+    return tenant_pool.get(resolve_tenant_id(request, x_tenant_id, create=False))
+
+def get_writable_tenant_id(request: Request, x_tenant_id: Optional[str] = Header(None)) -> str:
+    # The tenant is only opened (and its database created) once there is something to ingest
+    require_writer()
+    return resolve_tenant_id(request, x_tenant_id, create=True)
+
+_query_slots: Dict[str, threading.BoundedSemaphore] = {}
+_query_slots_lock = threading.Lock()
+
+@contextmanager
+def query_slot(tenant_id: str):
+    """
+    Holds one of the tenant's TENANT_MAX_CONCURRENT_QUERIES slots, or answers 429 at once: a tenant
+    over its share is told to back off instead of queueing on threads the other tenants need.
+    """
+    if not TENANT_MAX_CONCURRENT_QUERIES:
+        yield
+        return
+    with _query_slots_lock:
+        slots = _query_slots.setdefault(tenant_id, threading.BoundedSemaphore(TENANT_MAX_CONCURRENT_QUERIES))
+    if not slots.acquire(blocking=False):
+        registry.inc("rag_tenant_rejected_total", labels={"tenant": tenant_id, "reason": "query_concurrency"})
+        raise HTTPException(status_code=429, detail=f"Tenant '{tenant_id}' has {TENANT_MAX_CONCURRENT_QUERIES} queries in flight.",
+                            headers={"Retry-After": "1"})
+    try:
+        yield
+    finally:
+        slots.release()
+
+def index_full(tenant: Tenant) -> bool:
+    return bool(TENANT_MAX_CHUNKS) and tenant.vector_store.get_count() >= TENANT_MAX_CHUNKS
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+
+def bootstrap_from_snapshot():
+    """
+    Loads SNAPSHOT_PATH (file or URL) into an empty collection, so a fresh replica
+    serves immediately instead of re-running OCR and CLIP over every document.
+    """
+    if not SNAPSHOT_PATH or SERVING_ROLE == "query" or vector_store.get_count():
+        return
+    try:
+        import_snapshot(vector_store, SNAPSHOT_PATH, embedding_model=embedder.model_name)
+    except Exception as e:
+        print(f"[!] Snapshot bootstrap from {SNAPSHOT_PATH} failed, starting with an empty index: {e}")
+
+@app.on_event("startup")
+def load_components():
+    if retriever is None:
+        init_components()
+        bootstrap_from_snapshot()
 
 # --- Request/Response Models ---
 class QueryRequest(BaseModel):
     query: str
     n_results: Optional[int] = 5
+    filters: Optional[Dict[str, Any]] = None  # Chroma "where" clause, e.g. {"content_type": "image"}
+    retrieval_only: bool = False  # Skip the LLM: return ranked sources and snippets only
+    expand: Optional[Literal["off", "neighbors", "page"]] = None  # Context expansion, default RETRIEVAL_EXPAND
 
 class Source(BaseModel):
     document_id: str
@@ -42,158 +270,341 @@ class Source(BaseModel):
     content_type: str
     snippet: Optional[str] = None
     image_path: Optional[str] = None
+    score: Optional[float] = None
 
 class QueryResponse(BaseModel):
-    answer: str
+    answer: Optional[str] = None  # None in retrieval-only mode
     sources: List[Source]
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+    concurrency: Optional[int] = None  # Max concurrent LLM calls (capped by BATCH_MAX_CONCURRENCY)
+    stream: bool = False  # Stream NDJSON results in completion order
+
+class BatchQueryResult(BaseModel):
+    index: int
+    query: str
+    answer: Optional[str] = None
+    sources: List[Source] = []
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult]
+
+NO_CONTEXT_ANSWER = "No relevant context found in the database. Please ingest documents first."
+SNIPPET_CHARS = int(os.getenv("SNIPPET_CHARS", "300"))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "256"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
 # --- Helper Functions ---
-def process_single_file(file_path: str):
+def ingest_file(tenant_id: str, file_path: str):
     """
-    Orchestrates the ingestion, embedding, and indexing of a single file.
+    Orchestrates the ingestion, embedding, and indexing of a single file (on an IngestScheduler worker).
+    A file whose chunks don't fit in what is left of TENANT_MAX_CHUNKS is skipped before it is embedded,
+    so a large file can't take the index past its quota. The index is published once the job's last
+    file is done (finish_ingest()), not per file.
     """
-    ext = os.path.splitext(file_path)[1].lower()
-    chunks = []
-    
-    if ext == ".pdf":
-        chunks = pdf_parser.extract_content(file_path)
-    elif ext in [".png", ".jpg", ".jpeg"]:
-        processed = image_processor.process_image(file_path)
-        if processed:
-            chunks = [processed]
-    elif ext == ".txt":
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                chunks = [{
-                    "doc_id": os.path.basename(file_path),
-                    "page": 1,
-                    "type": "text",
-                    "content": content,
-                    "metadata": {
-                        "source": file_path,
-                        "page_number": 1,
-                        "content_type": "text"
-                    }
-                }]
-        except Exception as e:
-            print(f"[!] Error reading txt file {file_path}: {e}")
-    
-    if not chunks:
+    tenant = tenant_pool.get(tenant_id)
+    room = TENANT_MAX_CHUNKS - tenant.vector_store.get_count() if TENANT_MAX_CHUNKS else None
+    try:
+        if room is not None and room <= 0:
+            raise IndexQuotaExceeded(f"the index is at {TENANT_MAX_CHUNKS} chunks")
+        tenant.ingestion_pipeline.process_file(file_path, publish=False, max_new_chunks=room)
+    except IndexQuotaExceeded as e:
+        print(f"[!] Skipping {file_path}: tenant '{tenant_id}' is at its index quota: {e}")
+        registry.inc("rag_tenant_rejected_total", labels={"tenant": tenant_id, "reason": "index_quota"})
         return
+    registry.set("rag_tenant_chunks", tenant.vector_store.get_count(), labels={"tenant": tenant_id})
 
-    # Collect lists for batch addition
-    all_ids = []
-    all_embeddings = []
-    all_metadatas = []
-    all_documents = []
+def finish_ingest(tenant_id: str):
+    """
+    Publishes a new index generation once a tenant's queue is drained, so query workers
+    reopen the tenant's index once per ingest job rather than once per file.
+    """
+    tenant_pool.get(tenant_id).vector_store.publish()
 
-    print(f"[*] Encoding {len(chunks)} chunks for {os.path.basename(file_path)}...", flush=True)
-    
-    # Generate embeddings
-    for i, chunk in enumerate(chunks):
-        # Stable ID using file hash and index
-        chunk_id = f"{chunk['doc_id']}_{i}_{chunk['type']}_{chunk['page']}"
-        
-        # Determine content for embedding
-        if chunk["type"] == "image":
-            embedding = embedder.encode_image(chunk["content"]).tolist()
-            doc_text = chunk.get("ocr_text", f"Image from {chunk['doc_id']} page {chunk['page']}")
-        else:
-            embedding = embedder.encode_text(chunk["content"]).tolist()
-            doc_text = chunk["content"]
-
-        all_ids.append(chunk_id)
-        all_embeddings.append(embedding)
-        all_metadatas.append(chunk["metadata"])
-        all_documents.append(doc_text)
-        
-        if (i + 1) % 50 == 0:
-            print(f"  - Encoded {i + 1}/{len(chunks)} chunks...", flush=True)
-
-    # Final batch push to Chroma in smaller chunks of 50 to avoid timeouts/OOM
-    if all_ids:
-        batch_size = 50
-        print(f"[*] Pushing {len(all_ids)} items to ChromaDB for {os.path.basename(file_path)}...", flush=True)
-        for j in range(0, len(all_ids), batch_size):
-            end = min(j + batch_size, len(all_ids))
-            vector_store.add_embeddings(
-                ids=all_ids[j:end],
-                embeddings=all_embeddings[j:end],
-                metadatas=all_metadatas[j:end],
-                documents=all_documents[j:end]
-            )
-        print(f"[+] Finished indexing {os.path.basename(file_path)}", flush=True)
-    else:
-        print(f"[!] No content found to index for {os.path.basename(file_path)}", flush=True)
+def format_sources(items: List[Dict[str, Any]]) -> List[Source]:
+    """
+    Maps retrieved items (content, metadata, score) to API source references, in rank order.
+    """
+    return [
+        Source(
+            document_id=item["metadata"]["source"],
+            page_number=item["metadata"]["page_number"],
+            content_type=item["metadata"]["content_type"],
+            snippet=(item.get("content") or "")[:SNIPPET_CHARS] or None,
+            image_path=item["metadata"].get("image_path"),
+            score=item.get("score")
+        )
+        for item in items
+    ]
+
+def llm_http_error(error: LLMError) -> HTTPException:
+    """
+    Maps generation failures to HTTP: 503 (+Retry-After) when shed, 504 on deadline, 502 otherwise.
+    """
+    if isinstance(error, LLMUnavailableError):
+        headers = {"Retry-After": str(max(1, int(error.retry_after + 0.5)))} if error.retry_after else None
+        return HTTPException(status_code=503, detail=str(error), headers=headers)
+    if isinstance(error, LLMTimeoutError):
+        return HTTPException(status_code=504, detail=str(error))
+    return HTTPException(status_code=502, detail=str(error))
+
+def retrieve_batch_grouped(retriever: MultimodalRetriever, queries: List[QueryRequest]) -> List[Any]:
+    """
+    Runs batch retrieval with one encoder pass and one multi-vector search per distinct
+    filter/expansion pair (usually just one). Each query gets at most its own n_results items back,
+    or the exception its group failed with (e.g. a malformed filter), so one bad group doesn't fail the batch.
+    """
+    groups: Dict[str, List[int]] = {}
+    for i, q in enumerate(queries):
+        groups.setdefault(json.dumps([q.filters, q.expand], sort_keys=True), []).append(i)
+
+    retrieved: List[Any] = [[] for _ in queries]
+    for indices in groups.values():
+        group = [queries[i] for i in indices]
+        n_results = max(q.n_results or 5 for q in group)
+        try:
+            results = retriever.retrieve_batch([q.query for q in group], n_results=n_results, where=group[0].filters,
+                                               expand=group[0].expand)
+        except Exception as e:
+            print(f"[!] Batch retrieval failed for {len(indices)} queries: {e}")
+            for i in indices:
+                retrieved[i] = e
+            continue
+        for i, items in zip(indices, results):
+            retrieved[i] = items[:queries[i].n_results or 5]
+    return retrieved
 
 # --- Endpoints ---
 
 @app.get("/status")
-def get_status():
+def get_status(tenant: Tenant = Depends(get_tenant)):
     return {
         "status": "Ready",
-        "document_count": vector_store.get_count(),
-        "collection_name": "multimodal_rag"
+        "tenant": tenant.id,
+        "document_count": tenant.vector_store.get_count(),
+        "collection_name": tenant.paths["collection"],
+        "ingest_queue": ingest_scheduler.status(tenant.id)[tenant.id],
+        "serving_role": SERVING_ROLE,
+        "worker_pid": os.getpid(),
+        "llm_provider": generator.provider.name,
+        "llm_circuit": generator.client.breaker.state
     }
 
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, error and HTTP counters.
+    """
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 def read_root():
     return {"message": "Multimodal RAG System is running.", "status": "Ready"}
 
 @app.post("/ingest")
-async def ingest_documents(background_tasks: BackgroundTasks):
+def ingest_documents(tenant_id: str = Depends(get_writable_tenant_id)):
     """
-    Triggers ingestion of all documents in the sample_documents folder.
-    This runs as a background task.
+    Queues every document in the tenant's folder (RAW_DATA_PATH, or RAW_DATA_PATH/<tenant>) for
+    ingestion. Tenants' queues are drained in turns by the ingest workers (see IngestScheduler).
+    Answers 429 when the tenant's queue is full and 413 when its index is at TENANT_MAX_CHUNKS.
+    The tenant is held open from here until the scheduler has its files: from then on it stays
+    busy until the job is finished, so it is never evicted (and reopened) mid-job.
     """
-    raw_path = os.getenv("RAW_DATA_PATH", "./sample_documents")
-    files = glob.glob(os.path.join(raw_path, "*.*"))
-    
-    valid_files = [f for f in files if f.lower().endswith(('.pdf', '.png', '.jpg', '.jpeg', '.txt'))]
-    
+    raw_path = tenant_paths(tenant_id)["raw"]
+    valid_files = list_source_files(raw_path) if os.path.isdir(raw_path) else []
     if not valid_files:
         return {"status": "error", "message": f"No valid documents found in {raw_path}"}
 
-    for file in valid_files:
-        background_tasks.add_task(process_single_file, file)
+    with tenant_pool.hold(tenant_id) as tenant:
+        if index_full(tenant):
+            registry.inc("rag_tenant_rejected_total", labels={"tenant": tenant.id, "reason": "index_quota"})
+            raise HTTPException(status_code=413, detail=f"Tenant '{tenant.id}' is at its index quota ({TENANT_MAX_CHUNKS} chunks).")
+        try:
+            queued = ingest_scheduler.submit(tenant.id, valid_files)
+        except IngestQueueFull as e:
+            registry.inc("rag_tenant_rejected_total", labels={"tenant": tenant.id, "reason": "ingest_queue"})
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
         
     return {
         "status": "success", 
-        "message": f"Ingestion started for {len(valid_files)} files.",
+        "message": f"Ingestion queued for {len(queued)} files ({len(valid_files) - len(queued)} already waiting).",
+        "tenant": tenant.id,
         "files": [os.path.basename(f) for f in valid_files]
     }
 
 @app.post("/query", response_model=QueryResponse)
-async def query_rag(request: QueryRequest):
+def query_rag(request: QueryRequest, tenant: Tenant = Depends(get_tenant)):
     """
     Standard RAG endpoint: Retrieval -> Context Formatting -> Generation.
+    With retrieval_only=true the LLM is skipped and only ranked sources are returned.
+    Declared sync so FastAPI runs it in the threadpool and concurrent queries
+    don't serialize on the event loop while encoding or waiting on the LLM.
     """
-    # 1. Retrieval
-    relevant_items = retriever.retrieve(request.query, n_results=request.n_results)
-    
-    if not relevant_items:
-        return QueryResponse(
-            answer="No relevant context found in the database. Please ingest documents first.",
-            sources=[]
-        )
+    with query_slot(tenant.id):
+        # 1. Retrieval
+        relevant_items = tenant.retriever.retrieve(request.query, n_results=request.n_results, where=request.filters,
+                                                   expand=request.expand)
+        
+        if request.retrieval_only:
+            return QueryResponse(answer=None, sources=format_sources(relevant_items))
         
-    # 2. Generation
-    result = generator.generate_answer(request.query, relevant_items)
+        if not relevant_items:
+            return QueryResponse(
+                answer=NO_CONTEXT_ANSWER,
+                sources=[]
+            )
+            
+        # 2. Generation
+        try:
+            result = generator.generate_answer(request.query, relevant_items)
+        except LLMError as e:
+            raise llm_http_error(e)
     
     # 3. Format Sources
-    formatted_sources = []
-    for meta in result["sources"]:
-        formatted_sources.append(Source(
-            document_id=meta["source"],
-            page_number=meta["page_number"],
-            content_type=meta["content_type"],
-            image_path=meta.get("image_path")
-        ))
-        
     return QueryResponse(
         answer=result["answer"],
-        sources=formatted_sources
+        sources=format_sources(relevant_items)
+    )
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_rag_batch(request: BatchQueryRequest, tenant: Tenant = Depends(get_tenant)):
+    """
+    Bulk RAG endpoint for evaluation and offline workloads.
+    All queries are embedded in one forward pass and searched in one multi-vector query;
+    generation is then dispatched with bounded concurrency. A failing item (retrieval or
+    generation) is reported in its own "error" field without affecting the others. The batch
+    holds one of the tenant's query slots until its last answer is generated. With "stream": true,
+    results are sent as NDJSON lines as they complete (use "index" to restore order).
+    """
+    if not request.queries:
+        raise HTTPException(status_code=422, detail="'queries' must not be empty.")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"Batch too large: at most {BATCH_MAX_QUERIES} queries per request.")
+
+    slot = ExitStack()
+    slot.enter_context(query_slot(tenant.id))
+    try:
+        # 1. Batched retrieval (CPU/GPU bound, keep it off the event loop)
+        retrieved = await run_in_threadpool(retrieve_batch_grouped, tenant.retriever, request.queries)
+    except BaseException:
+        slot.close()
+        raise
+
+    # 2. Generation with bounded concurrency and per-item error isolation
+    limit = max(1, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(limit)
+
+    async def answer(index: int) -> BatchQueryResult:
+        query = request.queries[index].query
+        items = retrieved[index]
+        if isinstance(items, Exception):
+            return BatchQueryResult(index=index, query=query, error=f"Retrieval failed: {items}")
+        if request.queries[index].retrieval_only:
+            return BatchQueryResult(index=index, query=query, sources=format_sources(items))
+        if not items:
+            return BatchQueryResult(index=index, query=query, answer=NO_CONTEXT_ANSWER)
+        try:
+            async with semaphore:
+                result = await run_in_threadpool(generator.generate_answer, query, items)
+            return BatchQueryResult(index=index, query=query, answer=result["answer"], sources=format_sources(items))
+        except Exception as e:
+            print(f"[!] Batch item {index} failed: {e}")
+            return BatchQueryResult(index=index, query=query, sources=format_sources(items), error=str(e))
+
+    tasks = [asyncio.create_task(answer(i)) for i in range(len(request.queries))]
+    # Released once every item is answered or cancelled, whether or not a stream is still being read
+    asyncio.gather(*tasks, return_exceptions=True).add_done_callback(lambda _: slot.close())
+
+    if request.stream:
+        async def ndjson():
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield (await finished).model_dump_json() + "\n"
+            finally:
+                # Client went away: don't leave generation running for nobody
+                for task in tasks:
+                    task.cancel()
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    return BatchQueryResponse(results=await asyncio.gather(*tasks))
+
+# --- Maintenance (admin) endpoints ---
+# Safe while queries are served: see ChromaManager's locking. Set ADMIN_TOKEN to require X-Admin-Token.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token.")
+
+# Each operates on the tenant named by X-Tenant-ID (the default tenant without one).
+@app.get("/admin/stats", dependencies=[Depends(require_admin)])
+def admin_stats(tenant: Tenant = Depends(get_tenant)):
+    """
+    Chunks per document and modality, and on-disk size of the collection.
+    """
+    return tenant.maintenance().stats()
+
+@app.get("/admin/orphans", dependencies=[Depends(require_admin)])
+def admin_find_orphans(tenant: Tenant = Depends(get_tenant)):
+    """
+    Chunks whose source document or image file no longer exists, and unreferenced image files.
+    """
+    return tenant.maintenance().find_orphans()
+
+@app.delete("/admin/orphans", dependencies=[Depends(require_admin), Depends(require_writer)])
+def admin_delete_orphans(force: bool = False, tenant: Tenant = Depends(get_tenant)):
+    try:
+        return tenant.maintenance().delete_orphans(force=force)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.delete("/admin/documents/{document:path}", dependencies=[Depends(require_admin), Depends(require_writer)])
+def admin_delete_document(document: str, tenant: Tenant = Depends(get_tenant)):
+    """
+    Deletes every chunk of a document, given its stored source path or just its file name.
+    """
+    result = tenant.maintenance().delete_document(document)
+    if not result["sources"]:
+        raise HTTPException(status_code=404, detail=f"No indexed document matches '{document}'.")
+    return result
+
+@app.post("/admin/rebuild", dependencies=[Depends(require_admin), Depends(require_writer)])
+def admin_rebuild(tenant: Tenant = Depends(get_tenant)):
+    """
+    Compacts the collection into a fresh index and swaps it in. Queries keep being served;
+    ingestion waits until the rebuild is done.
+    """
+    return tenant.maintenance().rebuild()
+
+@app.get("/admin/tenants", dependencies=[Depends(require_admin)])
+def admin_tenants():
+    """
+    Every tenant with an index, whether this process has it open, and its ingest queue.
+    """
+    open_tenants = set(tenant_pool.open_tenants())
+    queues = ingest_scheduler.status()
+    return {
+        "max_open": tenant_pool.max_open,
+        "tenants": [
+            {"tenant": tenant_id, "collection": tenant_paths(tenant_id)["collection"], "open": tenant_id in open_tenants,
+             **queues.get(tenant_id, {"queued": 0, "active": None})}
+            for tenant_id in sorted(set(list_tenants()) | open_tenants)
+        ],
+    }
+
+@app.get("/admin/snapshot", dependencies=[Depends(require_admin)])
+def admin_export_snapshot(include_images: bool = False, tenant: Tenant = Depends(get_tenant)):
+    """
+    Streams a checksummed snapshot of the tenant's live index. A new replica can bootstrap from it
+    directly with SNAPSHOT_PATH=http://<host>/admin/snapshot.
+    """
+    return StreamingResponse(
+        iter_snapshot(tenant.vector_store, embedder.model_name, include_images=include_images,
+                      processed_dir=tenant.paths["processed"]),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": 'attachment; filename="index.ragsnap"'}
     )
 
 if __name__ == "__main__":
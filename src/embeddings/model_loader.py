@@ -12,6 +12,7 @@ class MultimodalEmbedder:
         :param model_name: Name of the pre-trained CLIP model.
         """
         print(f"[*] Loading Multimodal Embedding Model: {model_name}...")
+        self.model_name = model_name
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.model = SentenceTransformer(model_name, device=self.device)
         print(f"[+] Model loaded successfully on {self.device}")
@@ -27,15 +28,19 @@ class MultimodalEmbedder:
         embeddings = self.model.encode(texts, convert_to_tensor=True, show_progress_bar=False)
         return embeddings
 
-    def encode_image(self, image_paths: Union[str, Path, List[Union[str, Path]]]) -> torch.Tensor:
+    def encode_image(self, image_paths: Union[str, Path, Image.Image, List[Union[str, Path, Image.Image]]]) -> torch.Tensor:
         """
-        Generates embeddings for image files.
+        Generates embeddings for image files or already-decoded PIL images.
+        Passing the in-memory image from the ingestion normalizer avoids decoding again from disk.
         """
-        if isinstance(image_paths, (str, Path)):
+        if isinstance(image_paths, (str, Path, Image.Image)):
             image_paths = [image_paths]
             
         images = []
         for path in image_paths:
+            if isinstance(path, Image.Image):
+                images.append(path if path.mode == "RGB" else path.convert("RGB"))
+                continue
             try:
                 img = Image.open(path).convert("RGB")
                 images.append(img)
@@ -50,8 +55,9 @@ class MultimodalEmbedder:
         return embeddings
 
 class LangChainCLIPEmbeddings(Embeddings):
-    def __init__(self, model_name: str = "clip-ViT-B-32"):
-        self.embedder = MultimodalEmbedder(model_name)
+    def __init__(self, model_name: str = "clip-ViT-B-32", embedder: MultimodalEmbedder = None):
+        # Reuse an already-loaded embedder when given, so the CLIP weights are loaded once
+        self.embedder = embedder or MultimodalEmbedder(model_name)
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         # Map back to MultimodalEmbedder logic
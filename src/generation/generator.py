@@ -3,29 +3,32 @@ import base64
 from typing import List, Dict, Any
 from pathlib import Path
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, SystemMessage
+
+from src.generation.providers import LLMProvider, get_provider
+from src.generation.llm_client import ResilientLLMClient
+from src.observability.metrics import span
 
 # Load environment variables
 load_dotenv()
 
 class MultimodalGenerator:
-    def __init__(self, model_name: str = "meta-llama/llama-4-scout-17b-16e-instruct"):
+    def __init__(self, model_name: str = None, provider: LLMProvider = None, client: ResilientLLMClient = None):
         """
-        Initializes the generator using Groq via LangChain.
+        Initializes the generator on top of a pluggable LLM provider.
+        :param model_name: Model ID passed to the provider (defaults to the provider's own default).
+        :param provider: Pre-built provider; defaults to the one selected by LLM_PROVIDER
+                         (groq | openai | stub), see src/generation/providers.py.
+        :param client: Pre-built resilience layer around the provider (deadlines, retries,
+                       hedging, in-flight limit, circuit breaker); built from env by default.
         """
-        self.api_key = os.getenv("GROQ_API_KEY")
-        self.model_name = model_name
-        
-        if not self.api_key:
-            print("[!] Warning: GROQ_API_KEY not found in environment.")
-            
-        self.llm = ChatGroq(
-            model=self.model_name,
-            groq_api_key=self.api_key,
-            temperature=0.1
-        )
-        print(f"[+] Generator initialized for Groq: {self.model_name}")
+        if client is not None:
+            provider = client.provider
+        elif provider is None:
+            provider = get_provider(**({"model_name": model_name} if model_name else {}))
+        self.provider = provider
+        self.client = client or ResilientLLMClient(provider)
+        self.model_name = provider.model_name
+        print(f"[+] Generator initialized for {provider.name}: {self.model_name}")
 
     def _encode_image_to_base64(self, image_path: str) -> str:
         """
@@ -38,13 +41,10 @@ class MultimodalGenerator:
             print(f"[!] Error encoding image {image_path}: {e}")
             return ""
 
-    def generate_answer(self, query: str, context_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _build_messages(self, query: str, context_items: List[Dict[str, Any]]):
         """
-        Generates a grounded answer using Groq.
-        Note: If the model doesn't support vision, it uses the OCR text in the prompt.
+        Builds the system prompt and user content parts for a query and collects the source references.
         """
-        print(f"[*] Generating answer with Groq for query: '{query}'")
-        
         text_context = []
         image_contents = []
         source_refs = []
@@ -54,24 +54,27 @@ class MultimodalGenerator:
             source_refs.append(metadata)
             
             if metadata["content_type"] in ["text", "table"]:
-                text_context.append(f"Source ({metadata['source']}, Page {metadata['page_number']}):\n{item['content']}")
+                # Prefer the hit stitched with its neighbors (see MultimodalRetriever.expand)
+                text_context.append(f"Source ({metadata['source']}, Page {metadata['page_number']}):\n{item.get('context') or item['content']}")
             elif metadata["content_type"] == "image":
                 # For Groq Llama models (non-vision), we rely heavily on the OCR text we extracted
                 ocr_text = metadata.get("ocr_text", "No text in image")
-                text_context.append(f"Image Content (Source: {metadata['source']}, Page: {metadata['page_number']}):\n{ocr_text}")
+                caption = f"\nCaption: {item['context']}" if item.get("context") else ""
+                text_context.append(f"Image Content (Source: {metadata['source']}, Page: {metadata['page_number']}):\n{ocr_text}{caption}")
                 
-                # We still try to encode the image in case it's a vision model
-                img_b64 = self._encode_image_to_base64(metadata["image_path"])
-                if img_b64:
-                    image_contents.append({
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
-                    })
+                # Only read and encode the image file if the model can actually look at it
+                if self.provider.supports_vision:
+                    img_b64 = self._encode_image_to_base64(metadata["image_path"])
+                    if img_b64:
+                        image_contents.append({
+                            "type": "image_url",
+                            "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
+                        })
 
         context_str = "\n\n".join(text_context)
         
         # --- ULTIMATE RESEARCH PROMPT & GUARDRAILS ---
-        system_prompt = SystemMessage(content="""You are a world-class AI Research Assistant. Your mission is to provide expert-level technical analysis of seminal ML research papers.
+        system_prompt = """You are a world-class AI Research Assistant. Your mission is to provide expert-level technical analysis of seminal ML research papers.
 
 CORE OPERATIONAL RULES:
 1. FOCUS ON SEMINAL PAPERS: You specialize in papers like Attention Is All You Need, Adam, ImageNet (Russakovsky), ResNet, Dropout, Word2Vec, etc.
@@ -79,7 +82,7 @@ CORE OPERATIONAL RULES:
 3. ADAPTIVE CONTEXT: Use the provided context as your ground truth. If the context mentions a specific concept (like 'Adam weight update' or 'Transformer multi-head attention') but doesn't show the full equation, you MAY use your expert internal knowledge of those specific papers to provide the complete technical explanation, as long as it aligns perfectly with the paper's original work.
 4. GUARDRAILS: If the query is completely unrelated to AI/ML research (e.g., general life advice, non-AI coding, recipes), politely decline.
 5. CITATION: Always cite the paper and page number from the context.
-""")
+"""
 
         human_prompt = f"""CONTEXT FROM RESEARCH PAPERS (Text & Image OCR):
 {context_str}
@@ -94,30 +97,35 @@ TECHNICAL INSTRUCTIONS:
 
 Final Response:"""
 
-        # Build message elements for the HumanMessage
-        human_message_elements = [{"type": "text", "text": human_prompt}]
+        # Build content parts for the user message (images only for vision models)
+        human_content = [{"type": "text", "text": human_prompt}]
+        human_content.extend(image_contents)
+        
+        return system_prompt, human_content, source_refs
+
+    def generate_answer(self, query: str, context_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Generates a grounded answer using the configured provider.
+        Note: If the model doesn't support vision, it uses the OCR text in the prompt.
+        Raises LLMError (or its LLMTimeoutError / LLMUnavailableError subclasses) if no answer
+        could be produced, so callers can tell failures apart from answers.
+        """
+        print(f"[*] Generating answer with {self.provider.name} for query: '{query}'")
         
-        # Only add images if the model supports it. 
-        if "vision" in self.model_name.lower():
-            human_message_elements.extend(image_contents)
+        with span("prompt_build"):
+            system_prompt, human_content, source_refs = self._build_messages(query, context_items)
         
         try:
-            messages = [
-                system_prompt,
-                HumanMessage(content=human_message_elements)
-            ]
-            response = self.llm.invoke(messages)
-            
-            return {
-                "answer": response.content,
-                "sources": source_refs
-            }
+            with span("llm_call", provider=self.provider.name):
+                answer = self.client.complete(system_prompt, human_content)
         except Exception as e:
-            print(f"[!] Error generating with Groq: {e}")
-            return {
-                "answer": f"Error: Groq failed (Model: {self.model_name}). Check API Key and Model ID. Details: {str(e)}",
-                "sources": source_refs
-            }
+            print(f"[!] Error generating with {self.provider.name} (Model: {self.model_name}): {e}")
+            raise
+        
+        return {
+            "answer": answer,
+            "sources": source_refs
+        }
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,303 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Tuple
+
+import requests
+
+from src.generation.providers import LLMProvider
+from src.observability.metrics import registry
+
+registry.describe("rag_llm_attempts_total", "LLM attempts by outcome (ok, timeout, rate_limited, server_error, ...).")
+registry.describe("rag_llm_attempt_duration_seconds", "Latency of individual LLM attempts, including hedges.")
+registry.describe("rag_llm_retries_total", "LLM attempts retried after a retryable failure.")
+registry.describe("rag_llm_hedges_total", "Hedged LLM requests sent after the latency threshold.")
+registry.describe("rag_llm_hedge_wins_total", "Hedged LLM requests that finished before the original.")
+registry.describe("rag_llm_rejected_total", "LLM calls shed without reaching the provider.")
+registry.describe("rag_llm_in_flight", "LLM calls currently holding an in-flight slot.")
+registry.describe("rag_llm_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open.")
+
+class LLMError(RuntimeError):
+    """
+    Generation failed after the provider was reached (non-retryable error or retries exhausted).
+    """
+
+class LLMTimeoutError(LLMError):
+    """
+    The per-call deadline expired before any attempt succeeded.
+    """
+
+class LLMUnavailableError(LLMError):
+    """
+    The call was shed without reaching the provider (circuit open or too many calls in flight).
+    """
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def classify_error(exc: BaseException) -> Tuple[str, bool, Optional[float]]:
+    """
+    Maps a provider exception to (outcome label, retryable, server-requested Retry-After seconds).
+    Handles requests exceptions directly and SDK exceptions (Groq/httpx) by status code or name.
+    """
+    if isinstance(exc, (TimeoutError, requests.Timeout)):
+        return "timeout", True, None
+    if isinstance(exc, requests.ConnectionError):
+        return "connection_error", True, None
+
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status:
+        retry_after = None
+        headers = getattr(response, "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after")) if headers.get("retry-after") else None
+        except (TypeError, ValueError):
+            pass
+        if status == 429:
+            return "rate_limited", True, retry_after
+        if status >= 500:
+            return "server_error", True, retry_after
+        return "client_error", False, None
+
+    name = type(exc).__name__
+    if "Timeout" in name:
+        return "timeout", True, None
+    if "Connection" in name:
+        return "connection_error", True, None
+    return "error", False, None
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0, name: str = "llm"):
+        """
+        Opens after failure_threshold consecutive retryable failures and sheds calls for
+        reset_timeout_s. Then a single trial call is let through (half-open): success
+        closes the circuit, failure re-opens it.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        registry.set("rag_llm_circuit_state", 0, labels={"provider": name})
+
+    def _transition(self, state: str) -> None:
+        self._state = state
+        registry.set("rag_llm_circuit_state", self._STATE_VALUES[state], labels={"provider": self.name})
+        print(f"[!] LLM circuit for {self.name} is now {state}")
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout_s - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout_s:
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+class ResilientLLMClient:
+    def __init__(self, provider: LLMProvider, deadline_s: float = None, max_retries: int = None,
+                 backoff_base_s: float = None, backoff_max_s: float = None, hedge_after_s: float = None,
+                 max_in_flight: int = None, slot_wait_s: float = None, breaker: CircuitBreaker = None):
+        """
+        Wraps a provider with the policies every LLM call should have under load:
+        - a per-call deadline shared by all attempts (LLM_DEADLINE_S),
+        - retries with full-jitter exponential backoff, honoring Retry-After (LLM_MAX_RETRIES,
+          LLM_BACKOFF_BASE_MS, LLM_BACKOFF_MAX_MS),
+        - an optional hedged request if an attempt is slower than LLM_HEDGE_AFTER_MS (0 = off),
+        - a process-wide cap on concurrent calls (LLM_MAX_IN_FLIGHT); a call that gets no slot
+          within LLM_SLOT_WAIT_MS is shed instead of spending its deadline in the queue,
+        - a circuit breaker (LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_S).
+        """
+        self.provider = provider
+        self.deadline_s = deadline_s if deadline_s is not None else float(os.getenv("LLM_DEADLINE_S", "90"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.backoff_base_s = backoff_base_s if backoff_base_s is not None else float(os.getenv("LLM_BACKOFF_BASE_MS", "250")) / 1000
+        self.backoff_max_s = backoff_max_s if backoff_max_s is not None else float(os.getenv("LLM_BACKOFF_MAX_MS", "4000")) / 1000
+        self.hedge_after_s = hedge_after_s if hedge_after_s is not None else float(os.getenv("LLM_HEDGE_AFTER_MS", "0")) / 1000
+        self.max_in_flight = max_in_flight or int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+        self.slot_wait_s = slot_wait_s if slot_wait_s is not None else float(os.getenv("LLM_SLOT_WAIT_MS", "250")) / 1000
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout_s=float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+            name=provider.name
+        )
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        # Attempts run on worker threads so the deadline and hedging don't depend on the SDK honoring timeouts;
+        # a hedge can add one extra attempt per in-flight call
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight * 2, thread_name_prefix="llm")
+        self._labels = {"provider": provider.name}
+
+    def _track_in_flight(self, delta: int) -> None:
+        with self._in_flight_lock:
+            self._in_flight += delta
+            registry.set("rag_llm_in_flight", self._in_flight, labels=self._labels)
+
+    def _timed_attempt(self, system_prompt: str, human_content: List[Dict[str, Any]], timeout: float) -> str:
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return self.provider.complete(system_prompt, human_content, timeout=timeout)
+        except Exception as e:
+            outcome = classify_error(e)[0]
+            raise
+        finally:
+            registry.observe("rag_llm_attempt_duration_seconds", time.perf_counter() - started,
+                             labels={**self._labels, "outcome": outcome})
+
+    def _attempt(self, system_prompt: str, human_content: List[Dict[str, Any]], deadline: float,
+                 submitted: List[Future]) -> str:
+        """
+        One logical attempt: the primary request plus, if enabled and it is slow, one hedge.
+        Returns the first successful answer; raises the last error if all requests failed.
+        Every request started is appended to submitted, including ones abandoned at the deadline.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"LLM call exceeded the {self.deadline_s:.1f}s deadline before the attempt")
+        primary = self._executor.submit(self._timed_attempt, system_prompt, human_content, remaining)
+        submitted.append(primary)
+        pending = {primary}
+
+        if self.hedge_after_s and self.hedge_after_s < remaining:
+            done, _ = wait(pending, timeout=self.hedge_after_s)
+            if not done:
+                registry.inc("rag_llm_hedges_total", labels=self._labels)
+                hedge = self._executor.submit(self._timed_attempt, system_prompt, human_content,
+                                              deadline - time.monotonic())
+                submitted.append(hedge)
+                pending.add(hedge)
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        registry.inc("rag_llm_hedge_wins_total", labels=self._labels)
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"LLM attempt exceeded the {self.deadline_s:.1f}s deadline")
+
+    def _backoff(self, retry: int) -> float:
+        # Full jitter: spreads retries from many clients instead of synchronizing them
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** retry)))
+
+    def _release_after(self, requests: List[Future]) -> None:
+        """
+        Frees the call's in-flight slot once none of its requests is running any more. A request
+        abandoned at the deadline, or a hedge that lost, keeps going on the provider side: its slot
+        stays taken until it ends, so LLM_MAX_IN_FLIGHT bounds real concurrent requests.
+        """
+        running = [request for request in requests if not request.done()]
+        if not running:
+            self._track_in_flight(-1)
+            self._slots.release()
+            return
+        remaining = [len(running)]
+        lock = threading.Lock()
+
+        def finished(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            self._track_in_flight(-1)
+            self._slots.release()
+
+        for request in running:
+            request.add_done_callback(finished)
+
+    def complete(self, system_prompt: str, human_content: List[Dict[str, Any]]) -> str:
+        deadline = time.monotonic() + self.deadline_s
+        submitted: List[Future] = []
+
+        if not self._slots.acquire(timeout=min(self.slot_wait_s, self.deadline_s)):
+            registry.inc("rag_llm_rejected_total", labels={**self._labels, "reason": "saturated"})
+            raise LLMUnavailableError(f"{self.max_in_flight} LLM calls already in flight", retry_after=self.slot_wait_s)
+        self._track_in_flight(1)
+        try:
+            if deadline - time.monotonic() <= 0:
+                registry.inc("rag_llm_rejected_total", labels={**self._labels, "reason": "deadline"})
+                raise LLMTimeoutError(f"{self.provider.name} call spent its {self.deadline_s:.1f}s deadline waiting for a slot")
+            if not self.breaker.allow():
+                registry.inc("rag_llm_rejected_total", labels={**self._labels, "reason": "circuit_open"})
+                raise LLMUnavailableError(f"LLM circuit for {self.provider.name} is open", retry_after=self.breaker.retry_after())
+
+            for retry in range(self.max_retries + 1):
+                try:
+                    answer = self._attempt(system_prompt, human_content, deadline, submitted)
+                    registry.inc("rag_llm_attempts_total", labels={**self._labels, "outcome": "ok"})
+                    self.breaker.record_success()
+                    return answer
+                except Exception as e:
+                    outcome, retryable, retry_after = classify_error(e)
+                    registry.inc("rag_llm_attempts_total", labels={**self._labels, "outcome": outcome})
+                    if not retryable:
+                        # The provider answered, so it is healthy even if the request was bad
+                        self.breaker.record_success()
+                        raise LLMError(f"{self.provider.name} rejected the request: {e}") from e
+                    self.breaker.record_failure()
+
+                    delay = retry_after if retry_after is not None else self._backoff(retry)
+                    if time.monotonic() + delay >= deadline:
+                        raise LLMTimeoutError(f"{self.provider.name} did not answer within {self.deadline_s:.1f}s: {e}") from e
+                    if retry == self.max_retries:
+                        error_type = LLMTimeoutError if outcome == "timeout" else LLMError
+                        raise error_type(f"{self.provider.name} failed after {retry + 1} attempts: {e}") from e
+                    if not self.breaker.allow():
+                        raise LLMUnavailableError(f"LLM circuit for {self.provider.name} is open", retry_after=self.breaker.retry_after()) from e
+                    registry.inc("rag_llm_retries_total", labels=self._labels)
+                    time.sleep(delay)
+        finally:
+            self._release_after(submitted)
+
+if __name__ == "__main__":
+    # Quick sanity check
+    from src.generation.providers import StubProvider
+    client = ResilientLLMClient(StubProvider(latency_s=0.05), hedge_after_s=0.01)
+    print(client.complete("system", [{"type": "text", "text": "Hello"}]))
+    print(registry.render())
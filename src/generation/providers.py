@@ -0,0 +1,165 @@
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+class LLMProvider:
+    """
+    Interface for chat-completion backends used by MultimodalGenerator.
+    human_content is a list of OpenAI-style content parts:
+    {"type": "text", "text": ...} and, for vision models, {"type": "image_url", ...}.
+    Providers make exactly one attempt per call: retries, deadlines and concurrency
+    limits live in src/generation/llm_client.py.
+    """
+    name = "base"
+    vision_model_markers = ("vision", "llama-4", "gpt-4o", "llava", "qwen2-vl")
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def supports_vision(self) -> bool:
+        """
+        Whether image parts should be sent. LLM_SUPPORTS_VISION=true/false overrides the model-name guess.
+        """
+        override = os.getenv("LLM_SUPPORTS_VISION")
+        if override:
+            return override.lower() in ("1", "true", "yes")
+        return any(marker in self.model_name.lower() for marker in self.vision_model_markers)
+
+    def complete(self, system_prompt: str, human_content: List[Dict[str, Any]],
+                 timeout: Optional[float] = None) -> str:
+        """
+        :param timeout: Seconds this attempt may take (the caller's remaining deadline).
+        """
+        raise NotImplementedError
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self, model_name: str = DEFAULT_GROQ_MODEL, temperature: float = 0.1, timeout: float = None):
+        """
+        Groq via LangChain's ChatGroq (imported lazily so offline setups don't need it).
+        The SDK keeps a pooled keep-alive client; its own retries are disabled so
+        attempts are only counted and backed off by the client layer. The timeout is the
+        default per request; complete() tightens it to the caller's remaining deadline.
+        """
+        super().__init__(model_name)
+        from langchain_groq import ChatGroq
+
+        api_key = os.getenv("GROQ_API_KEY")
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "60"))
+        if not api_key:
+            print("[!] Warning: GROQ_API_KEY not found in environment.")
+        self.llm = ChatGroq(
+            model=self.model_name,
+            groq_api_key=api_key,
+            temperature=temperature,
+            timeout=self.timeout,
+            max_retries=0
+        )
+
+    def complete(self, system_prompt: str, human_content: List[Dict[str, Any]],
+                 timeout: Optional[float] = None) -> str:
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=human_content)
+        ]
+        # Passed through to the Groq SDK as a per-request timeout, so an attempt the client
+        # gave up on does not keep a connection busy for the full LLM_TIMEOUT
+        return self.llm.invoke(messages, timeout=min(self.timeout, timeout) if timeout else self.timeout).content
+
+class OpenAICompatibleProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, model_name: str = None, base_url: str = None, api_key: str = None,
+                 temperature: float = 0.1, timeout: float = None):
+        """
+        Any server implementing POST /v1/chat/completions (vLLM, llama.cpp, Ollama, LM Studio, ...).
+        :param base_url: e.g. http://localhost:8080/v1 (LLM_BASE_URL).
+        Connections are kept alive in a pool sized by LLM_POOL_SIZE, so concurrent
+        requests don't pay a TCP/TLS handshake each.
+        """
+        super().__init__(model_name or os.getenv("LLM_MODEL", "local-model"))
+        self.base_url = (base_url or os.getenv("LLM_BASE_URL", "http://localhost:8080/v1")).rstrip("/")
+        self.api_key = api_key or os.getenv("LLM_API_KEY")
+        self.temperature = temperature
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "60"))
+        pool_size = int(os.getenv("LLM_POOL_SIZE", "32"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if self.api_key:
+            self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
+    def complete(self, system_prompt: str, human_content: List[Dict[str, Any]],
+                 timeout: Optional[float] = None) -> str:
+        # Plain-text prompts are sent as a string: many local servers reject content-part lists
+        if all(part.get("type") == "text" for part in human_content):
+            user_content = "\n".join(part["text"] for part in human_content)
+        else:
+            user_content = human_content
+
+        response = self.session.post(
+            f"{self.base_url}/chat/completions",
+            json={
+                "model": self.model_name,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_content}
+                ],
+                "temperature": self.temperature
+            },
+            timeout=min(self.timeout, timeout) if timeout else self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+class StubProvider(LLMProvider):
+    name = "stub"
+
+    def __init__(self, model_name: str = "stub", latency_s: float = None):
+        """
+        Deterministic in-process stand-in: echoes the start of the prompt after a fixed delay.
+        Lets the whole pipeline be benchmarked or load-tested without network access.
+        :param latency_s: Simulated generation time (LLM_STUB_LATENCY_MS).
+        """
+        super().__init__(model_name)
+        self.latency_s = latency_s if latency_s is not None else float(os.getenv("LLM_STUB_LATENCY_MS", "0")) / 1000
+
+    def complete(self, system_prompt: str, human_content: List[Dict[str, Any]],
+                 timeout: Optional[float] = None) -> str:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        text = "\n".join(part["text"] for part in human_content if part.get("type") == "text")
+        return "STUB ANSWER\n" + text[:200]
+
+PROVIDERS = {
+    GroqProvider.name: GroqProvider,
+    OpenAICompatibleProvider.name: OpenAICompatibleProvider,
+    StubProvider.name: StubProvider,
+}
+
+def get_provider(name: str = None, **kwargs) -> LLMProvider:
+    """
+    Builds the provider selected by name or the LLM_PROVIDER env var (groq | openai | stub).
+    """
+    name = (name or os.getenv("LLM_PROVIDER", "groq")).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}'. Expected one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](**kwargs)
+
+if __name__ == "__main__":
+    # Quick sanity check
+    provider = get_provider("stub")
+    print(provider.complete("system", [{"type": "text", "text": "Hello"}]))
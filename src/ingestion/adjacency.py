@@ -0,0 +1,51 @@
+import re
+from typing import List, Dict, Any
+
+# unstructured's "fast" strategy often labels captions as NarrativeText, so also match the usual prefixes
+CAPTION_PATTERN = re.compile(r"^\s*(fig\.?|figure)\s*\d+", re.IGNORECASE)
+
+def page_key(doc_id: str, page: int) -> str:
+    return f"{doc_id}#p{page}"
+
+def is_caption(chunk: Dict[str, Any]) -> bool:
+    if chunk["type"] == "image":
+        return False
+    if chunk["metadata"].get("element_type") == "FigureCaption":
+        return True
+    return bool(CAPTION_PATTERN.match(chunk["content"]))
+
+def link_chunks(chunks: List[Dict[str, Any]], chunk_ids: List[str]) -> None:
+    """
+    Records the adjacency index in each chunk's metadata, so it is stored next to the vectors:
+    - chunk_index: position in the document's extraction order,
+    - prev_id / next_id: neighboring text or table chunk in reading order (images are not part of the flow),
+    - parent_id: the page the chunk belongs to,
+    - caption_id (on images) / figure_id (on captions): the figure-caption link on the same page.
+    Keys without a value are left out, since Chroma metadata cannot hold None.
+    """
+    flow = [i for i, c in enumerate(chunks) if c["type"] != "image"]
+    for position, i in enumerate(flow):
+        if position > 0:
+            chunks[i]["metadata"]["prev_id"] = chunk_ids[flow[position - 1]]
+        if position < len(flow) - 1:
+            chunks[i]["metadata"]["next_id"] = chunk_ids[flow[position + 1]]
+
+    pages: Dict[int, Dict[str, List[int]]] = {}
+    for i, chunk in enumerate(chunks):
+        chunk["metadata"]["chunk_index"] = i
+        chunk["metadata"]["parent_id"] = page_key(chunk["doc_id"], chunk["page"])
+        page = pages.setdefault(chunk["page"], {"captions": [], "images": []})
+        if chunk["type"] == "image":
+            page["images"].append(i)
+        elif is_caption(chunk):
+            page["captions"].append(i)
+
+    # Captions and images on a page are paired in order; a single caption covers all of the page's images
+    for page in pages.values():
+        captions, images = page["captions"], page["images"]
+        if not captions or not images:
+            continue
+        pairs = [(captions[0], img) for img in images] if len(captions) == 1 else list(zip(captions, images))
+        for caption, image in pairs:
+            chunks[image]["metadata"]["caption_id"] = chunk_ids[caption]
+            chunks[caption]["metadata"].setdefault("figure_id", chunk_ids[image])
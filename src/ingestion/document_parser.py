@@ -1,31 +1,37 @@
 import os
 import fitz  # PyMuPDF
 import hashlib
-import numpy as np
-import io
-from PIL import Image
 from typing import List, Dict, Any
 from pathlib import Path
 from dotenv import load_dotenv
 from unstructured.partition.pdf import partition_pdf
 
 from src.ingestion.image_processor import ImageProcessor
+from src.ingestion.tables import parse_table_html, build_table, plausible_table, table_chunks, is_table_caption
+from src.observability.metrics import span
 
 # Load environment variables
 load_dotenv()
 
+# "fast" reads the PDF text stream; "hi_res" runs layout detection and returns table HTML (needs unstructured-inference)
+PDF_PARSE_STRATEGY = os.getenv("PDF_PARSE_STRATEGY", "fast")
+# Fall back to PyMuPDF's table finder on pages where unstructured returned no table structure
+PDF_FIND_TABLES = os.getenv("PDF_FIND_TABLES", "true").lower() == "true"
+
 class PDFParser:
-    def __init__(self, output_dir: str = None):
+    def __init__(self, output_dir: str = None, ocr_reader: Any = None):
         """
         Initializes the PDFParser.
         :param output_dir: Directory where processed assets (like images) will be stored.
+        :param ocr_reader: EasyOCR reader to share instead of loading a new one.
         """
         base_output = output_dir or os.getenv("PROCESSED_DATA_PATH", "./data/processed")
         self.output_dir = Path(base_output)
         self.image_dir = self.output_dir / "images"
         
         # Initialize OCR for image enrichment
-        self.image_processor = ImageProcessor()
+        self.image_processor = ImageProcessor(output_dir=base_output, reader=ocr_reader)
+        self.normalizer = self.image_processor.normalizer
         
         # Ensure directories exist
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -38,22 +44,34 @@ class PDFParser:
         """
         doc_id = os.path.basename(pdf_path)
         chunks = []
+        table_pages = set()
         
         print(f"[*] Processing document: {doc_id}")
         
         try:
             # strategy="fast" extracts text directly from the PDF stream.
             # It completely bypasses the need for Tesseract OCR.
-            elements = partition_pdf(
-                filename=pdf_path,
-                strategy="fast",
-                infer_table_structure=True,
-                extract_images_in_pdf=False,
-            )
+            with span("parse"):
+                elements = partition_pdf(
+                    filename=pdf_path,
+                    strategy=PDF_PARSE_STRATEGY,
+                    infer_table_structure=True,
+                    extract_images_in_pdf=False,
+                )
 
             for i, element in enumerate(elements):
                 element_type = element.category.lower()
                 page_number = element.metadata.page_number if element.metadata.page_number else 1
+
+                # Structured tables are indexed per row, with their header and caption
+                html = getattr(element.metadata, "text_as_html", None) if element_type == "table" else None
+                table = parse_table_html(html) if html else None
+                if table:
+                    caption = self._adjacent_caption(elements, i, page_number)
+                    chunks.extend(table_chunks(table, doc_id, page_number, pdf_path, f"{doc_id}_tbl_{i}", caption))
+                    table_pages.add(page_number)
+                    continue
+
                 content_type = "table" if element_type == "table" else "text"
                 
                 chunks.append({
@@ -65,12 +83,19 @@ class PDFParser:
                         "source": pdf_path,
                         "page_number": page_number,
                         "content_type": content_type,
-                        "element_id": f"{doc_id}_el_{i}"
+                        "element_id": f"{doc_id}_el_{i}",
+                        "element_type": element.category
                     }
                 })
         except Exception as e:
             print(f"[!] Unstructured parsing failed for {doc_id} (Text/Tables might be missing): {e}")
 
+        if PDF_FIND_TABLES:
+            try:
+                chunks = self.find_tables(pdf_path, doc_id, chunks, skip_pages=table_pages)
+            except Exception as e:
+                print(f"[!] Table extraction failed for {doc_id}: {e}")
+
         try:
             # 2. Extract raw images using PyMuPDF (No Tesseract needed)
             doc = fitz.open(pdf_path)
@@ -80,50 +105,51 @@ class PDFParser:
                 
                 for img_index, img in enumerate(image_list):
                     xref = img[0]
-                    base_image = doc.extract_image(xref)
+                    with span("image_extract"):
+                        base_image = doc.extract_image(xref)
                     image_bytes = base_image["image"]
                     image_ext = base_image["ext"].lower()
                     
-                    # 1. Skip very small files (usually logos, icons, spacing elements)
-                    if len(image_bytes) < 10240: 
+                    # Decode once, filter (size, format, brightness, entropy) and downscale.
+                    # The resulting in-memory image is shared by OCR and CLIP.
+                    normalized = self.normalizer.normalize(image_bytes, image_ext)
+                    if normalized is None:
                         continue
                         
-                    # 2. Only accept standard formats
-                    if image_ext not in ["png", "jpg", "jpeg"]:
-                        continue
-                    
-                    # 3. Filter out "black" or near-empty images (common for masks)
-                    try:
-                        img_pil = Image.open(io.BytesIO(image_bytes))
-                        # Convert to grayscale to check brightness
-                        grayscale = img_pil.convert("L")
-                        mean_brightness = np.mean(np.array(grayscale))
-                        if mean_brightness < 2 or mean_brightness > 253: # Skip pure black or pure white
-                            continue
-                    except Exception:
-                        continue # Skip if Pillow can't open it
+                    # Near-duplicates (same figure re-encoded elsewhere) link to the
+                    # canonical image: no new file, no OCR, embedding reused at indexing
+                    duplicate = self.image_processor.find_duplicate(normalized)
+                    if duplicate:
+                        img_path = Path(duplicate["image_path"])
+                        ocr_text = duplicate["ocr_text"]
+                        print(f"  - Near-duplicate image on page {page_num+1} -> {img_path.name} (distance {duplicate['distance']})", flush=True)
+                    else:
+                        # Generate unique hash for the image
+                        img_hash = hashlib.md5(image_bytes).hexdigest()
+                        img_filename = f"{doc_id.replace('.', '_')}_p{page_num+1}_img{img_index}_{img_hash[:8]}.{image_ext}"
                         
-                    # Generate unique hash for the image
-                    img_hash = hashlib.md5(image_bytes).hexdigest()
-                    img_filename = f"{doc_id.replace('.', '_')}_p{page_num+1}_img{img_index}_{img_hash[:8]}.{image_ext}"
-                    img_path = self.image_dir / img_filename
-                    
-                    if not img_path.exists():
-                        with open(img_path, "wb") as f:
-                            f.write(image_bytes)
-                    
-                    print(f"  - Extracted valid image: {img_filename} (Size: {len(image_bytes)//1024}KB, Brightness: {mean_brightness:.1f})", flush=True)
-                    
-                    # ENRICHMENT: Run OCR on the image to make it text-searchable
-                    ocr_text = self.image_processor.ocr_only(img_path)
-                    if ocr_text:
-                        print(f"    [OCR] Extracted: {ocr_text[:50]}...", flush=True)
+                        # Persist either a compact thumbnail or the full-resolution original
+                        img_path = self.normalizer.save_thumbnail(normalized, img_filename)
+                        if img_path is None:
+                            img_path = self.image_dir / img_filename
+                            if not img_path.exists():
+                                with open(img_path, "wb") as f:
+                                    f.write(image_bytes)
+                        
+                        print(f"  - Extracted valid image: {img_path.name} (Size: {len(image_bytes)//1024}KB, Brightness: {normalized['brightness']:.1f}, Decode: {normalized['seconds']*1000:.1f}ms)", flush=True)
+                        
+                        # ENRICHMENT: Run OCR on the image to make it text-searchable
+                        ocr_text = self.image_processor.ocr_only(normalized.pop("array"))
+                        if ocr_text:
+                            print(f"    [OCR] Extracted: {ocr_text[:50]}...", flush=True)
+                        self.image_processor.dedup_index.add(normalized["phash"], img_path, ocr_text, pdf_path)
 
-                    chunks.append({
+                    chunk = {
                         "doc_id": doc_id,
                         "page": page_num + 1,
                         "type": "image",
                         "content": str(img_path),
+                        "image": normalized["image"],
                         "ocr_text": ocr_text,
                         "metadata": {
                             "source": pdf_path,
@@ -132,17 +158,76 @@ class PDFParser:
                             "image_path": str(img_path),
                             "ocr_text": ocr_text
                         }
-                    })
+                    }
+                    if duplicate:
+                        self.image_processor.link_duplicate(chunk, duplicate)
+                    chunks.append(chunk)
             doc.close()
         except Exception as e:
             print(f"[!] Image extraction failed for {doc_id}: {e}")
 
+        image_stats = self.normalizer.stats()
+        print(f"[*] Image stats (cumulative): {image_stats['decodes']} decodes, {image_stats['accepted']} accepted, rejected {image_stats['rejected']}, avg {image_stats['avg_ms_per_image']:.1f}ms/image")
+
         if chunks:
             print(f"[+] Successfully extracted {len(chunks)} elements from {doc_id}")
             return chunks
         else:
             return []
 
+    @staticmethod
+    def _adjacent_caption(elements: List[Any], index: int, page_number: int) -> str:
+        for neighbor in (index - 1, index + 1):
+            if 0 <= neighbor < len(elements) and (elements[neighbor].metadata.page_number or 1) == page_number:
+                text = str(elements[neighbor])
+                if is_table_caption(text):
+                    return text
+        return None
+
+    def find_tables(self, pdf_path: str, doc_id: str, chunks: List[Dict[str, Any]], skip_pages: set) -> List[Dict[str, Any]]:
+        """
+        Table structure for pages where unstructured gave none (the "fast" strategy never does), from
+        PyMuPDF's ruling-based finder. Only pages with a "Table N" caption are searched, which also keeps
+        plots and diagrams out. Tables are paired with the page's captions in order and their chunks
+        are inserted right after the caption, so they stay in reading order.
+        """
+        captions: Dict[int, List[int]] = {}
+        for index, chunk in enumerate(chunks):
+            if chunk["type"] == "text" and chunk["page"] not in skip_pages and is_table_caption(chunk["content"]):
+                captions.setdefault(chunk["page"], []).append(index)
+        if not captions:
+            return chunks
+
+        inserts: Dict[int, List[Dict[str, Any]]] = {}
+        doc = fitz.open(pdf_path)
+        try:
+            for page_number, caption_indexes in captions.items():
+                with span("table_extract"):
+                    found = doc[page_number - 1].find_tables().tables
+                tables = []
+                for candidate in found:
+                    rows = candidate.extract()
+                    body = rows if candidate.header.external else rows[1:]
+                    table = build_table([candidate.header.names], body) if body else None
+                    if table and plausible_table(table):
+                        tables.append(table)
+                for n, table in enumerate(tables):
+                    anchor = caption_indexes[min(n, len(caption_indexes) - 1)]
+                    caption = chunks[anchor]["content"] if n < len(caption_indexes) else None
+                    inserts.setdefault(anchor, []).extend(
+                        table_chunks(table, doc_id, page_number, pdf_path, f"{doc_id}_p{page_number}_tbl_{n}", caption)
+                    )
+        finally:
+            doc.close()
+
+        if inserts:
+            print(f"  - Found {sum(1 for group in inserts.values() for c in group if 'table' in c)} tables on {len(captions)} captioned pages")
+        merged = []
+        for index, chunk in enumerate(chunks):
+            merged.append(chunk)
+            merged.extend(inserts.get(index, []))
+        return merged
+
 if __name__ == "__main__":
     # Quick sanity check logic
     parser = PDFParser()
@@ -0,0 +1,218 @@
+import os
+import json
+import threading
+import numpy as np
+from PIL import Image
+from itertools import combinations
+from typing import Dict, Any, List, Optional, Iterable, Set
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+HASH_BITS = 64
+NUM_BANDS = 4
+BAND_BITS = HASH_BITS // NUM_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+INDEX_FILENAME = "phash_index.jsonl"
+
+class PerceptualHashIndex:
+    def __init__(self, index_path: str = None, threshold: int = None):
+        """
+        Near-duplicate image index based on a 64-bit difference hash (dHash).
+        Lookups use multi-index hashing: the hash is split into 4 bands of 16 bits and,
+        by the pigeonhole principle, any hash within `threshold` bits differs from the
+        query by at most threshold // 4 bits in at least one band. Only the buckets within
+        that radius are probed, so lookup cost stays flat as the index grows to millions.
+        :param index_path: Append-only JSONL file the index is persisted to; compacted when
+                           documents are removed (see remove_sources()).
+        :param threshold: Maximum Hamming distance (bits) for two images to be near-duplicates.
+        """
+        base_output = os.getenv("PROCESSED_DATA_PATH", "./data/processed")
+        self.index_path = Path(index_path or Path(base_output) / INDEX_FILENAME)
+        self.threshold = threshold if threshold is not None else int(os.getenv("IMAGE_PHASH_THRESHOLD", "6"))
+        self.band_radius = self.threshold // NUM_BANDS
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # canonical image_path -> entry
+        self._bands: List[Dict[int, List[str]]] = [{} for _ in range(NUM_BANDS)]
+        self._probe_masks = self._build_probe_masks(self.band_radius)
+        self._file_id = None  # stat of the file as last loaded or written by this instance
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def _build_probe_masks(radius: int) -> List[int]:
+        """
+        All BAND_BITS-wide masks with at most `radius` bits set (XOR'd against a band to probe neighbours).
+        """
+        masks = [0]
+        for r in range(1, radius + 1):
+            for bits in combinations(range(BAND_BITS), r):
+                mask = 0
+                for b in bits:
+                    mask |= 1 << b
+                masks.append(mask)
+        return masks
+
+    @staticmethod
+    def compute_hash(gray_image: Image.Image) -> int:
+        """
+        64-bit dHash: compares horizontally adjacent pixels of a 9x8 downscale.
+        Robust to re-encoding, rescaling and mild compression artifacts.
+        """
+        small = np.asarray(gray_image.convert("L").resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        value = 0
+        for bit in bits:
+            value = (value << 1) | int(bit)
+        return value
+
+    def _index_entry(self, entry: Dict[str, Any]) -> None:
+        key = entry["image_path"]
+        is_new = key not in self._entries
+        self._entries[key] = entry
+        if is_new:
+            h = entry["hash"]
+            for band in range(NUM_BANDS):
+                value = (h >> (band * BAND_BITS)) & BAND_MASK
+                self._bands[band].setdefault(value, []).append(key)
+
+    def _stat_file(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _reload_if_replaced(self) -> None:
+        # Another process (e.g. the maintenance CLI compacting it) changed the file: reload it
+        file_id = self._stat_file()
+        if file_id != self._file_id and (file_id is not None or self._entries):
+            self._entries = {}
+            self._bands = [{} for _ in range(NUM_BANDS)]
+            self._load()
+
+    def _load(self) -> None:
+        self._file_id = self._stat_file()
+        if self._file_id is None:
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        # Later lines for the same image (e.g. a linked chunk_id) supersede earlier ones
+                        self._index_entry(json.loads(line))
+            print(f"[+] Loaded perceptual hash index with {len(self._entries)} images from {self.index_path}")
+        except Exception as e:
+            print(f"[!] Error loading perceptual hash index {self.index_path}: {e}")
+
+    def _persist(self, entry: Dict[str, Any]) -> None:
+        try:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._file_id = self._stat_file()
+        except Exception as e:
+            print(f"[!] Error persisting perceptual hash entry: {e}")
+
+    def find(self, image_hash: int) -> Optional[Dict[str, Any]]:
+        """
+        Returns the closest indexed image within the Hamming threshold, or None.
+        """
+        best, best_distance = None, self.threshold + 1
+        with self._lock:
+            self._reload_if_replaced()
+            seen = set()
+            for band in range(NUM_BANDS):
+                value = (image_hash >> (band * BAND_BITS)) & BAND_MASK
+                table = self._bands[band]
+                for mask in self._probe_masks:
+                    for key in table.get(value ^ mask, ()):
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        entry = self._entries[key]
+                        distance = (entry["hash"] ^ image_hash).bit_count()
+                        if distance < best_distance:
+                            best, best_distance = entry, distance
+        if best is None:
+            return None
+        return dict(best, distance=best_distance)
+
+    def add(self, image_hash: int, image_path: str, ocr_text: str, source: str) -> Dict[str, Any]:
+        """
+        Registers a newly processed (canonical) image.
+        """
+        entry = {
+            "hash": image_hash,
+            "image_path": str(image_path),
+            "ocr_text": ocr_text,
+            "source": source,
+            "chunk_id": None,
+        }
+        with self._lock:
+            self._reload_if_replaced()
+            self._index_entry(entry)
+            self._persist(entry)
+        return entry
+
+    def link_embedding(self, image_path: str, chunk_id: str) -> None:
+        """
+        Records the vector store ID holding the canonical image's embedding,
+        so later near-duplicates can reuse it instead of re-encoding.
+        """
+        with self._lock:
+            self._reload_if_replaced()
+            entry = self._entries.get(str(image_path))
+            if entry is None or entry.get("chunk_id") == chunk_id:
+                return
+            entry = dict(entry, chunk_id=chunk_id)
+            self._entries[entry["image_path"]] = entry
+            self._persist(entry)
+
+    def sources(self) -> Set[str]:
+        """
+        The documents that registered at least one canonical image.
+        """
+        with self._lock:
+            self._reload_if_replaced()
+            return {entry["source"] for entry in self._entries.values()}
+
+    def remove_sources(self, sources: Iterable[str]) -> int:
+        """
+        Forgets the images registered by these documents (deleted or no longer indexed), so
+        re-ingesting one does not flag its images as near-duplicates of entries whose chunks
+        are gone. Compacts the file; returns the number of entries removed.
+        """
+        sources = set(sources)
+        with self._lock:
+            self._reload_if_replaced()
+            removed = [key for key, entry in self._entries.items() if entry["source"] in sources]
+            if not removed:
+                return 0
+            for key in removed:
+                h = self._entries.pop(key)["hash"]
+                for band in range(NUM_BANDS):
+                    bucket = self._bands[band].get((h >> (band * BAND_BITS)) & BAND_MASK, [])
+                    if key in bucket:
+                        bucket.remove(key)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.index_path)
+            self._file_id = self._stat_file()
+        return len(removed)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._reload_if_replaced()
+            return len(self._entries)
+
+if __name__ == "__main__":
+    # Quick sanity check
+    index = PerceptualHashIndex()
+    print(f"PerceptualHashIndex loaded with {len(index)} images (threshold: {index.threshold} bits).")
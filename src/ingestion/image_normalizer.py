@@ -0,0 +1,167 @@
+import os
+import io
+import time
+import threading
+import numpy as np
+from PIL import Image
+from typing import Dict, Any, Optional, Union
+from pathlib import Path
+from dotenv import load_dotenv
+
+from src.observability.metrics import registry
+
+# Load environment variables
+load_dotenv()
+
+class ImageNormalizer:
+    def __init__(self,
+                 max_side: int = None,
+                 min_bytes: int = None,
+                 min_entropy: float = None,
+                 thumbnail_dir: str = None):
+        """
+        Single decode stage for every candidate image (PDF-embedded or standalone).
+        Decodes once, applies the size/format/brightness/entropy filters and returns a
+        bounded-resolution in-memory image that is shared by OCR and CLIP.
+        :param max_side: Longest side (px) of the in-memory image handed to OCR and CLIP.
+        :param min_bytes: Encoded images smaller than this are treated as logos/icons.
+        :param min_entropy: Grayscale histogram entropy (bits) below which an image is
+                            considered blank (masks, flat fills, spacer images).
+        :param thumbnail_dir: If set, a compact JPEG thumbnail is written here instead of
+                              the full-resolution original.
+        """
+        self.max_side = max_side or int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+        self.min_bytes = min_bytes if min_bytes is not None else int(os.getenv("IMAGE_MIN_BYTES", "10240"))
+        self.min_entropy = min_entropy if min_entropy is not None else float(os.getenv("IMAGE_MIN_ENTROPY", "1.0"))
+        self.allowed_formats = {"png", "jpg", "jpeg"}
+
+        if thumbnail_dir is None and os.getenv("IMAGE_STORE_THUMBNAILS", "false").lower() == "true":
+            base_output = os.getenv("PROCESSED_DATA_PATH", "./data/processed")
+            thumbnail_dir = str(Path(base_output) / "thumbnails")
+        self.thumbnail_dir = Path(thumbnail_dir) if thumbnail_dir else None
+        if self.thumbnail_dir:
+            self.thumbnail_dir.mkdir(parents=True, exist_ok=True)
+
+        # Instrumentation (read via stats())
+        self._lock = threading.Lock()
+        self._stats = {
+            "decodes": 0,
+            "accepted": 0,
+            "rejected": {},
+            "total_seconds": 0.0,
+        }
+
+    def _reject(self, reason: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["rejected"][reason] = self._stats["rejected"].get(reason, 0) + 1
+            self._stats["total_seconds"] += elapsed
+        registry.inc("rag_images_rejected_total", labels={"reason": reason})
+        registry.observe("rag_stage_duration_seconds", elapsed, labels={"stage": "image_normalize"})
+        return None
+
+    def normalize(self, image_bytes: bytes, image_ext: str, enforce_min_bytes: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Filters and decodes an encoded image. Returns None if the image is rejected, otherwise:
+        {"image": PIL RGB image, "array": np.ndarray (H, W, 3), "gray": PIL "L" image,
+         "width"/"height": original size, "brightness", "entropy", "seconds"}
+        "gray" and "array" are copies for hashing and OCR; consumers pop them once used.
+        """
+        started = time.perf_counter()
+        image_ext = (image_ext or "").lower().lstrip(".")
+
+        # 1. Skip very small files (usually logos, icons, spacing elements)
+        if enforce_min_bytes and len(image_bytes) < self.min_bytes:
+            return self._reject("too_small", started)
+
+        # 2. Only accept standard formats
+        if image_ext not in self.allowed_formats:
+            return self._reject("format", started)
+
+        # 3. The only decode of this image in the whole pipeline
+        try:
+            img = Image.open(io.BytesIO(image_bytes))
+            width, height = img.size
+            # JPEG can decode straight to a reduced scale, skipping most of the IDCT work
+            img.draft("RGB", (self.max_side, self.max_side))
+            rgb = img.convert("RGB")
+            with self._lock:
+                self._stats["decodes"] += 1
+            registry.inc("rag_image_decodes_total")
+        except Exception:
+            return self._reject("decode_error", started)  # Skip if Pillow can't open it
+
+        if max(rgb.size) > self.max_side:
+            rgb.thumbnail((self.max_side, self.max_side), Image.Resampling.BILINEAR)
+
+        # 4. Filter out "black"/"white" or near-empty images (common for masks)
+        gray = rgb.convert("L")
+        mean_brightness = float(np.mean(np.asarray(gray)))
+        if mean_brightness < 2 or mean_brightness > 253:  # Skip pure black or pure white
+            return self._reject("brightness", started)
+
+        entropy = float(gray.entropy())
+        if entropy < self.min_entropy:
+            return self._reject("low_entropy", started)
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["accepted"] += 1
+            self._stats["total_seconds"] += elapsed
+        registry.observe("rag_stage_duration_seconds", elapsed, labels={"stage": "image_normalize"})
+
+        return {
+            "image": rgb,
+            "array": np.asarray(rgb),
+            "gray": gray,
+            "width": width,
+            "height": height,
+            "brightness": mean_brightness,
+            "entropy": entropy,
+            "seconds": elapsed,
+        }
+
+    def normalize_file(self, image_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """
+        Convenience wrapper for standalone image files. Standalone images are user-provided,
+        so the logo-size threshold is not applied to them.
+        """
+        try:
+            with open(image_path, "rb") as f:
+                image_bytes = f.read()
+        except Exception as e:
+            print(f"[!] Error reading image {image_path}: {e}")
+            return None
+
+        return self.normalize(image_bytes, Path(image_path).suffix, enforce_min_bytes=False)
+
+    def save_thumbnail(self, normalized: Dict[str, Any], filename: str) -> Optional[Path]:
+        """
+        Writes the bounded-resolution image to the thumbnail store as a JPEG.
+        Returns the path, or None if the thumbnail store is disabled.
+        """
+        if not self.thumbnail_dir:
+            return None
+
+        thumb_path = self.thumbnail_dir / f"{Path(filename).stem}.jpg"
+        if not thumb_path.exists():
+            normalized["image"].save(thumb_path, format="JPEG", quality=85, optimize=True)
+        return thumb_path
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns decode counts, accept/reject counts and average per-image time.
+        """
+        with self._lock:
+            processed = self._stats["accepted"] + sum(self._stats["rejected"].values())
+            return {
+                "decodes": self._stats["decodes"],
+                "accepted": self._stats["accepted"],
+                "rejected": dict(self._stats["rejected"]),
+                "avg_ms_per_image": (self._stats["total_seconds"] / processed * 1000) if processed else 0.0,
+            }
+
+if __name__ == "__main__":
+    # Quick sanity check
+    normalizer = ImageNormalizer()
+    print(f"ImageNormalizer ready (max side: {normalizer.max_side}px).")
@@ -1,17 +1,24 @@
 import os
 import easyocr
 import hashlib
-from typing import Dict, Any, List
+import numpy as np
+from typing import Dict, Any, List, Optional, Union
 from pathlib import Path
 from dotenv import load_dotenv
 
+from src.ingestion.image_normalizer import ImageNormalizer
+from src.ingestion.image_dedup import PerceptualHashIndex, INDEX_FILENAME
+from src.observability.metrics import span
+
 # Load environment variables
 load_dotenv()
 
 class ImageProcessor:
-    def __init__(self, output_dir: str = None):
+    def __init__(self, output_dir: str = None, reader: Any = None):
         """
         Initializes the ImageProcessor with EasyOCR.
+        :param reader: An existing EasyOCR reader to share (e.g. between tenants' pipelines),
+                       instead of loading another copy of the model.
         """
         base_output = output_dir or os.getenv("PROCESSED_DATA_PATH", "./data/processed")
         self.output_dir = Path(base_output)
@@ -19,8 +26,17 @@ class ImageProcessor:
         
         # Initialize EasyOCR reader for English
         # Note: This will download models on the first run (~100MB)
-        print("[*] Initializing EasyOCR Reader...")
-        self.reader = easyocr.Reader(['en']) 
+        if reader is None:
+            print("[*] Initializing EasyOCR Reader...")
+            reader = easyocr.Reader(['en'])
+        self.reader = reader
+
+        # Shared decode/filter stage so OCR and CLIP work from the same in-memory image
+        store_thumbnails = os.getenv("IMAGE_STORE_THUMBNAILS", "false").lower() == "true"
+        self.normalizer = ImageNormalizer(thumbnail_dir=str(self.output_dir / "thumbnails") if store_thumbnails else None)
+
+        # Near-duplicate detection so re-encoded copies of a figure are OCR'd/embedded once
+        self.dedup_index = PerceptualHashIndex(index_path=str(self.output_dir / INDEX_FILENAME))
 
     def process_image(self, image_path: str) -> Dict[str, Any]:
         """
@@ -29,16 +45,27 @@ class ImageProcessor:
         doc_id = os.path.basename(image_path)
         
         try:
-            print(f"[*] Running OCR on: {doc_id}")
-            # Run OCR on the image
-            result = self.reader.readtext(image_path, detail=0)
-            ocr_text = " ".join(result)
+            normalized = self.normalizer.normalize_file(image_path)
+            if normalized is None:
+                print(f"[!] Skipping image {doc_id} (rejected by image filters)")
+                return {}
+
+            duplicate = self.find_duplicate(normalized)
+            if duplicate:
+                print(f"[*] {doc_id} is a near-duplicate of {duplicate['image_path']} (distance {duplicate['distance']}), reusing OCR")
+                ocr_text = duplicate["ocr_text"]
+            else:
+                print(f"[*] Running OCR on: {doc_id}")
+                # Run OCR on the already-decoded, bounded-resolution array
+                ocr_text = self.ocr_only(normalized.pop("array"))
+                self.dedup_index.add(normalized["phash"], image_path, ocr_text, image_path)
             
-            return {
+            chunk = {
                 "doc_id": doc_id,
                 "page": 1,
                 "type": "image",
                 "content": str(image_path),
+                "image": normalized["image"],
                 "ocr_text": ocr_text,
                 "metadata": {
                     "source": image_path,
@@ -48,19 +75,48 @@ class ImageProcessor:
                     "ocr_text": ocr_text
                 }
             }
+            if duplicate:
+                self.link_duplicate(chunk, duplicate)
+            return chunk
         except Exception as e:
             print(f"[!] Error processing image {image_path}: {e}")
             return {}
 
-    def ocr_only(self, image_path: str) -> str:
+    def find_duplicate(self, normalized: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Computes the perceptual hash of a normalized image (stored under "phash")
+        and returns the matching canonical entry if it is a near-duplicate.
+        The grayscale copy is dropped once hashed, and so is the OCR array of a duplicate.
+        """
+        normalized["phash"] = self.dedup_index.compute_hash(normalized.pop("gray"))
+        duplicate = self.dedup_index.find(normalized["phash"])
+        if duplicate:
+            normalized.pop("array", None)
+        return duplicate
+
+    @staticmethod
+    def link_duplicate(chunk: Dict[str, Any], duplicate: Dict[str, Any]) -> None:
+        """
+        Points a chunk at the canonical image so its embedding can be reused at indexing time.
+        """
+        chunk["duplicate_of"] = duplicate["image_path"]
+        chunk["metadata"]["duplicate_of"] = duplicate["image_path"]
+        if duplicate.get("chunk_id"):
+            chunk["embedding_ref"] = duplicate["chunk_id"]
+
+    def ocr_only(self, image: Union[str, Path, np.ndarray]) -> str:
         """
         Runs OCR and returns only the text. Useful for images extracted from PDFs.
+        Accepts a path or an already-decoded array (preferred, avoids a second decode).
         """
         try:
-            result = self.reader.readtext(str(image_path), detail=0)
+            source = image if isinstance(image, np.ndarray) else str(image)
+            with span("ocr"):
+                result = self.reader.readtext(source, detail=0)
             return " ".join(result)
         except Exception as e:
-            print(f"[!] Error in ocr_only for {image_path}: {e}")
+            label = "in-memory image" if isinstance(image, np.ndarray) else image
+            print(f"[!] Error in ocr_only for {label}: {e}")
             return ""
 
 if __name__ == "__main__":
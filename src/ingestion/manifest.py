@@ -0,0 +1,36 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Any
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+def manifest_path(processed_dir: str = None) -> Path:
+    return Path(processed_dir or os.getenv("PROCESSED_DATA_PATH", "./data/processed")) / MANIFEST_FILENAME
+
+def read_manifest(path: Path = None) -> Dict[str, Any]:
+    """
+    Loads the ingest manifest: {"embedding_model": ..., "files": {source: {sha256, size, chunks, ingested_at}}}.
+    """
+    path = Path(path or manifest_path())
+    if not path.exists():
+        return {"files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_manifest(manifest: Dict[str, Any], path: Path = None) -> None:
+    # Write-then-rename so readers (e.g. a snapshot export) never see a half-written file
+    path = Path(path or manifest_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
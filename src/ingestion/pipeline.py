@@ -0,0 +1,204 @@
+import os
+import time
+import threading
+from typing import List, Dict, Any
+from dotenv import load_dotenv
+
+from src.ingestion.document_parser import PDFParser
+from src.ingestion.adjacency import link_chunks
+from src.ingestion.manifest import read_manifest, write_manifest, file_sha256, manifest_path
+from src.embeddings.model_loader import MultimodalEmbedder
+from src.vector_store.chroma_manager import ChromaManager
+from src.vector_store.table_store import TableStore, tables_path
+from src.observability.metrics import span
+
+# Load environment variables
+load_dotenv()
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.txt')
+
+class IndexQuotaExceeded(RuntimeError):
+    """
+    A file has more chunks than its index has room for (TENANT_MAX_CHUNKS).
+    """
+
+class IngestionPipeline:
+    def __init__(self, embedder: MultimodalEmbedder, vector_store: ChromaManager, pdf_parser: PDFParser = None,
+                 table_store: TableStore = None):
+        """
+        Orchestrates parsing, embedding and indexing of source files.
+        Shared by the API, debug_ingest.py and the offline benchmarks. The ingest manifest and
+        the table store live next to the parser's output (PROCESSED_DATA_PATH by default).
+        """
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.pdf_parser = pdf_parser or PDFParser()
+        self.manifest_path = manifest_path(self.pdf_parser.output_dir)
+        self.table_store = table_store or TableStore(tables_path(self.pdf_parser.output_dir))
+        # Share the parser's processor: one EasyOCR reader and one near-duplicate index
+        self.image_processor = self.pdf_parser.image_processor
+        self.batch_size = 50
+        self._manifest_lock = threading.Lock()
+
+    def load_chunks(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Extracts chunks from a single file based on its extension.
+        """
+        ext = os.path.splitext(file_path)[1].lower()
+        chunks = []
+
+        if ext == ".pdf":
+            chunks = self.pdf_parser.extract_content(file_path)
+        elif ext in [".png", ".jpg", ".jpeg"]:
+            processed = self.image_processor.process_image(file_path)
+            if processed:
+                chunks = [processed]
+        elif ext == ".txt":
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                    chunks = [{
+                        "doc_id": os.path.basename(file_path),
+                        "page": 1,
+                        "type": "text",
+                        "content": content,
+                        "metadata": {
+                            "source": file_path,
+                            "page_number": 1,
+                            "content_type": "text"
+                        }
+                    }]
+            except Exception as e:
+                print(f"[!] Error reading txt file {file_path}: {e}")
+        return chunks
+
+    def process_file(self, file_path: str, publish: bool = True, max_new_chunks: int = None) -> int:
+        """
+        Orchestrates the ingestion, embedding, and indexing of a single file.
+        Returns the number of chunks indexed.
+        :param publish: False when the file is part of a larger ingest job: the caller publishes
+                        once after the job's last file, so query workers reopen once per job.
+        :param max_new_chunks: Room left in the index. A file with more chunks raises IndexQuotaExceeded
+                               once parsed, before anything is embedded or indexed.
+        """
+        chunks = self.load_chunks(file_path)
+        if not chunks:
+            return 0
+        if max_new_chunks is not None and len(chunks) > max_new_chunks:
+            raise IndexQuotaExceeded(f"{os.path.basename(file_path)} has {len(chunks)} chunks; "
+                                     f"the index has room for {max(0, max_new_chunks)}")
+
+        # Collect lists for batch addition
+        all_ids = []
+        all_embeddings = []
+        all_metadatas = []
+        all_documents = []
+
+        print(f"[*] Encoding {len(chunks)} chunks for {os.path.basename(file_path)}...", flush=True)
+
+        # Near-duplicate images reuse the canonical image's stored embedding (one bulk fetch)
+        embedding_refs = [c["embedding_ref"] for c in chunks if c.get("embedding_ref")]
+        reused_embeddings = self.vector_store.get_embeddings(embedding_refs) if embedding_refs else {}
+        canonical_images = {}
+
+        # Stable IDs from doc name and index, assigned up front so neighbors can reference each other
+        chunk_ids = [f"{chunk['doc_id']}_{i}_{chunk['type']}_{chunk['page']}" for i, chunk in enumerate(chunks)]
+        link_chunks(chunks, chunk_ids)
+
+        # Generate embeddings
+        for i, chunk in enumerate(chunks):
+            chunk_id = chunk_ids[i]
+
+            # Determine content for embedding
+            if chunk["type"] == "image":
+                # Taken off the chunk: the decoded image is released once embedded, not when the file is done
+                image = chunk.pop("image", None)
+                if chunk.get("embedding_ref") in reused_embeddings:
+                    embedding = [reused_embeddings[chunk["embedding_ref"]]]
+                else:
+                    # Prefer the in-memory image from the normalizer over re-reading the file
+                    with span("encode", modality="image"):
+                        embedding = self.embedder.encode_image(image or chunk["content"]).tolist()
+                del image
+                if not chunk.get("duplicate_of"):
+                    canonical_images[chunk["metadata"]["image_path"]] = chunk_id
+                doc_text = chunk.get("ocr_text", f"Image from {chunk['doc_id']} page {chunk['page']}")
+            else:
+                with span("encode", modality="text"):
+                    embedding = self.embedder.encode_text(chunk["content"]).tolist()
+                doc_text = chunk["content"]
+
+            all_ids.append(chunk_id)
+            all_embeddings.append(embedding)
+            all_metadatas.append(chunk["metadata"])
+            all_documents.append(doc_text)
+
+            if (i + 1) % 50 == 0:
+                print(f"  - Encoded {i + 1}/{len(chunks)} chunks...", flush=True)
+
+        # Final batch push to Chroma in smaller chunks of 50 to avoid timeouts/OOM,
+        # published at most once for the whole file so query workers reopen once rather than per batch
+        print(f"[*] Pushing {len(all_ids)} items to ChromaDB for {os.path.basename(file_path)}...", flush=True)
+        for j in range(0, len(all_ids), self.batch_size):
+            end = min(j + self.batch_size, len(all_ids))
+            self.vector_store.add_embeddings(
+                ids=all_ids[j:end],
+                embeddings=all_embeddings[j:end],
+                metadatas=all_metadatas[j:end],
+                documents=all_documents[j:end],
+                publish=False
+            )
+        if publish:
+            self.vector_store.publish()
+        for image_path, chunk_id in canonical_images.items():
+            self.image_processor.dedup_index.link_embedding(image_path, chunk_id)
+        self.table_store.add_tables(self.collect_tables(chunks, chunk_ids))
+        self.record_ingest(file_path, len(all_ids))
+        print(f"[+] Finished indexing {os.path.basename(file_path)}", flush=True)
+        return len(all_ids)
+
+    @staticmethod
+    def collect_tables(chunks: List[Dict[str, Any]], chunk_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        The structured tables of a file, each with the chunk ID of every row (its first cell group),
+        so table lookups point at indexed chunks.
+        """
+        row_ids: Dict[str, Dict[int, str]] = {}
+        for chunk, chunk_id in zip(chunks, chunk_ids):
+            metadata = chunk["metadata"]
+            if "row_index" in metadata:
+                row_ids.setdefault(metadata["table_id"], {}).setdefault(metadata["row_index"], chunk_id)
+        tables = []
+        for chunk in chunks:
+            if "table" in chunk:
+                table = chunk["table"]
+                ids = row_ids.get(table["table_id"], {})
+                tables.append({**table, "row_ids": [ids.get(i, "") for i in range(len(table["rows"]))]})
+        return tables
+
+    def record_ingest(self, file_path: str, n_chunks: int) -> None:
+        """
+        Adds the file to the ingest manifest (content hash, size, chunk count), which travels
+        with index snapshots so replicas know exactly which documents they serve.
+        """
+        entry = {
+            "sha256": file_sha256(file_path),
+            "size": os.path.getsize(file_path),
+            "chunks": n_chunks,
+            "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._manifest_lock:
+            manifest = read_manifest(self.manifest_path)
+            manifest["embedding_model"] = getattr(self.embedder, "model_name", None)
+            manifest.setdefault("files", {})[file_path] = entry
+            write_manifest(manifest, self.manifest_path)
+
+def list_source_files(raw_path: str) -> List[str]:
+    """
+    Returns the ingestible files in a directory (non-recursive).
+    """
+    files = sorted(os.path.join(raw_path, name) for name in os.listdir(raw_path))
+    return [f for f in files if os.path.isfile(f) and f.lower().endswith(SUPPORTED_EXTENSIONS)]
+
+if __name__ == "__main__":
+    print("IngestionPipeline module loaded.")
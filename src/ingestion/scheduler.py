@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import Callable, Any, Dict, List, Deque, Iterable
+
+from src.observability.metrics import registry
+
+registry.describe("rag_tenant_ingest_queue_depth", "Files waiting in a tenant's ingest queue.")
+registry.describe("rag_tenant_ingest_duration_seconds", "Time to ingest one file, by tenant.")
+registry.describe("rag_tenant_ingest_errors_total", "Files whose ingestion raised, by tenant.")
+
+class IngestQueueFull(RuntimeError):
+    """
+    The tenant already has its quota of files (TENANT_MAX_QUEUED_FILES) waiting.
+    """
+
+class IngestScheduler:
+    """
+    Per-tenant ingest queues drained by a fixed set of worker threads (INGEST_WORKERS).
+    Tenants take turns, one file per turn and at most one file in flight per tenant, so a
+    tenant that queues a thousand documents delays another tenant's upload by one file per
+    worker rather than by its whole backlog, and never holds every worker (and the CPU the
+    query path needs) by itself. A file already waiting in a tenant's queue is not queued twice.
+    """
+    def __init__(self, process: Callable[[str, str], Any], workers: int = None, max_queued: int = None,
+                 on_drained: Callable[[str], Any] = None):
+        """
+        :param process: Called as process(tenant_id, file_path) on a worker thread.
+        :param max_queued: Files a tenant may have waiting (TENANT_MAX_QUEUED_FILES).
+        :param on_drained: Called as on_drained(tenant_id) on the worker thread once the tenant's last
+                           queued file is done (the end of its ingest job), e.g. to publish the index once.
+        """
+        self.process = process
+        self.on_drained = on_drained
+        self.workers = max(1, workers or int(os.getenv("INGEST_WORKERS", "1")))
+        self.max_queued = max_queued or int(os.getenv("TENANT_MAX_QUEUED_FILES", "100"))
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[str]] = {}
+        self._turns: Deque[str] = deque()  # tenants with waiting files and none in flight, in turn order
+        self._active: Dict[str, str] = {}  # tenant -> file being ingested
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, tenant_id: str, files: Iterable[str]) -> List[str]:
+        """
+        Queues files for a tenant. Returns the ones newly queued; raises IngestQueueFull (and
+        queues none) if they would exceed the tenant's quota.
+        """
+        with self._cond:
+            queue = self._queues.get(tenant_id, deque())
+            new = [f for f in dict.fromkeys(files) if f not in queue]
+            if len(queue) + len(new) > self.max_queued:
+                raise IngestQueueFull(f"Tenant '{tenant_id}' has {len(queue)} files queued; {len(new)} more "
+                                      f"would exceed its limit of {self.max_queued}.")
+            if not new:
+                return []
+            queue.extend(new)
+            self._queues[tenant_id] = queue
+            if tenant_id not in self._active and tenant_id not in self._turns:
+                self._turns.append(tenant_id)
+            self._report(tenant_id)
+            self._start_workers()
+            self._cond.notify_all()
+        return new
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"ingest-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _report(self, tenant_id: str) -> None:
+        registry.set("rag_tenant_ingest_queue_depth", len(self._queues.get(tenant_id, ())), labels={"tenant": tenant_id})
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._turns:
+                    self._cond.wait()
+                tenant_id = self._turns.popleft()
+                file_path = self._queues[tenant_id].popleft()
+                self._active[tenant_id] = file_path
+                self._report(tenant_id)
+
+            started = time.perf_counter()
+            try:
+                self.process(tenant_id, file_path)
+            except Exception as e:
+                print(f"[!] Ingestion of {file_path} for tenant '{tenant_id}' failed: {e}")
+                registry.inc("rag_tenant_ingest_errors_total", labels={"tenant": tenant_id})
+            registry.observe("rag_tenant_ingest_duration_seconds", time.perf_counter() - started,
+                             labels={"tenant": tenant_id})
+
+            with self._cond:
+                drained = not self._queues[tenant_id]
+            if drained and self.on_drained:
+                # Still active meanwhile: files queued now wait until the job is finished
+                try:
+                    self.on_drained(tenant_id)
+                except Exception as e:
+                    print(f"[!] Finishing the ingest job of tenant '{tenant_id}' failed: {e}")
+                    registry.inc("rag_tenant_ingest_errors_total", labels={"tenant": tenant_id})
+
+            with self._cond:
+                del self._active[tenant_id]
+                if self._queues[tenant_id]:
+                    # Back of the line: every other waiting tenant goes first
+                    self._turns.append(tenant_id)
+                else:
+                    del self._queues[tenant_id]
+                self._cond.notify_all()
+
+    def busy(self, tenant_id: str) -> bool:
+        with self._cond:
+            return tenant_id in self._active or tenant_id in self._queues
+
+    def status(self, tenant_id: str = None) -> Dict[str, Dict[str, Any]]:
+        """
+        {tenant: {"queued": n, "active": file or None}} for every tenant with work (or just one).
+        """
+        with self._cond:
+            tenants = [tenant_id] if tenant_id else sorted(set(self._queues) | set(self._active))
+            return {t: {"queued": len(self._queues.get(t, ())), "active": self._active.get(t)} for t in tenants}
+
+    def wait(self, tenant_id: str = None, timeout: float = None) -> bool:
+        """
+        Blocks until the tenant's (or every tenant's) queue is drained. Returns False on timeout.
+        """
+        def idle() -> bool:
+            if tenant_id:
+                return tenant_id not in self._active and tenant_id not in self._queues
+            return not self._active and not self._queues
+
+        with self._cond:
+            return self._cond.wait_for(idle, timeout)
@@ -0,0 +1,167 @@
+import os
+import re
+from html.parser import HTMLParser
+from typing import List, Dict, Any, Optional
+
+# Table captions read "Table 3: ..." and sit just above (sometimes below) the table
+TABLE_CAPTION_PATTERN = re.compile(r"^\s*table\s*\d+", re.IGNORECASE)
+# Wide rows are split into groups of this many cells, each repeating the row label
+TABLE_ROW_MAX_CELLS = max(2, int(os.getenv("TABLE_ROW_MAX_CELLS", "8")))
+CAPTION_CONTEXT_CHARS = 120
+
+def clean_cell(value: Any) -> str:
+    return " ".join(str(value or "").split())
+
+def is_table_caption(text: str) -> bool:
+    return bool(TABLE_CAPTION_PATTERN.match(text))
+
+class _TableHTMLParser(HTMLParser):
+    """
+    Collects the rows of unstructured's text_as_html as lists of {"text", "colspan", "header"} cells.
+    """
+    def __init__(self):
+        super().__init__()
+        self.rows: List[Dict[str, Any]] = []
+        self._in_thead = False
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "thead":
+            self._in_thead = True
+        elif tag == "tr":
+            self.rows.append({"cells": [], "thead": self._in_thead})
+        elif tag in ("td", "th"):
+            try:
+                colspan = max(1, int(dict(attrs).get("colspan") or 1))
+            except ValueError:
+                colspan = 1
+            self._cell = {"text": [], "colspan": colspan, "header": tag == "th"}
+
+    def handle_endtag(self, tag):
+        if tag == "thead":
+            self._in_thead = False
+        elif tag in ("td", "th") and self._cell is not None:
+            if not self.rows:
+                self.rows.append({"cells": [], "thead": self._in_thead})
+            self.rows[-1]["cells"].append(self._cell)
+            self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell["text"].append(data)
+
+def build_table(header_rows: List[List[str]], body_rows: List[List[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Normalizes a grid into {"header": [column names], "rows": [[cell, ...], ...]}. Stacked header rows
+    are joined per column ("BLEU" over "EN-DE" -> "BLEU EN-DE"). Rows whose cells all hold the same
+    number of lines are unpacked into one row per line: PDF tables without row rules are often
+    extracted as a single row of multi-line cells. Returns None if no body row is left.
+    """
+    width = max(len(row) for row in header_rows + body_rows)
+    header = []
+    for column in range(width):
+        parts = []
+        for row in header_rows:
+            value = clean_cell(row[column]) if column < len(row) else ""
+            if value and (not parts or parts[-1] != value):
+                parts.append(value)
+        header.append(" ".join(parts) or f"Column {column + 1}")
+
+    rows = []
+    for row in body_rows:
+        cells = [str(row[column] or "") if column < len(row) else "" for column in range(width)]
+        lines = [cell.strip().splitlines() for cell in cells]
+        counts = {len(cell_lines) for cell_lines in lines if cell_lines}
+        n_lines = counts.pop() if len(counts) == 1 else 1
+        if n_lines > 1:
+            rows.extend([cell_lines[i] if cell_lines else "" for cell_lines in lines] for i in range(n_lines))
+        else:
+            rows.append(cells)
+    rows = [[clean_cell(cell) for cell in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    return {"header": header, "rows": rows} if rows else None
+
+def parse_table_html(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses table HTML (unstructured's text_as_html) with column spans expanded. Header rows are the
+    <thead> rows, else the leading rows made only of <th> cells, else the first row.
+    """
+    parser = _TableHTMLParser()
+    parser.feed(html)
+    parser.close()
+    grid, flags = [], []
+    for row in parser.rows:
+        if not row["cells"]:
+            continue
+        grid.append([text for cell in row["cells"] for text in ["".join(cell["text"])] * cell["colspan"]])
+        flags.append(row["thead"] or all(cell["header"] for cell in row["cells"]))
+    if len(grid) < 2:
+        return None
+    n_header = next((i for i, is_header in enumerate(flags) if not is_header), len(flags)) or 1
+    return build_table(grid[:n_header], grid[n_header:])
+
+def plausible_table(table: Dict[str, Any]) -> bool:
+    """
+    Rejects what a ruling-based table finder reports for plots and diagrams: single-column
+    grids, or grids that are mostly empty cells.
+    """
+    cells = [cell for row in table["rows"] for cell in row]
+    return len(table["header"]) >= 2 and sum(1 for cell in cells if cell) >= 0.5 * len(cells)
+
+def serialize_row(header: List[str], row: List[str], caption: str = None) -> str:
+    """
+    "Model: Transformer (big); BLEU EN-DE: 28.4; ... (Table 2: ...)": every value keeps its column
+    name, so the row is meaningful on its own to the embedder and the LLM.
+    """
+    text = "; ".join(f"{name}: {value}" for name, value in zip(header, row) if value)
+    if caption:
+        text += f" ({caption[:CAPTION_CONTEXT_CHARS]})"
+    return text
+
+def render_table(table: Dict[str, Any], max_chars: int = None) -> str:
+    """
+    Caption, header and rows as pipe-separated lines, cut at max_chars on a row boundary.
+    """
+    lines = [table["caption"]] if table.get("caption") else []
+    lines.append(" | ".join(table["header"]))
+    for row in table["rows"]:
+        line = " | ".join(row)
+        if max_chars and sum(len(l) + 1 for l in lines) + len(line) > max_chars:
+            lines.append("...")
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+def table_chunks(table: Dict[str, Any], doc_id: str, page: int, source: str, table_id: str,
+                 caption: str = None, max_cells: int = None) -> List[Dict[str, Any]]:
+    """
+    Chunks for one structured table: a summary chunk (caption and column names, for "which table
+    shows X") carrying the full table for the table store, then one chunk per row, or per group
+    of max_cells cells on wide rows. All are content_type "table"; rows also carry row_index.
+    """
+    max_cells = max_cells or TABLE_ROW_MAX_CELLS
+    header, rows = table["header"], table["rows"]
+    base = {"source": source, "page_number": page, "content_type": "table", "table_id": table_id}
+    summary = f"{caption}\n" if caption else ""
+    summary += f"Columns: {', '.join(header)}\nRows: {', '.join(row[0] for row in rows if row[0])}"
+    chunks = [{
+        "doc_id": doc_id,
+        "page": page,
+        "type": "table",
+        "content": summary,
+        "table": {"table_id": table_id, "source": source, "doc_id": doc_id, "page_number": page,
+                  "caption": caption or "", "header": header, "rows": rows},
+        "metadata": {**base, "element_type": "Table", "n_rows": len(rows), "n_columns": len(header)},
+    }]
+    for row_index, row in enumerate(rows):
+        # The first column usually names the row, so every cell group repeats it
+        for start in range(1, max(len(row), 2), max_cells - 1):
+            columns = [0] + list(range(start, min(start + max_cells - 1, len(row))))
+            chunks.append({
+                "doc_id": doc_id,
+                "page": page,
+                "type": "table",
+                "content": serialize_row([header[c] for c in columns], [row[c] for c in columns], caption),
+                "metadata": {**base, "element_type": "TableRow", "row_index": row_index},
+            })
+    return chunks
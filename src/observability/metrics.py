@@ -0,0 +1,186 @@
+import time
+import json
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+# Per-request correlation ID, set by the API middleware and inherited by threadpool/background work
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+trace_logger = logging.getLogger("rag.trace")
+
+# Latency buckets (seconds) spanning sub-millisecond metadata ops up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Minimal in-process counter/gauge/histogram registry rendered in the Prometheus text format.
+        Recording is a dict lookup plus a bisect under one lock, cheap enough to leave on.
+        """
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    @staticmethod
+    def _key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+        if not labels:
+            return ()
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None,
+                buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Plain-dict view of all series (used by benchmarks and tests).
+        """
+        with self._lock:
+            return {
+                "counters": {
+                    name: {key: value for key, value in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "gauges": {
+                    name: {key: value for key, value in series.items()}
+                    for name, series in self._gauges.items()
+                },
+                "histograms": {
+                    name: {key: {"count": h.count, "sum": h.sum} for key, h in series.items()}
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> str:
+        """
+        Renders every series in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{self._format_labels(key)} {value}")
+
+            for name, series in sorted(self._gauges.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{self._format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._format_labels(key, ('le', str(bound)))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(key, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{name}_sum{self._format_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{self._format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry used by every pipeline stage
+registry = MetricsRegistry()
+registry.describe("rag_stage_duration_seconds", "Wall time spent in a pipeline stage.")
+registry.describe("rag_stage_errors_total", "Pipeline stage executions that raised.")
+registry.describe("rag_http_request_duration_seconds", "HTTP request latency by route.")
+registry.describe("rag_http_requests_total", "HTTP requests by route and status code.")
+
+@contextmanager
+def span(stage: str, **labels: Any):
+    """
+    Times a pipeline stage and records it under rag_stage_duration_seconds{stage=...}.
+    Exceptions are counted in rag_stage_errors_total and re-raised unchanged.
+    When the "rag.trace" logger is at DEBUG, each span is also logged as a JSON line
+    carrying the current request ID.
+    """
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        registry.inc("rag_stage_errors_total", labels={"stage": stage, **labels})
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe("rag_stage_duration_seconds", elapsed, labels={"stage": stage, **labels})
+        if trace_logger.isEnabledFor(logging.DEBUG):
+            trace_logger.debug(json.dumps({
+                "request_id": request_id_var.get(),
+                "stage": stage,
+                "duration_ms": round(elapsed * 1000, 3),
+                "status": status,
+                **labels,
+            }))
+
+if __name__ == "__main__":
+    # Quick sanity check
+    with span("example"):
+        time.sleep(0.01)
+    print(registry.render())
@@ -1,41 +1,233 @@
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Optional
 from src.embeddings.model_loader import MultimodalEmbedder
 from src.vector_store.chroma_manager import ChromaManager
+from src.vector_store.table_store import TableStore
+from src.ingestion.tables import serialize_row, render_table
+from src.observability.metrics import span, registry
+
+# off: hits only | neighbors: hit + previous/next chunk, images + caption | page: hit + surrounding page text
+EXPAND_MODES = ("off", "neighbors", "page")
 
 class MultimodalRetriever:
-    def __init__(self, embedder: MultimodalEmbedder, vector_store: ChromaManager):
+    def __init__(self, embedder: MultimodalEmbedder, vector_store: ChromaManager,
+                 expand_mode: str = None, expand_max_chars: int = None,
+                 table_store: TableStore = None, table_min_score: float = None):
         """
         Initializes the retriever with an embedder and a vector store.
+        :param expand_mode: Default context expansion (RETRIEVAL_EXPAND), one of EXPAND_MODES.
+        :param expand_max_chars: Character budget of an expanded hit (RETRIEVAL_EXPAND_MAX_CHARS).
+        :param table_store: Enables the table route (see lookup_tables()).
+        :param table_min_score: Share of query terms a table cell must match for its row to be
+                                returned as a hit (RETRIEVAL_TABLE_MIN_SCORE); 0 disables it.
         """
         self.embedder = embedder
         self.vector_store = vector_store
+        self.expand_mode = expand_mode or os.getenv("RETRIEVAL_EXPAND", "neighbors")
+        self.expand_max_chars = expand_max_chars or int(os.getenv("RETRIEVAL_EXPAND_MAX_CHARS", "2000"))
+        self.table_store = table_store
+        self.table_min_score = float(os.getenv("RETRIEVAL_TABLE_MIN_SCORE", "0.6")) if table_min_score is None else table_min_score
 
-    def retrieve(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def retrieve(self, query: str, n_results: int = 5, where: Optional[Dict[str, Any]] = None,
+                 expand: Optional[str] = None) -> List[Dict[str, Any]]:
         """
-        Performs text-to-multimodal retrieval using LangChain's similarity search.
+        Performs text-to-multimodal retrieval: the query is encoded once into the CLIP
+        shared space and searched by vector, optionally restricted by a metadata filter.
+        Hits are then expanded with their neighbors (see expand()).
+        Unfiltered queries that the table store answers fully (see answered_by_tables()) return
+        the table rows without encoding the query or searching; partial table matches come
+        first, ahead of the vector hits.
         """
         print(f"[*] Retrieving context for query: '{query}'")
+        table_rows = self.lookup_tables(query, n_results) if where is None else []
+        if self.answered_by_tables(table_rows, n_results):
+            print(f"[+] Answered from {len(table_rows)} table rows without a vector search.")
+            return table_rows
         
         # 1. Encode the text query into the CLIP shared space
-        query_embedding = self.embedder.encode_text(query).cpu().detach().tolist()[0]
+        with span("query_embed"):
+            query_embedding = self.embedder.encode_text(query).tolist()[0]
         
-        # 2. Query LangChain Chroma
-        # Using similarity_search_with_relevance_scores or similar
-        docs_with_scores = self.vector_store.vectorstore.similarity_search_with_relevance_scores(
-            query=query, # This will use the internal embedding_function if provided
-            k=n_results
-        )
+        # 2. Search by vector (re-using the embedding instead of letting LangChain encode the query again)
+        results = self.vector_store.query([query_embedding], n_results=n_results, where=where)
         
         # 3. Format Results
+        formatted_results = self._format_results(results, 0)
+        self.expand([formatted_results], expand)
+        formatted_results = self.merge_table_rows(table_rows, formatted_results, n_results)
+        print(f"[+] Retrieved {len(formatted_results)} relevant items ({len(table_rows)} table rows).")
+        return formatted_results
+
+    def retrieve_batch(self, queries: List[str], n_results: int = 5, where: Optional[Dict[str, Any]] = None,
+                       expand: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieves context for many queries at once: one encoder forward pass for all
+        queries, one multi-vector search and one neighbor fetch. Queries answered by the
+        table store are left out of both, as in retrieve(). Results are returned in query order.
+        """
+        if not queries:
+            return []
+        print(f"[*] Retrieving context for a batch of {len(queries)} queries")
+        table_rows = [self.lookup_tables(query, n_results) if where is None else [] for query in queries]
+        searched = [i for i, rows in enumerate(table_rows) if not self.answered_by_tables(rows, n_results)]
+        if not searched:
+            return table_rows
+
+        with span("query_embed", batch="true"):
+            query_embeddings = self.embedder.encode_text([queries[i] for i in searched]).tolist()
+
+        results = self.vector_store.query(query_embeddings, n_results=n_results, where=where)
+        formatted = [self._format_results(results, i) for i in range(len(searched))]
+        self.expand(formatted, expand)
+        for i, hits in zip(searched, formatted):
+            table_rows[i] = self.merge_table_rows(table_rows[i], hits, n_results)
+        return table_rows
+
+    @staticmethod
+    def answered_by_tables(table_rows: List[Dict[str, Any]], n_results: int) -> bool:
+        """
+        True if the table rows are the whole answer: some rows matched every query term, and
+        there are n_results of those or all rows come from one table (each hit carries that table).
+        A vector search could only add chunks that match less of the query.
+        """
+        full = [row for row in table_rows if row["score"] >= 1.0]
+        if not full:
+            return False
+        return len(full) >= n_results or len({row["metadata"]["table_id"] for row in table_rows}) == 1
+
+    @staticmethod
+    def merge_table_rows(table_rows: List[Dict[str, Any]], hits: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+        """
+        Puts exact table matches ahead of the vector hits, dropping the hits that are the same
+        row chunks, and keeps n_results. A lookup that matched the wrong row then costs a slot
+        rather than the whole answer.
+        """
+        if not table_rows:
+            return hits
+        seen = {item["id"] for item in table_rows}
+        return (table_rows + [hit for hit in hits if hit["id"] not in seen])[:n_results]
+
+    def lookup_tables(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Table route: when some table cells' value-column name and row label cover at least
+        table_min_score of the query's terms ("BLEU score of Transformer big"), returns those rows,
+        best first, as hits. Each hit's context holds the matched cells and the table itself.
+        Returns [] if the query is not a confident table lookup.
+        """
+        if not self.table_store or self.table_min_score <= 0:
+            return []
+        cells = [c for c in self.table_store.lookup(query, limit=n_results * 4) if c["score"] >= self.table_min_score]
+        if not cells:
+            return []
+
+        rows: Dict[tuple, List[Dict[str, Any]]] = {}
+        for cell in cells:
+            key = (cell["table_id"], cell["row"])
+            if key in rows or len(rows) < n_results:
+                rows.setdefault(key, []).append(cell)
+
+        items = []
+        for (table_id, row), row_cells in rows.items():
+            table = row_cells[0]["table"]
+            values = [column[row] for column in table["data"]]
+            matched = "; ".join(f"{cell['column']} = {cell['value']}" for cell in row_cells)
+            full_table = {"caption": table["caption"], "header": table["columns"], "rows": [list(r) for r in zip(*table["data"])]}
+            items.append({
+                "id": table["row_ids"][row] or f"{table_id}#row{row}",
+                "content": serialize_row(table["columns"], values, table["caption"]),
+                "metadata": {"source": table["source"], "page_number": table["page_number"], "content_type": "table",
+                             "table_id": table_id, "row_index": row},
+                "score": row_cells[0]["score"],
+                "context": f"Matched cells: {matched}\n{render_table(full_table, max_chars=self.expand_max_chars)}",
+                "table_cells": [{"column": cell["column"], "value": cell["value"]} for cell in row_cells],
+            })
+        registry.inc("rag_table_routed_total")
+        return items
+
+    def expand(self, result_lists: List[List[Dict[str, Any]]], mode: Optional[str] = None) -> None:
+        """
+        Adds a "context" string to each hit, using the adjacency recorded at ingest
+        (prev_id/next_id, parent_id, caption_id): text hits are stitched with neighboring
+        chunks within expand_max_chars, image hits get their figure caption.
+        All missing neighbors for all hits are loaded with a single bulk fetch.
+        """
+        mode = mode or self.expand_mode
+        if mode not in EXPAND_MODES:
+            raise ValueError(f"Unknown expand mode '{mode}'. Expected one of: {', '.join(EXPAND_MODES)}")
+        hits = [item for items in result_lists for item in items]
+        if mode == "off" or not hits:
+            return
+
+        with span("context_expand", mode=mode):
+            pool = {item["id"]: item for item in hits}
+            if mode == "page":
+                parents = sorted({item["metadata"]["parent_id"] for item in hits if item["metadata"].get("parent_id")})
+                fetched = self.vector_store.get_items(where={"parent_id": {"$in": parents}}) if parents else {}
+            else:
+                wanted = {
+                    item["metadata"].get(key)
+                    for item in hits for key in ("prev_id", "next_id", "caption_id")
+                }
+                wanted = [i for i in wanted if i and i not in pool]
+                fetched = self.vector_store.get_items(ids=wanted) if wanted else {}
+            pool = {**fetched, **pool}
+
+            for item in hits:
+                metadata = item["metadata"]
+                if metadata["content_type"] == "image":
+                    caption = pool.get(metadata.get("caption_id"))
+                    if caption:
+                        item["context"] = caption["content"]
+                        item["expanded_ids"] = [metadata["caption_id"]]
+                    continue
+
+                if mode == "page":
+                    sequence = sorted(
+                        (i for i, c in pool.items()
+                         if c["metadata"].get("parent_id") == metadata.get("parent_id") and c["metadata"]["content_type"] != "image"),
+                        key=lambda i: pool[i]["metadata"].get("chunk_index", 0)
+                    )
+                else:
+                    sequence = [i for i in (metadata.get("prev_id"), item["id"], metadata.get("next_id")) if i in pool]
+                window = self._window(sequence, item["id"], pool)
+                if len(window) > 1:
+                    item["context"] = "\n".join(pool[i]["content"] for i in window)
+                    item["expanded_ids"] = [i for i in window if i != item["id"]]
+
+    def _window(self, sequence: List[str], hit_id: str, pool: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Grows a window around the hit, alternating before/after, while it fits in expand_max_chars.
+        """
+        if hit_id not in sequence:
+            return [hit_id]
+        start = end = sequence.index(hit_id)
+        budget = self.expand_max_chars - len(pool[hit_id]["content"])
+        grew = True
+        while grew:
+            grew = False
+            for candidate in (start - 1, end + 1):
+                if 0 <= candidate < len(sequence) and len(pool[sequence[candidate]]["content"]) <= budget:
+                    budget -= len(pool[sequence[candidate]]["content"])
+                    start, end = min(start, candidate), max(end, candidate)
+                    grew = True
+        return sequence[start:end + 1]
+
+    def _format_results(self, results: Dict[str, Any], index: int) -> List[Dict[str, Any]]:
+        """
+        Converts the index-th result set of a raw vector store query into scored items.
+        """
+        if not results or len(results.get("ids") or []) <= index:
+            return []
+
         formatted_results = []
-        for doc, score in docs_with_scores:
+        for item_id, document, metadata, distance in zip(results["ids"][index], results["documents"][index],
+                                                         results["metadatas"][index], results["distances"][index]):
             formatted_results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "score": score
+                "id": item_id,
+                "content": document,
+                "metadata": metadata,
+                "score": self.vector_store.relevance_score(distance)
             })
-            
-        print(f"[+] Retrieved {len(formatted_results)} relevant items.")
         return formatted_results
 
 if __name__ == "__main__":
@@ -1,41 +1,238 @@
 import os
-from typing import List, Dict, Any, Optional
+import sys
+import time
+import shutil
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator, Iterable
 from pathlib import Path
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from chromadb.api.client import SharedSystemClient
+
+from src.observability.metrics import span
 
 # Load environment variables
 load_dotenv()
 
+# Chroma's Rust core links its own SQLite. POSIX locks belong to the process, so a second SQLite
+# copy (Python's sqlite3) closing a connection in this process drops the locks Chroma holds and can
+# corrupt the database under concurrent queries: VACUUM runs in a child process instead.
+_RECLAIM_SCRIPT = """
+import sqlite3, sys
+conn = sqlite3.connect(sys.argv[1], isolation_level=None, timeout=60)
+try:
+    print("\\n".join(row[0] for row in conn.execute("SELECT id FROM segments")))
+    conn.execute("VACUUM")
+finally:
+    conn.close()
+"""
+
+# Bumped after every write; handles in other processes (query workers, the server next to a
+# maintenance CLI) reopen when it moves
+GENERATION_FILE = "index_generation"
+
+class _ReadWriteLock:
+    """
+    Many concurrent readers or one exclusive writer (writers are preferred so they can't starve).
+    Guards the collection handle so it can be swapped while queries are being served.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._writer = True
+            while self._readers:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
 class ChromaManager:
-    def __init__(self, persist_directory: str = None, collection_name: str = "multimodal_rag", embedding_function: Any = None):
+    def __init__(self, persist_directory: str = None, collection_name: str = "multimodal_rag", embedding_function: Any = None,
+                 read_only: bool = False):
         """
         Initializes the ChromaDB manager using LangChain's wrapper.
+        :param read_only: For query workers next to a separate ingest process: writes are refused.
+        Whether read-only or not, reads and writes first reopen the collection if another handle
+        published a new generation (see refresh()).
         """
         base_persist = persist_directory or os.getenv("VECTOR_DB_PATH", "./data/chroma")
         self.persist_directory = str(Path(base_persist))
         self.collection_name = collection_name
         self.embedding_function = embedding_function # We'll pass our CLIP embedder here later
+        self.shadow_name = f"{collection_name}__rebuild"
+        self.read_only = read_only
+        self._generation_path = os.path.join(self.persist_directory, GENERATION_FILE)
+        self._generation = self._read_generation()
+        self._refresh_lock = threading.Lock()
+        self._pinned = False
+        
+        # Queries hold the handle lock shared; only the final swap of rebuild() takes it exclusively.
+        # Writers (ingest, delete, rebuild) are serialized separately so a rebuild can't miss new chunks.
+        self._handle_lock = _ReadWriteLock()
+        self._write_lock = threading.RLock()
         
         # Initialize LangChain Chroma client
-        self.vectorstore = Chroma(
+        self.vectorstore = self._open()
+        if not read_only:
+            self._recover_interrupted_rebuild()
+        print(f"[+] LangChain-Chroma initialized at {self.persist_directory}")
+
+    def _open(self, client: Any = None) -> Chroma:
+        # Reusing the current client after a swap in this process keeps one client (and system) per path
+        if client is not None:
+            return Chroma(collection_name=self.collection_name, client=client, embedding_function=self.embedding_function)
+        return Chroma(
             collection_name=self.collection_name,
             persist_directory=self.persist_directory,
             embedding_function=self.embedding_function
         )
-        print(f"[+] LangChain-Chroma initialized at {self.persist_directory}")
+
+    def _read_generation(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._generation_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def publish(self) -> None:
+        """
+        Tells the other handles on this directory that the collection changed. Every publish makes
+        each of them drop and reopen its client (and reload the HNSW index) on its next request. The new generation
+        is recorded as this handle's own, so the writer does not reopen after its own writes.
+        """
+        tmp_path = f"{self._generation_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"{time.time_ns()}\n")
+        # rename() keeps inode, mtime and size: this is exactly what other handles will read
+        stat = os.stat(tmp_path)
+        os.replace(tmp_path, self._generation_path)
+        self._generation = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise PermissionError(f"Collection '{self.collection_name}' is opened read-only; writes go through the ingest worker.")
+
+    def refresh(self) -> bool:
+        """
+        Reopens the collection if another handle published a new generation: an ingest writer seen
+        from a query worker, or a maintenance CLI delete or rebuild seen from the server. Chroma caches
+        one client per path and process, and its in-memory HNSW index never sees another process's
+        writes (after a rebuild, not even the collection), so the client is closed first.
+        Costs one stat() when nothing changed. Returns True if reopened. While replace_with() holds
+        the handle (see _pin()), it keeps serving the handle being copied and returns False.
+        """
+        if self._read_generation() == self._generation:
+            return False
+        with self._refresh_lock:
+            generation = self._read_generation()
+            if generation == self._generation or self._pinned:
+                return False
+            with self._handle_lock.write():
+                self._close_client()
+                self.vectorstore = self._open()
+                self._generation = generation
+        return True
+
+    @contextmanager
+    def _pin(self):
+        """
+        Keeps the current handle until the block ends: refresh() does not reopen meanwhile, so a
+        rebuild pages through and swaps the same client it started with.
+        """
+        with self._refresh_lock:
+            self._pinned = True
+        try:
+            yield
+        finally:
+            with self._refresh_lock:
+                self._pinned = False
+
+    def _close_client(self) -> None:
+        """
+        Stops the Chroma system behind the handle: its SQLite connections and in-memory HNSW index
+        are released, and the next _open() for the path starts from what is on disk. Chroma shares
+        one system per path and process, so this manager must be the path's only handle here.
+        Called with the handle lock held exclusively.
+        """
+        client = self.vectorstore._client
+        if hasattr(client, "close"):
+            client.close()
+        else:
+            # Releases older than Client.close() only offer clearing every cached system
+            SharedSystemClient.clear_system_cache()
+
+    def close(self) -> None:
+        """
+        Releases the collection when it is evicted from a tenant pool: waits for in-flight reads,
+        then closes the Chroma client so its HNSW index and SQLite connections are freed.
+        The manager must not be used for new work afterwards.
+        """
+        with self._handle_lock.write():
+            self._close_client()
+
+    def _collection_names(self) -> List[str]:
+        # list_collections() returns names in recent Chroma releases and Collection objects in older ones
+        return [c if isinstance(c, str) else c.name for c in self.vectorstore._client.list_collections()]
+
+    def _recover_interrupted_rebuild(self) -> None:
+        """
+        A rebuild killed between dropping the old collection and renaming the shadow leaves
+        an empty primary next to a complete shadow: finish the swap instead of serving nothing.
+        """
+        if self.shadow_name not in self._collection_names():
+            return
+        client = self.vectorstore._client
+        shadow = client.get_collection(self.shadow_name)
+        if self.vectorstore._collection.count() == 0 and shadow.count() > 0:
+            print(f"[!] Completing interrupted rebuild of '{self.collection_name}' from {self.shadow_name}")
+            client.delete_collection(self.collection_name)
+            shadow.modify(name=self.collection_name)
+            self.vectorstore = self._open(client)
+        else:
+            client.delete_collection(self.shadow_name)
 
     def add_embeddings(self, 
                        ids: List[str], 
                        embeddings: List[Any], 
                        metadatas: List[Dict[str, Any]], 
-                       documents: List[str]):
+                       documents: List[str],
+                       publish: bool = True):
         """
         Adds embeddings and metadata to the collection.
+        :param publish: False when the caller adds several batches that belong together (one file)
+                        and calls publish() once after the last, so other handles reopen once.
         """
         if not ids:
             return
+        self._check_writable()
+        self.refresh()
             
         try:
             # Ensure embeddings are standard Python floats
@@ -46,12 +243,15 @@ class ChromaManager:
                 casted_embeddings.append([float(v) for v in emb])
             
             print(f"[*] Adding {len(ids)} items to LangChain-Chroma...", flush=True)
-            self.vectorstore._collection.add(
-                ids=ids,
-                embeddings=casted_embeddings,
-                metadatas=metadatas,
-                documents=documents
-            )
+            with self._write_lock, self._handle_lock.read(), span("vector_write"):
+                self.vectorstore._collection.add(
+                    ids=ids,
+                    embeddings=casted_embeddings,
+                    metadatas=metadatas,
+                    documents=documents
+                )
+            if publish:
+                self.publish()
             print(f"[+] Added {len(ids)} items. Total: {self.get_count()}", flush=True)
         except Exception as e:
             print(f"[!] Critical error in ChromaManager.add_embeddings: {e}")
@@ -63,22 +263,205 @@ class ChromaManager:
         """
         Native query support for multimodal embeddings.
         """
+        self.refresh()
         try:
             # LangChain Chroma doesn't have a direct 'query_by_embedding' that returns the same format as raw chroma
             # But we can access the underlying collection
-            results = self.vectorstore._collection.query(
-                query_embeddings=query_embeddings,
-                n_results=n_results,
-                where=where,
-                include=["metadatas", "documents", "distances"]
-            )
+            with self._handle_lock.read(), span("vector_search"):
+                results = self.vectorstore._collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_results,
+                    where=where,
+                    include=["metadatas", "documents", "distances"]
+                )
             return results
         except Exception as e:
             print(f"[!] Error querying ChromaDB: {e}")
             return {}
 
+    def relevance_score(self, distance: float) -> float:
+        """
+        Converts a raw distance from query() into LangChain's [0, 1] relevance score
+        for this collection's distance metric.
+        """
+        return self.vectorstore._select_relevance_score_fn()(distance)
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """
+        Bulk-fetches stored embeddings by ID. Missing IDs are simply absent from the result.
+        """
+        if not ids:
+            return {}
+        self.refresh()
+        try:
+            with self._handle_lock.read():
+                results = self.vectorstore._collection.get(ids=list(set(ids)), include=["embeddings"])
+            return {
+                item_id: [float(v) for v in emb]
+                for item_id, emb in zip(results["ids"], results["embeddings"])
+            }
+        except Exception as e:
+            print(f"[!] Error fetching embeddings from ChromaDB: {e}")
+            return {}
+
+    def get_items(self, ids: List[str] = None, where: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Bulk-fetches stored chunks (document + metadata, no vectors) by ID and/or metadata filter
+        in a single call. Returns {id: {"content": ..., "metadata": ...}}.
+        """
+        if not ids and not where:
+            return {}
+        self.refresh()
+        try:
+            with self._handle_lock.read(), span("vector_get"):
+                results = self.vectorstore._collection.get(
+                    ids=list(set(ids)) if ids else None,
+                    where=where,
+                    include=["metadatas", "documents"]
+                )
+            return {
+                item_id: {"content": document, "metadata": metadata}
+                for item_id, document, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+            }
+        except Exception as e:
+            print(f"[!] Error fetching items from ChromaDB: {e}")
+            return {}
+
     def get_count(self) -> int:
-        return self.vectorstore._collection.count()
+        self.refresh()
+        with self._handle_lock.read():
+            return self.vectorstore._collection.count()
+
+    def iter_items(self, include: List[str] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Pages through the whole collection, yielding raw get() results of up to batch_size items.
+        :param include: Any of "metadatas", "documents", "embeddings" (default: metadatas).
+        """
+        include = include or ["metadatas"]
+        self.refresh()
+        offset = 0
+        while True:
+            with self._handle_lock.read():
+                page = self.vectorstore._collection.get(include=include, limit=batch_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page
+            offset += len(page["ids"])
+
+    def delete(self, ids: List[str] = None, where: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Deletes chunks by ID and/or metadata filter. Returns the number of chunks removed.
+        """
+        if not ids and not where:
+            return 0
+        self._check_writable()
+        self.refresh()
+        with self._write_lock, self._handle_lock.read():
+            collection = self.vectorstore._collection
+            matched = collection.get(ids=ids, where=where, include=[])["ids"]
+            if matched:
+                collection.delete(ids=matched)
+                self.publish()
+        print(f"[+] Deleted {len(matched)} items. Total: {self.get_count()}", flush=True)
+        return len(matched)
+
+    def disk_usage(self) -> int:
+        """
+        Bytes used by the persist directory (SQLite metadata + HNSW segment files).
+        """
+        total = 0
+        for root, _, files in os.walk(self.persist_directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _reclaim_disk(self) -> None:
+        """
+        Chroma keeps the HNSW directory of a dropped collection and SQLite never shrinks on its own:
+        VACUUM the metadata database (in a child process, see _RECLAIM_SCRIPT), then remove segment
+        directories no live segment refers to. The client is closed for the VACUUM and reopened after,
+        so no connection of this process is open on the database; queries wait for it under the
+        exclusive handle lock. Called with the write lock held (no concurrent writers).
+        """
+        db_path = os.path.join(self.persist_directory, "chroma.sqlite3")
+        with self._handle_lock.write():
+            self._close_client()
+            try:
+                result = subprocess.run([sys.executable, "-c", _RECLAIM_SCRIPT, db_path], capture_output=True, text=True)
+            finally:
+                self.vectorstore = self._open()
+        if result.returncode:
+            error = result.stderr.strip().splitlines()[-1:] or ["unknown error"]
+            print(f"[!] Could not reclaim disk space in {self.persist_directory}: {error[0]}")
+            return
+        live = set(result.stdout.split())
+        for entry in os.scandir(self.persist_directory):
+            # Segment directories are named by segment UUID
+            if entry.is_dir() and len(entry.name) == 36 and entry.name.count("-") == 4 and entry.name not in live:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def replace_with(self, pages: Iterable[Dict[str, Any]], collection_metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Loads pages ({"ids", "embeddings", "metadatas", "documents"}) into a fresh shadow collection
+        and swaps it in under the original name. Queries keep running against the old handle while
+        it loads and only wait for the swap. Ingest and deletes are blocked throughout, so nothing
+        written meanwhile is lost. If the pages raise (e.g. a corrupt snapshot), the shadow is dropped
+        and the live collection is left untouched. Returns the number of items loaded.
+        The handle is pinned throughout (see _pin()), so pages read from this collection (rebuild())
+        come from the client the swap runs on.
+        """
+        self._check_writable()
+        self.refresh()
+        with self._write_lock, self._pin():
+            client = self.vectorstore._client
+            if self.shadow_name in self._collection_names():
+                client.delete_collection(self.shadow_name)
+            shadow = client.create_collection(
+                self.shadow_name,
+                metadata=collection_metadata if collection_metadata is not None else self.vectorstore._collection.metadata
+            )
+
+            loaded = 0
+            try:
+                for page in pages:
+                    shadow.add(ids=page["ids"], embeddings=page["embeddings"],
+                               metadatas=page["metadatas"], documents=page["documents"])
+                    loaded += len(page["ids"])
+            except BaseException:
+                client.delete_collection(self.shadow_name)
+                raise
+
+            # In-flight queries drain before the old collection is dropped
+            with self._handle_lock.write():
+                client.delete_collection(self.collection_name)
+                shadow.modify(name=self.collection_name)
+                self.vectorstore = self._open(client)
+            self.publish()
+            self._reclaim_disk()
+        return loaded
+
+    def rebuild(self, batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        Compacts the collection: live chunks are copied into a fresh shadow collection (so its
+        HNSW index holds no deleted entries), which then replaces the original (see replace_with).
+        """
+        with self._write_lock:
+            started = time.perf_counter()
+            disk_before = self.disk_usage()
+            copied = self.replace_with(self.iter_items(include=["embeddings", "metadatas", "documents"], batch_size=batch_size))
+
+        result = {
+            "collection": self.collection_name,
+            "items": copied,
+            "seconds": time.perf_counter() - started,
+            "disk_bytes_before": disk_before,
+            "disk_bytes_after": self.disk_usage(),
+        }
+        print(f"[+] Rebuilt '{self.collection_name}' with {copied} items in {result['seconds']:.1f}s", flush=True)
+        return result
 
 if __name__ == "__main__":
     # Quick sanity check
@@ -0,0 +1,186 @@
+"""
+Collection maintenance: stats, orphan detection, per-document deletes and compaction.
+
+    python -m src.vector_store.maintenance stats
+    python -m src.vector_store.maintenance orphans [--delete] [--force]
+    python -m src.vector_store.maintenance delete "Attention Is All You Need.pdf"
+    python -m src.vector_store.maintenance rebuild
+
+The same operations are exposed by the API under /admin. Reads page through the collection and
+are safe next to a serving process. Deletes and rebuilds publish a new index generation, so a
+running server and its query workers reopen the collection on their next request. The CLI's writes
+are not coordinated with the server's own ingest, though: while the server is ingesting into the
+same collection, delete and rebuild through /admin instead, where they are serialized with its writes.
+"""
+import os
+import json
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any
+
+from src.vector_store.chroma_manager import ChromaManager
+from src.vector_store.table_store import TableStore, tables_path
+from src.vector_store.tenants import DEFAULT_TENANT, tenant_paths, validate_tenant_id
+from src.ingestion.image_dedup import PerceptualHashIndex, INDEX_FILENAME
+from src.ingestion.manifest import read_manifest, write_manifest, manifest_path
+
+class CollectionMaintenance:
+    def __init__(self, vector_store: ChromaManager, image_dir: str = None, table_store: TableStore = None,
+                 processed_dir: str = None, dedup_index: PerceptualHashIndex = None):
+        """
+        :param image_dir: Where extracted images live (for unreferenced-file reporting);
+                          defaults to <processed_dir>/images.
+        :param table_store: The structured-table sidecar, kept in step with document deletes.
+        :param dedup_index: The near-duplicate image index, kept in step with deletes and rebuilds;
+                            pass the ingest pipeline's own so its in-memory copy sees the removals.
+        :param processed_dir: The collection's processed data (images, ingest manifest, tables);
+                              defaults to PROCESSED_DATA_PATH.
+        """
+        processed_dir = processed_dir or os.getenv("PROCESSED_DATA_PATH", "./data/processed")
+        self.vector_store = vector_store
+        self.image_dir = Path(image_dir or Path(processed_dir) / "images")
+        self.table_store = table_store or TableStore(tables_path(processed_dir))
+        self.manifest_path = manifest_path(processed_dir)
+        self.dedup_index_path = Path(processed_dir) / INDEX_FILENAME
+        self._dedup_index = dedup_index
+
+    @property
+    def dedup_index(self) -> PerceptualHashIndex:
+        # Loaded only by the operations that change it, not by stats or orphan reports
+        if self._dedup_index is None:
+            self._dedup_index = PerceptualHashIndex(index_path=str(self.dedup_index_path))
+        return self._dedup_index
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Chunk counts per document and per modality, plus on-disk size.
+        """
+        documents: Dict[str, Dict[str, int]] = {}
+        modalities: Dict[str, int] = {}
+        total = 0
+        for page in self.vector_store.iter_items():
+            for metadata in page["metadatas"]:
+                source = metadata.get("source", "<unknown>")
+                content_type = metadata.get("content_type", "<unknown>")
+                counts = documents.setdefault(source, {"total": 0})
+                counts[content_type] = counts.get(content_type, 0) + 1
+                counts["total"] += 1
+                modalities[content_type] = modalities.get(content_type, 0) + 1
+                total += 1
+        return {
+            "collection": self.vector_store.collection_name,
+            "total": total,
+            "modalities": modalities,
+            "documents": dict(sorted(documents.items())),
+            "tables": len(self.table_store),
+            "disk_bytes": self.vector_store.disk_usage(),
+        }
+
+    def find_orphans(self) -> Dict[str, Any]:
+        """
+        Chunks whose source file or image_path no longer exists on disk (renamed or removed
+        documents, partial ingests), and image files that no chunk references any more.
+        Paths are checked relative to the current working directory, as they were stored at ingest.
+        """
+        exists: Dict[str, bool] = {}
+
+        def check(path: str) -> bool:
+            if path not in exists:
+                exists[path] = os.path.exists(path)
+            return exists[path]
+
+        orphans: List[Dict[str, str]] = []
+        referenced_images = set()
+        total = 0
+        for page in self.vector_store.iter_items():
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                total += 1
+                source, image_path = metadata.get("source"), metadata.get("image_path")
+                if image_path:
+                    referenced_images.add(os.path.basename(image_path))
+                if not source or not check(source):
+                    orphans.append({"id": chunk_id, "source": source, "reason": "missing_source"})
+                elif image_path and not check(image_path):
+                    orphans.append({"id": chunk_id, "source": source, "reason": "missing_image"})
+
+        unreferenced = []
+        if self.image_dir.is_dir():
+            unreferenced = sorted(p.name for p in self.image_dir.iterdir() if p.is_file() and p.name not in referenced_images)
+        return {"total": total, "orphans": orphans, "unreferenced_images": unreferenced}
+
+    def delete_orphans(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Deletes orphaned chunks. Refuses to empty the whole collection unless force=True, since that
+        usually means the documents directory isn't mounted rather than that every file is gone.
+        Unreferenced image files are only reported: the near-duplicate index may still point at them.
+        """
+        report = self.find_orphans()
+        ids = [o["id"] for o in report["orphans"]]
+        if ids and len(ids) == report["total"] and not force:
+            raise ValueError(f"All {len(ids)} chunks look orphaned; check the working directory and document paths, or pass force.")
+        deleted = self.vector_store.delete(ids=ids) if ids else 0
+        return {"deleted": deleted, "unreferenced_images": report["unreferenced_images"]}
+
+    def resolve_sources(self, document: str) -> List[str]:
+        """
+        Maps a document name to the stored source values: exact match first, then by file name.
+        """
+        sources = list(self.stats()["documents"])
+        if document in sources:
+            return [document]
+        return [s for s in sources if os.path.basename(s) == os.path.basename(document)]
+
+    def delete_document(self, document: str) -> Dict[str, Any]:
+        sources = self.resolve_sources(document)
+        deleted = self.vector_store.delete(where={"source": {"$in": sources}}) if sources else 0
+        manifest = read_manifest(self.manifest_path)
+        if any(s in manifest["files"] for s in sources):
+            for source in sources:
+                manifest["files"].pop(source, None)
+            write_manifest(manifest, self.manifest_path)
+        tables = self.table_store.remove_sources(sources) if sources else 0
+        images = self.dedup_index.remove_sources(sources) if sources else 0
+        return {"document": document, "sources": sources, "deleted": deleted, "tables": tables, "images": images}
+
+    def rebuild(self) -> Dict[str, Any]:
+        """
+        Compacts the collection, then drops near-duplicate entries of documents it no longer holds
+        (e.g. removed with orphans --delete).
+        """
+        result = self.vector_store.rebuild()
+        live = set()
+        for page in self.vector_store.iter_items():
+            live.update(metadata.get("source") for metadata in page["metadatas"])
+        result["images_forgotten"] = self.dedup_index.remove_sources(self.dedup_index.sources() - live)
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance for a tenant's Chroma collection (default: the one at VECTOR_DB_PATH).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Chunks per document and modality, and on-disk size.")
+    orphans = commands.add_parser("orphans", help="Chunks whose source or image file no longer exists.")
+    orphans.add_argument("--delete", action="store_true", help="Delete the orphaned chunks.")
+    orphans.add_argument("--force", action="store_true", help="Allow deleting even if every chunk is orphaned.")
+    delete = commands.add_parser("delete", help="Delete all chunks of a document (path or file name).")
+    delete.add_argument("document")
+    commands.add_parser("rebuild", help="Compact the collection into a fresh index and swap it in.")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    parser.add_argument("--collection", help="Collection name (default: the tenant's).")
+    args = parser.parse_args()
+
+    # No embedding function needed: maintenance never encodes anything
+    paths = tenant_paths(validate_tenant_id(args.tenant))
+    vector_store = ChromaManager(persist_directory=paths["vector_db"], collection_name=args.collection or paths["collection"])
+    maintenance = CollectionMaintenance(vector_store, processed_dir=paths["processed"])
+    if args.command == "stats":
+        result = maintenance.stats()
+    elif args.command == "orphans":
+        result = maintenance.delete_orphans(force=args.force) if args.delete else maintenance.find_orphans()
+    elif args.command == "delete":
+        result = maintenance.delete_document(args.document)
+    else:
+        result = maintenance.rebuild()
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
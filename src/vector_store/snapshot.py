@@ -0,0 +1,388 @@
+"""
+Versioned, streaming, checksummed index snapshots for bootstrapping replicas without re-ingesting.
+
+    python -m src.vector_store.snapshot export data/index.ragsnap [--include-images]
+    python -m src.vector_store.snapshot inspect data/index.ragsnap
+    python -m src.vector_store.snapshot import data/index.ragsnap
+    python -m src.vector_store.snapshot --tenant acme export data/acme.ragsnap
+
+Layout (all integers little-endian):
+
+    magic b"RAGSNAP\\0" | u16 format version
+    u32 header length | header JSON (collection, embedding model, dim, collection metadata, ingest manifest)
+    frames:
+      u8 1 (items) | u32 n | u32 json length | JSON {ids, metadatas, documents} | n*dim float32 | u32 crc32
+      u8 2 (file)  | u32 name length | name | u64 size | bytes | u32 crc32   (sidecars, bundled images)
+    u8 0 (end) | u64 item count | 32-byte sha256 of everything before it
+
+Vectors are raw float32 rows, so loading needs no model inference and no JSON number parsing.
+Files are streamed in FILE_BLOCK_SIZE blocks in both directions, so a large image is never held whole.
+"""
+import os
+import json
+import time
+import zlib
+import shutil
+import struct
+import hashlib
+import tempfile
+import argparse
+import itertools
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, BinaryIO
+
+import numpy as np
+
+from src.vector_store.chroma_manager import ChromaManager
+from src.vector_store.table_store import TABLES_FILENAME, tables_path
+from src.vector_store.tenants import DEFAULT_TENANT, tenant_paths, validate_tenant_id
+from src.ingestion.manifest import read_manifest, write_manifest, manifest_path
+from src.ingestion.image_dedup import INDEX_FILENAME
+
+MAGIC = b"RAGSNAP\x00"
+FORMAT_VERSION = 1
+FRAME_END, FRAME_ITEMS, FRAME_FILE = 0, 1, 2
+FILE_BLOCK_SIZE = 1 << 20
+
+class SnapshotError(RuntimeError):
+    """
+    The snapshot is corrupt, truncated, from an unsupported version or for a different embedding model.
+    """
+
+def sidecar_paths(processed_dir: str = None) -> Dict[str, Path]:
+    """
+    The files next to the collection whose entries point at its chunk IDs: the table store and the
+    near-duplicate image index. They travel with the vectors and are replaced with them.
+    """
+    processed = Path(processed_dir or os.getenv("PROCESSED_DATA_PATH", "./data/processed"))
+    return {TABLES_FILENAME: tables_path(str(processed)), INDEX_FILENAME: processed / INDEX_FILENAME}
+
+def iter_snapshot(vector_store: ChromaManager, embedding_model: str, include_images: bool = False,
+                  batch_size: int = 1000, processed_dir: str = None) -> Iterator[bytes]:
+    """
+    Streams a snapshot of the collection as byte blocks (one per frame), so it can be written
+    to disk or sent over HTTP without holding the index in memory.
+    Paging runs without blocking ingest: the trailer's count, not the header's, is authoritative.
+    :param processed_dir: Where the collection's ingest manifest and tables live (default PROCESSED_DATA_PATH).
+    """
+    digest = hashlib.sha256()
+
+    def emit(block: bytes) -> bytes:
+        digest.update(block)
+        return block
+
+    pages = vector_store.iter_items(include=["embeddings", "metadatas", "documents"], batch_size=batch_size)
+    first = next(pages, None)
+    dim = len(first["embeddings"][0]) if first else 0
+    header = json.dumps({
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "collection": vector_store.collection_name,
+        "collection_metadata": vector_store.vectorstore._collection.metadata,
+        "embedding_model": embedding_model,
+        "dim": dim,
+        "count": vector_store.get_count(),
+        "include_images": include_images,
+        "manifest": read_manifest(manifest_path(processed_dir)),
+    }).encode("utf-8")
+    yield emit(MAGIC + struct.pack("<H", FORMAT_VERSION) + struct.pack("<I", len(header)) + header)
+
+    count = 0
+    image_paths = set()
+    for page in (itertools.chain([first], pages) if first else []):
+        body = json.dumps({"ids": page["ids"], "metadatas": page["metadatas"], "documents": page["documents"]}).encode("utf-8")
+        vectors = np.asarray(page["embeddings"], dtype="<f4").tobytes()
+        crc = zlib.crc32(vectors, zlib.crc32(body))
+        yield emit(struct.pack("<BII", FRAME_ITEMS, len(page["ids"]), len(body)) + body + vectors + struct.pack("<I", crc))
+        count += len(page["ids"])
+        if include_images:
+            image_paths.update(m["image_path"] for m in page["metadatas"] if m.get("image_path"))
+
+    files = [(name, str(path)) for name, path in sidecar_paths(processed_dir).items()]
+    files += [(os.path.basename(p), p) for p in sorted(image_paths)]
+    for file_name, file_path in files:
+        try:
+            f = open(file_path, "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            continue
+        with f:
+            # Only the size seen now is sent, so a sidecar appended to meanwhile stays consistent with its header
+            remaining = os.fstat(f.fileno()).st_size
+            name = file_name.encode("utf-8")
+            yield emit(struct.pack("<BI", FRAME_FILE, len(name)) + name + struct.pack("<Q", remaining))
+            crc = 0
+            while remaining:
+                block = f.read(min(FILE_BLOCK_SIZE, remaining))
+                if not block:
+                    raise SnapshotError(f"{file_path} was truncated while it was being exported.")
+                crc = zlib.crc32(block, crc)
+                remaining -= len(block)
+                yield emit(block)
+        yield emit(struct.pack("<I", crc))
+
+    end = struct.pack("<BQ", FRAME_END, count)
+    digest.update(end)
+    yield end + digest.digest()
+
+def export_snapshot(vector_store: ChromaManager, path: str, embedding_model: str, include_images: bool = False,
+                    processed_dir: str = None) -> Dict[str, Any]:
+    """
+    Writes a snapshot to path (atomically, via a temporary file). Returns a summary with its sha256.
+    """
+    started = time.perf_counter()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    size = 0
+    with open(tmp_path, "wb") as f:
+        for block in iter_snapshot(vector_store, embedding_model, include_images=include_images, processed_dir=processed_dir):
+            f.write(block)
+            size += len(block)
+    os.replace(tmp_path, path)
+    with open(path, "rb") as f:
+        f.seek(-32, os.SEEK_END)
+        sha256 = f.read().hex()
+    return {"path": str(path), "bytes": size, "sha256": sha256, "seconds": time.perf_counter() - started}
+
+class SnapshotReader:
+    def __init__(self, stream: BinaryIO):
+        """
+        Incremental reader over a snapshot byte stream (file or HTTP response body).
+        Every byte is hashed as it is read and each item frame's CRC is checked before it is used;
+        file contents are streamed out before their CRC, so callers must stage them (see pages()).
+        """
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.count = 0
+        magic = self._read(len(MAGIC))
+        if magic != MAGIC:
+            raise SnapshotError("Not an index snapshot (bad magic).")
+        (version,) = struct.unpack("<H", self._read(2))
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format version {version} (expected {FORMAT_VERSION}).")
+        (header_len,) = struct.unpack("<I", self._read(4))
+        self.header: Dict[str, Any] = json.loads(self._read(header_len))
+
+    def _read(self, n: int, hashed: bool = True) -> bytes:
+        # Network streams may return short reads
+        blocks, remaining = [], n
+        while remaining:
+            block = self.stream.read(remaining)
+            if not block:
+                raise SnapshotError("Snapshot is truncated.")
+            blocks.append(block)
+            remaining -= len(block)
+        data = b"".join(blocks)
+        if hashed:
+            self.digest.update(data)
+        return data
+
+    def pages(self, on_file=None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields item pages in Chroma add() form. For each file frame, on_file(name) may return a
+        binary file object: the contents are written to it block by block and it is closed after.
+        Raises SnapshotError on any CRC, count or sha256 mismatch, after the last page at the latest,
+        so written files must not be used before the pages are exhausted.
+        """
+        dim = self.header["dim"]
+        while True:
+            (frame_type,) = struct.unpack("<B", self._read(1))
+            if frame_type == FRAME_ITEMS:
+                n, body_len = struct.unpack("<II", self._read(8))
+                body = self._read(body_len)
+                vectors = self._read(n * dim * 4)
+                (crc,) = struct.unpack("<I", self._read(4))
+                if zlib.crc32(vectors, zlib.crc32(body)) != crc:
+                    raise SnapshotError(f"CRC mismatch in item frame after {self.count} items.")
+                page = json.loads(body)
+                page["embeddings"] = np.frombuffer(vectors, dtype="<f4").reshape(n, dim)
+                self.count += n
+                yield page
+            elif frame_type == FRAME_FILE:
+                (name_len,) = struct.unpack("<I", self._read(4))
+                name = self._read(name_len).decode("utf-8")
+                (remaining,) = struct.unpack("<Q", self._read(8))
+                sink = on_file(name) if on_file else None
+                crc = 0
+                try:
+                    while remaining:
+                        block = self._read(min(FILE_BLOCK_SIZE, remaining))
+                        crc = zlib.crc32(block, crc)
+                        remaining -= len(block)
+                        if sink:
+                            sink.write(block)
+                finally:
+                    if sink:
+                        sink.close()
+                (expected,) = struct.unpack("<I", self._read(4))
+                if crc != expected:
+                    raise SnapshotError(f"CRC mismatch in file frame '{name}'.")
+            elif frame_type == FRAME_END:
+                (count,) = struct.unpack("<Q", self._read(8))
+                expected = self.digest.digest()
+                if self._read(32, hashed=False) != expected:
+                    raise SnapshotError("sha256 mismatch: snapshot is corrupt.")
+                if count != self.count:
+                    raise SnapshotError(f"Item count mismatch: trailer says {count}, read {self.count}.")
+                return
+            else:
+                raise SnapshotError(f"Unknown frame type {frame_type}.")
+
+def open_snapshot(source: str) -> BinaryIO:
+    """
+    Opens a snapshot from a local path or an http(s) URL (e.g. another replica's /admin/snapshot).
+    """
+    if source.startswith(("http://", "https://")):
+        import requests
+        headers = {"X-Admin-Token": os.getenv("ADMIN_TOKEN")} if os.getenv("ADMIN_TOKEN") else {}
+        response = requests.get(source, stream=True, timeout=60, headers=headers)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return response.raw
+    return open(source, "rb")
+
+def import_snapshot(vector_store: ChromaManager, source: str, embedding_model: Optional[str] = None,
+                    image_dir: str = None, force: bool = False, processed_dir: str = None) -> Dict[str, Any]:
+    """
+    Streams a snapshot into a fresh collection and swaps it in (ChromaManager.replace_with): the live
+    collection is only replaced once every checksum has passed. No model inference is involved.
+    :param embedding_model: The running embedder's model ID; a snapshot built with another model is
+                            rejected unless force=True, since its vectors would not match query embeddings.
+    :param image_dir: Where bundled images end up (default <processed_dir>/images); image_path
+                      metadata is rewritten to point there. They are staged next to it and only
+                      moved in after the swap, so a rejected snapshot leaves the live images alone.
+    :param processed_dir: Where the collection's ingest manifest and sidecars live (default PROCESSED_DATA_PATH).
+                          Sidecars (see sidecar_paths()) are replaced by the snapshot's, or removed if it has
+                          none, since the previous collection's would point at chunks that no longer exist.
+    """
+    started = time.perf_counter()
+    processed_dir = processed_dir or os.getenv("PROCESSED_DATA_PATH", "./data/processed")
+    image_dir = Path(image_dir or Path(processed_dir) / "images")
+    sidecars = sidecar_paths(processed_dir)
+    stream = open_snapshot(source)
+    staged: Dict[str, Path] = {}
+    staged_sidecars: Dict[str, Path] = {}
+    staging_dir = []
+    try:
+        reader = SnapshotReader(stream)
+        header = reader.header
+        if embedding_model and header["embedding_model"] != embedding_model and not force:
+            raise SnapshotError(f"Snapshot was built with '{header['embedding_model']}', but the running model is '{embedding_model}'.")
+
+        def save_file(name: str) -> BinaryIO:
+            # Nothing is written in place until the collection has been swapped in
+            if name in sidecars:
+                sidecars[name].parent.mkdir(parents=True, exist_ok=True)
+                staged_sidecars[name] = sidecars[name].with_name(sidecars[name].name + ".snapshot")
+                return open(staged_sidecars[name], "wb")
+            if not staging_dir:
+                # Same file system as image_dir, so moving the images in is a rename
+                image_dir.parent.mkdir(parents=True, exist_ok=True)
+                staging_dir.append(Path(tempfile.mkdtemp(prefix=".snapshot-images-", dir=image_dir.parent)))
+            file_name = os.path.basename(name)
+            staged[file_name] = staging_dir[0] / file_name
+            return open(staged[file_name], "wb")
+
+        def pages() -> Iterator[Dict[str, Any]]:
+            for page in reader.pages(on_file=save_file):
+                if header.get("include_images"):
+                    for metadata in page["metadatas"]:
+                        if metadata.get("image_path"):
+                            metadata["image_path"] = str(image_dir / os.path.basename(metadata["image_path"]))
+                yield page
+
+        loaded = vector_store.replace_with(pages(), collection_metadata=header.get("collection_metadata"))
+        if staged:
+            image_dir.mkdir(parents=True, exist_ok=True)
+            for file_name, staged_path in staged.items():
+                os.replace(staged_path, image_dir / file_name)
+        for name, target in sidecars.items():
+            staged_path = staged_sidecars.get(name)
+            if staged_path is None:
+                target.unlink(missing_ok=True)
+                continue
+            if name == INDEX_FILENAME and header.get("include_images"):
+                # The index is keyed by image path, like the metadata rewritten above
+                _rebase_image_paths(staged_path, image_dir)
+            os.replace(staged_path, target)
+    finally:
+        stream.close()
+        if staging_dir:
+            shutil.rmtree(staging_dir[0], ignore_errors=True)
+        for staged_path in staged_sidecars.values():
+            staged_path.unlink(missing_ok=True)
+
+    if header.get("manifest", {}).get("files"):
+        write_manifest(header["manifest"], manifest_path(processed_dir))
+    result = {
+        "source": source,
+        "items": loaded,
+        "embedding_model": header["embedding_model"],
+        "created_at": header["created_at"],
+        "seconds": time.perf_counter() - started,
+    }
+    print(f"[+] Imported {loaded} items from snapshot {source} in {result['seconds']:.1f}s", flush=True)
+    return result
+
+def _rebase_image_paths(index_file: Path, image_dir: Path) -> None:
+    """
+    Points every near-duplicate index entry's image_path into image_dir, rewriting the file line by line.
+    """
+    tmp_path = index_file.with_name(index_file.name + ".tmp")
+    with open(index_file, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if line.strip():
+                entry = json.loads(line)
+                entry["image_path"] = str(image_dir / os.path.basename(entry["image_path"]))
+                dst.write(json.dumps(entry) + "\n")
+    os.replace(tmp_path, index_file)
+
+def inspect_snapshot(source: str) -> Dict[str, Any]:
+    """
+    Verifies every checksum without loading anything and returns the header (minus the manifest) and item count.
+    """
+    stream = open_snapshot(source)
+    try:
+        reader = SnapshotReader(stream)
+        files = []
+        for _ in reader.pages(on_file=files.append):
+            pass
+    finally:
+        stream.close()
+    header = {k: v for k, v in reader.header.items() if k != "manifest"}
+    return {**header, "items": reader.count, "files": len(files),
+            "manifest_files": len(reader.header.get("manifest", {}).get("files", {})), "verified": True}
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, import or verify index snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Write a snapshot of the collection at VECTOR_DB_PATH.")
+    export.add_argument("path")
+    export.add_argument("--include-images", action="store_true", help="Bundle the referenced image files.")
+    export.add_argument("--embedding-model", help="Model ID to record (default: read from the ingest manifest).")
+    load = commands.add_parser("import", help="Replace the collection with a snapshot (path or URL).")
+    load.add_argument("source")
+    load.add_argument("--force", action="store_true", help="Import even if the embedding model differs.")
+    check = commands.add_parser("inspect", help="Verify a snapshot's checksums and print its header.")
+    check.add_argument("source")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    parser.add_argument("--collection", help="Collection name (default: the tenant's).")
+    args = parser.parse_args()
+
+    if args.command == "inspect":
+        result = inspect_snapshot(args.source)
+    else:
+        # Neither direction needs the embedding model loaded
+        paths = tenant_paths(validate_tenant_id(args.tenant))
+        vector_store = ChromaManager(persist_directory=paths["vector_db"], collection_name=args.collection or paths["collection"])
+        local_model = read_manifest(manifest_path(paths["processed"])).get("embedding_model")
+        if args.command == "export":
+            result = export_snapshot(vector_store, args.path, args.embedding_model or local_model or "unknown",
+                                     include_images=args.include_images, processed_dir=paths["processed"])
+        else:
+            result = import_snapshot(vector_store, args.source, embedding_model=local_model, force=args.force,
+                                     processed_dir=paths["processed"])
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
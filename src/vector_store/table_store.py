@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple, NamedTuple
+
+from src.observability.metrics import span
+
+TABLES_FILENAME = "tables.jsonl"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Cells like "28.4", "2.3e19", "2.3·10^19", "±0.2", "65%", "-" are values, never row labels
+NUMERIC_CELL = re.compile(r"^[\d\s.,:%±+\-–—×·^()eE]*$")
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "by", "with", "at", "from", "as",
+    "is", "are", "was", "were", "be", "what", "which", "how", "does", "do", "did", "much", "many",
+    "value", "table", "reported", "get", "gets", "got", "achieve", "achieves", "achieved",
+}
+
+def tables_path(processed_dir: str = None) -> Path:
+    return Path(processed_dir or os.getenv("PROCESSED_DATA_PATH", "./data/processed")) / TABLES_FILENAME
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+class _Index(NamedTuple):
+    tables: Dict[str, Dict[str, Any]]
+    columns: Dict[str, List[Tuple[str, int]]]
+    rows: Dict[str, List[Tuple[str, int]]]
+    row_labels: Dict[Tuple[str, int], set]
+
+class TableStore:
+    """
+    Columnar sidecar of every structured table, next to the vector index: one JSON line per table
+    with its column names, per-column value lists and the chunk ID of each row. Two inverted
+    indexes answer lookups like "BLEU score of Transformer big" exactly, without encoding the
+    query: value-column names ("BLEU EN-DE") and row labels ("Transformer (big)"), the latter
+    taken from the label columns (see label_columns()).
+    Appends win over earlier lines with the same table_id; the file is reloaded when another
+    process (the ingest worker) changes it. Tables and indexes are replaced together in one
+    assignment, so a lookup never sees a table set and indexes from different reloads.
+    """
+    def __init__(self, path: str = None):
+        self.path = Path(path or tables_path())
+        self._lock = threading.Lock()
+        self._stat = None
+        self._view = _Index({}, {}, {}, {})
+        self._reload_if_changed()
+
+    @property
+    def tables(self) -> Dict[str, Dict[str, Any]]:
+        return self._view.tables
+
+    @staticmethod
+    def label_columns(table: Dict[str, Any]) -> List[int]:
+        """
+        The columns that name a row rather than hold its values: those with mostly non-numeric
+        cells ("Model", "Parser"). If that is none or all of them (a table of words), the first.
+        """
+        labels = []
+        for column, values in enumerate(table["data"]):
+            filled = [v for v in values if v]
+            if filled and sum(not NUMERIC_CELL.match(v) for v in filled) * 2 > len(filled):
+                labels.append(column)
+        return labels if 0 < len(labels) < len(table["data"]) else [0]
+
+    def _file_stat(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _reload_if_changed(self) -> None:
+        stat = self._file_stat()
+        if stat == self._stat:
+            return
+        with self._lock:
+            tables = {}
+            if stat is not None:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            table = json.loads(line)
+                            tables[table["table_id"]] = table
+            self._index(tables)
+            self._stat = stat
+
+    def _index(self, tables: Dict[str, Dict[str, Any]]) -> None:
+        """Builds the indexes of tables and swaps them in. Called with self._lock held."""
+        column_index: Dict[str, List[Tuple[str, int]]] = {}
+        row_index: Dict[str, List[Tuple[str, int]]] = {}
+        row_labels: Dict[Tuple[str, int], set] = {}
+        for table_id, table in tables.items():
+            labels = self.label_columns(table) if table["data"] else []
+            # A label column is never an answer: "Transformer model" must not look up column "Model"
+            for column, name in enumerate(table["columns"]):
+                if column in labels:
+                    continue
+                for token in set(tokenize(name)):
+                    column_index.setdefault(token, []).append((table_id, column))
+            for row in range(len(table["row_ids"])):
+                label = set(tokenize(" ".join(table["data"][column][row] for column in labels)))
+                row_labels[(table_id, row)] = label
+                for token in label:
+                    row_index.setdefault(token, []).append((table_id, row))
+        self._view = _Index(tables, column_index, row_index, row_labels)
+
+    def __len__(self) -> int:
+        self._reload_if_changed()
+        return len(self.tables)
+
+    def add_tables(self, tables: Iterable[Dict[str, Any]]) -> int:
+        """
+        Stores tables given row-wise ({"table_id", "source", "page_number", "caption", "header",
+        "rows", "row_ids"}) in columnar form. Returns the number added.
+        """
+        records = [{
+            "table_id": t["table_id"],
+            "source": t["source"],
+            "doc_id": t.get("doc_id"),
+            "page_number": t["page_number"],
+            "caption": t.get("caption", ""),
+            "columns": t["header"],
+            "data": [[row[c] if c < len(row) else "" for row in t["rows"]] for c in range(len(t["header"]))],
+            "row_ids": t["row_ids"],
+        } for t in tables]
+        if not records:
+            return 0
+        self._reload_if_changed()
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            self._index({**self.tables, **{r["table_id"]: r for r in records}})
+            self._stat = self._file_stat()
+        return len(records)
+
+    def remove_sources(self, sources: Iterable[str]) -> int:
+        """
+        Drops every table of the given documents and compacts the file. Returns the number removed.
+        """
+        sources = set(sources)
+        self._reload_if_changed()
+        with self._lock:
+            kept = {tid: t for tid, t in self.tables.items() if t["source"] not in sources}
+            removed = len(self.tables) - len(kept)
+            if removed:
+                tmp_path = self.path.with_suffix(".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for table in kept.values():
+                        f.write(json.dumps(table) + "\n")
+                os.replace(tmp_path, self.path)
+                self._index(kept)
+                self._stat = self._file_stat()
+        return removed
+
+    def lookup(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Finds the cells whose value-column name and row label together cover the query's terms, e.g.
+        column "BLEU EN-DE" x row "Transformer (big)". The column must be matched by a term that
+        is not part of the row label (the metric asked for), and the row by one not in the column
+        name. Cells are ranked by the share of query terms matched, then by how specifically and
+        completely the row label matched.
+        Returns [{"table_id", "table", "row", "column", "value", "score", "matched"}], where "table" is
+        the stored table the cell was read from.
+        """
+        self._reload_if_changed()
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        view = self._view
+        with span("table_lookup"):
+            columns: Dict[Tuple[str, int], set] = {}
+            rows: Dict[Tuple[str, int], set] = {}
+            for term in terms:
+                for key in view.columns.get(term, ()):
+                    columns.setdefault(key, set()).add(term)
+                for key in view.rows.get(term, ()):
+                    rows.setdefault(key, set()).add(term)
+
+            columns_by_table: Dict[str, List[Tuple[int, set]]] = {}
+            for (table_id, column), column_terms in columns.items():
+                columns_by_table.setdefault(table_id, []).append((column, column_terms))
+
+            ranked = []
+            for (table_id, row), row_terms in rows.items():
+                for column, column_terms in columns_by_table.get(table_id, ()):
+                    table = view.tables[table_id]
+                    value = table["data"][column][row]
+                    label = view.row_labels[(table_id, row)]
+                    if not value or not (column_terms - label) or not (row_terms - column_terms):
+                        continue
+                    matched = column_terms | row_terms
+                    ranked.append(((len(matched), len(row_terms), len(row_terms) / len(label)), {
+                        "table_id": table_id,
+                        "table": table,
+                        "row": row,
+                        "column": table["columns"][column],
+                        "value": value,
+                        "score": len(matched) / len(terms),
+                        "matched": sorted(matched),
+                    }))
+        ranked.sort(key=lambda pair: pair[0], reverse=True)
+        return [cell for _, cell in ranked[:limit]]
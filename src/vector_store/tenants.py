@@ -0,0 +1,178 @@
+"""
+Tenant-scoped indexes: where each tenant's data lives and a bounded pool of open tenants.
+
+Every tenant except the default one gets its own directory under TENANT_DATA_PATH:
+
+    <TENANT_DATA_PATH>/<tenant>/chroma      Chroma database with collection multimodal_rag_<tenant>
+    <TENANT_DATA_PATH>/<tenant>/processed   extracted images, near-duplicate index, ingest manifest, tables
+
+A separate database per tenant (rather than several collections in one) keeps a large tenant's
+SQLite writes, HNSW index, rebuilds and index generation marker away from everyone else's:
+query workers only reopen the tenant that actually changed.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.observability.metrics import registry
+
+DEFAULT_TENANT = "default"
+BASE_COLLECTION = "multimodal_rag"
+# Becomes part of a directory and a collection name: lower case, digits, "-" and "_"
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9](?:[a-z0-9_-]{0,46}[a-z0-9])?$")
+# Comma-separated allowlist; unset accepts any well-formed tenant ID
+TENANTS = {t.strip() for t in os.getenv("TENANTS", "").split(",") if t.strip()}
+
+registry.describe("rag_tenants_open", "Tenants whose collection is currently open in this process.")
+registry.describe("rag_tenant_evictions_total", "Tenants closed to stay within TENANT_MAX_OPEN.")
+
+class TenantNotFoundError(LookupError):
+    """
+    The tenant is not on the TENANTS allowlist, or has no index yet.
+    """
+
+def validate_tenant_id(tenant_id: Optional[str]) -> str:
+    """
+    Returns the tenant ID to use (DEFAULT_TENANT if none was given). Raises ValueError for a
+    malformed ID and TenantNotFoundError for one that is not on the allowlist.
+    """
+    tenant_id = tenant_id or DEFAULT_TENANT
+    if not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError(f"Invalid tenant ID '{tenant_id}': use 1-48 lower-case letters, digits, '-' or '_'.")
+    if TENANTS and tenant_id != DEFAULT_TENANT and tenant_id not in TENANTS:
+        raise TenantNotFoundError(f"Unknown tenant '{tenant_id}'.")
+    return tenant_id
+
+def tenant_paths(tenant_id: str) -> Dict[str, str]:
+    """
+    {"collection", "vector_db", "processed", "raw"} for a tenant. The default tenant keeps the
+    single-tenant layout (VECTOR_DB_PATH, PROCESSED_DATA_PATH, RAW_DATA_PATH), so existing
+    deployments need no migration. Other tenants' documents are read from RAW_DATA_PATH/<tenant>.
+    """
+    raw_path = os.getenv("RAW_DATA_PATH", "./sample_documents")
+    if tenant_id == DEFAULT_TENANT:
+        return {
+            "collection": BASE_COLLECTION,
+            "vector_db": os.getenv("VECTOR_DB_PATH", "./data/chroma"),
+            "processed": os.getenv("PROCESSED_DATA_PATH", "./data/processed"),
+            "raw": raw_path,
+        }
+    root = Path(os.getenv("TENANT_DATA_PATH", "./data/tenants")) / tenant_id
+    return {
+        "collection": f"{BASE_COLLECTION}_{tenant_id}",
+        "vector_db": str(root / "chroma"),
+        "processed": str(root / "processed"),
+        "raw": str(Path(raw_path) / tenant_id),
+    }
+
+def tenant_exists(tenant_id: str) -> bool:
+    return tenant_id == DEFAULT_TENANT or os.path.isdir(tenant_paths(tenant_id)["vector_db"])
+
+def list_tenants() -> List[str]:
+    """
+    The default tenant plus every tenant with an index under TENANT_DATA_PATH.
+    """
+    root = Path(os.getenv("TENANT_DATA_PATH", "./data/tenants"))
+    found = sorted(p.name for p in root.iterdir() if p.is_dir() and TENANT_ID_PATTERN.match(p.name)) if root.is_dir() else []
+    return [DEFAULT_TENANT] + [t for t in found if t != DEFAULT_TENANT and tenant_exists(t)]
+
+class TenantPool:
+    """
+    Lazily opened, LRU-bounded set of per-tenant resources (a collection handle and whatever is
+    built around it). A tenant is opened on first use by one thread while other requests for it
+    wait; opening one tenant never blocks requests for another. Beyond max_open (TENANT_MAX_OPEN),
+    the least recently used tenant that is neither pinned, held nor busy is closed.
+    """
+    def __init__(self, opener: Callable[[str], Any], max_open: int = None,
+                 is_busy: Callable[[str], bool] = None):
+        """
+        :param opener: Builds the resource of a tenant ID; called at most once per open.
+        :param is_busy: Tenants it returns True for are not evicted (e.g. ones with queued ingest
+                        work, so no two handles ever write the same index). Called under the pool lock.
+        """
+        self.opener = opener
+        self.max_open = max(1, max_open or int(os.getenv("TENANT_MAX_OPEN", "16")))
+        self.is_busy = is_busy or (lambda tenant_id: False)
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[str, Any]" = OrderedDict()  # least recently used first
+        self._opening: Dict[str, threading.Lock] = {}
+        self._pinned = set()
+        self._held: Dict[str, int] = {}
+
+    def pin(self, tenant_id: str, resource: Any) -> None:
+        """
+        Adds an already built resource that is never evicted (the default tenant).
+        """
+        with self._lock:
+            self._open[tenant_id] = resource
+            self._pinned.add(tenant_id)
+            registry.set("rag_tenants_open", len(self._open))
+
+    def peek(self, tenant_id: str) -> Optional[Any]:
+        """
+        The tenant's resource if it is open, without opening it or touching its recency.
+        """
+        with self._lock:
+            return self._open.get(tenant_id)
+
+    def open_tenants(self) -> List[str]:
+        with self._lock:
+            return list(self._open)
+
+    def get(self, tenant_id: str) -> Any:
+        with self._lock:
+            if tenant_id in self._open:
+                self._open.move_to_end(tenant_id)
+                return self._open[tenant_id]
+            opening = self._opening.setdefault(tenant_id, threading.Lock())
+
+        with opening:
+            with self._lock:
+                # Opened by another request while this one waited
+                if tenant_id in self._open:
+                    self._open.move_to_end(tenant_id)
+                    return self._open[tenant_id]
+            resource = self.opener(tenant_id)
+            with self._lock:
+                self._open[tenant_id] = resource
+                evicted = self._evict(keep=tenant_id)
+                registry.set("rag_tenants_open", len(self._open))
+
+        # Closing waits for reads in flight on the evicted handles: not under the pool lock
+        for evicted_id, evicted_resource in evicted:
+            print(f"[*] Closing tenant '{evicted_id}' (TENANT_MAX_OPEN={self.max_open})")
+            close = getattr(evicted_resource, "close", None)
+            if close:
+                close()
+        return resource
+
+    @contextmanager
+    def hold(self, tenant_id: str):
+        """
+        Opens the tenant like get() and keeps it from being evicted until the block exits, e.g.
+        while /ingest hands it to the ingest scheduler (which keeps it busy from then on).
+        """
+        with self._lock:
+            self._held[tenant_id] = self._held.get(tenant_id, 0) + 1
+        try:
+            yield self.get(tenant_id)
+        finally:
+            with self._lock:
+                self._held[tenant_id] -= 1
+                if not self._held[tenant_id]:
+                    del self._held[tenant_id]
+
+    def _evict(self, keep: str) -> List[tuple]:
+        evicted = []
+        for tenant_id in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            if tenant_id == keep or tenant_id in self._pinned or tenant_id in self._held or self.is_busy(tenant_id):
+                continue
+            evicted.append((tenant_id, self._open.pop(tenant_id)))
+            registry.inc("rag_tenant_evictions_total")
+        return evicted
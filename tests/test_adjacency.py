@@ -0,0 +1,73 @@
+import pytest
+
+from src.ingestion.adjacency import link_chunks
+
+def chunk(kind, page, content, **metadata):
+    return {"doc_id": "doc.pdf", "page": page, "type": kind, "content": content,
+            "metadata": {"source": "doc.pdf", "page_number": page, "content_type": kind, **metadata}}
+
+def document():
+    chunks = [
+        chunk("text", 1, "Intro paragraph."),
+        chunk("image", 1, "doc_p1_0.png"),
+        chunk("text", 1, "Figure 1: The model architecture."),
+        chunk("text", 1, "Encoder paragraph."),
+        chunk("text", 2, "Decoder paragraph."),
+        chunk("image", 2, "doc_p2_0.png"),
+        chunk("image", 2, "doc_p2_1.png"),
+        chunk("text", 2, "Fig. 2 Attention heads.", element_type="FigureCaption"),
+    ]
+    ids = [f"c{i}" for i in range(len(chunks))]
+    link_chunks(chunks, ids)
+    return chunks, ids
+
+def test_reading_order_skips_images_and_pages_are_parents():
+    chunks, _ = document()
+    meta = [c["metadata"] for c in chunks]
+    assert "prev_id" not in meta[0] and meta[0]["next_id"] == "c2"
+    assert (meta[3]["prev_id"], meta[3]["next_id"]) == ("c2", "c4")  # across the page break
+    assert "next_id" not in meta[7]
+    assert "prev_id" not in meta[1] and "next_id" not in meta[1]
+    assert [m["chunk_index"] for m in meta] == list(range(8))
+    assert meta[4]["parent_id"] == "doc.pdf#p2" and meta[0]["parent_id"] == "doc.pdf#p1"
+
+def test_figures_and_captions_are_linked_per_page():
+    chunks, _ = document()
+    meta = [c["metadata"] for c in chunks]
+    assert meta[1]["caption_id"] == "c2" and meta[2]["figure_id"] == "c1"
+    # One caption on the page covers all of its images; the caption points at the first
+    assert meta[5]["caption_id"] == meta[6]["caption_id"] == "c7" and meta[7]["figure_id"] == "c5"
+    assert "caption_id" not in meta[0] and "figure_id" not in meta[3]
+
+@pytest.fixture
+def retriever():
+    retriever_module = pytest.importorskip("src.retrieval.retriever")
+    from benchmarks.fakes import HashingEmbedder, InMemoryVectorStore
+
+    chunks, ids = document()
+    embedder, store = HashingEmbedder(dim=32), InMemoryVectorStore()
+    store.add_embeddings(ids, embedder.encode_text([c["content"] for c in chunks]).tolist(),
+                         [c["metadata"] for c in chunks], [c["content"] for c in chunks])
+    hits = store.get_items(ids=ids)
+    retriever = retriever_module.MultimodalRetriever(embedder, store, expand_max_chars=60)
+    return retriever, lambda *hit_ids: [{"id": i, **hits[i]} for i in hit_ids]
+
+def test_neighbors_expansion_stitches_text_within_budget_and_captions_images(retriever):
+    retriever, as_hits = retriever
+    text, image = as_hits("c3", "c1")
+    retriever.expand([[text], [image]], "neighbors")
+    assert text["context"] == "Figure 1: The model architecture.\nEncoder paragraph."
+    assert text["expanded_ids"] == ["c2"]  # c4 would exceed the 60-character budget
+    assert image["context"] == "Figure 1: The model architecture." and image["expanded_ids"] == ["c2"]
+
+def test_page_expansion_and_off(retriever):
+    retriever, as_hits = retriever
+    retriever.expand_max_chars = 1000
+    (hit,) = as_hits("c4")
+    retriever.expand([[hit]], "page")
+    assert hit["context"] == "Decoder paragraph.\nFig. 2 Attention heads."
+    (hit,) = as_hits("c4")
+    retriever.expand([[hit]], "off")
+    assert "context" not in hit
+    with pytest.raises(ValueError):
+        retriever.expand([[hit]], "chapter")
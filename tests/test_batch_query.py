@@ -0,0 +1,84 @@
+import json
+import threading
+
+import pytest
+
+main = pytest.importorskip("src.api.main")
+
+from fastapi.testclient import TestClient
+
+from benchmarks.fakes import HashingEmbedder, InMemoryVectorStore, synthetic_corpus
+from src.generation.generator import MultimodalGenerator
+from src.generation.providers import StubProvider
+
+QUESTIONS = [{"query": "How does Adam update weights?", "expected_source": "adam"},
+             {"query": "Explain the residual learning block.", "expected_source": "resnet"}]
+
+class BlockingProvider(StubProvider):
+    """
+    A stub LLM that holds every call until released, to observe what is in flight.
+    """
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def complete(self, *args, **kwargs):
+        self.started.set()
+        assert self.release.wait(10)
+        return super().complete(*args, **kwargs)
+
+@pytest.fixture
+def client(monkeypatch):
+    embedder = HashingEmbedder(dim=16)
+    store = InMemoryVectorStore()
+    synthetic_corpus(store, embedder, QUESTIONS, chunks_per_source=20)
+    main.init_components(embedder=embedder, vector_store=store, ingestion_pipeline=object(),
+                         generator=MultimodalGenerator(provider=StubProvider()))
+    monkeypatch.setattr(main, "_query_slots", {})
+    return TestClient(main.app)
+
+def test_a_failing_retrieval_group_only_fails_its_own_items(client, monkeypatch):
+    retrieve_batch = main.retriever.retrieve_batch
+
+    def retrieve(queries, n_results=5, where=None, expand=None):
+        if where:
+            raise ValueError("bad filter")
+        return retrieve_batch(queries, n_results=n_results, where=where, expand=expand)
+
+    monkeypatch.setattr(main.retriever, "retrieve_batch", retrieve)
+    response = client.post("/query/batch", json={"queries": [
+        {"query": QUESTIONS[0]["query"], "retrieval_only": True},
+        {"query": QUESTIONS[1]["query"], "filters": {"$bad": 1}},
+    ]})
+    assert response.status_code == 200
+    ok, failed = response.json()["results"]
+    assert ok["error"] is None and ok["sources"]
+    assert failed["error"] == "Retrieval failed: bad filter" and failed["sources"] == []
+
+def test_batch_holds_the_tenant_query_slot_until_generation_is_done(client, monkeypatch):
+    monkeypatch.setattr(main, "TENANT_MAX_CONCURRENT_QUERIES", 1)
+    provider = BlockingProvider()
+    monkeypatch.setattr(main, "generator", MultimodalGenerator(provider=provider))
+    body = {"queries": [{"query": q["query"]} for q in QUESTIONS]}
+
+    batch = {}
+    thread = threading.Thread(target=lambda: batch.update(response=client.post("/query/batch", json=body)))
+    thread.start()
+    try:
+        assert provider.started.wait(10)
+        # Retrieval is over, but the batch is still generating: the tenant has no slot to spare
+        assert client.post("/query", json={"query": "anything", "retrieval_only": True}).status_code == 429
+    finally:
+        provider.release.set()
+        thread.join(10)
+    assert batch["response"].status_code == 200
+    assert all(r["answer"] and r["error"] is None for r in batch["response"].json()["results"])
+    assert client.post("/query", json={"query": "anything", "retrieval_only": True}).status_code == 200
+
+def test_streamed_batch_releases_the_slot_after_the_last_line(client, monkeypatch):
+    monkeypatch.setattr(main, "TENANT_MAX_CONCURRENT_QUERIES", 1)
+    body = {"queries": [{"query": q["query"]} for q in QUESTIONS], "stream": True}
+    lines = [json.loads(line) for line in client.post("/query/batch", json=body).text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert client.post("/query", json={"query": "anything", "retrieval_only": True}).status_code == 200
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.run_benchmarks import load_questions, rank_of, bench_retrieval, BENCH_DIR, REPO_ROOT
+from src.observability.metrics import MetricsRegistry
+
+def hit(source):
+    return {"content": "", "metadata": {"source": f"sample_documents/{source}.pdf"}}
+
+def test_question_set_loads_and_points_at_sample_documents():
+    questions = load_questions(str(BENCH_DIR / "questions.json"))
+    documents = [p.stem for p in (REPO_ROOT / "sample_documents").iterdir()]
+    # Every expected source is the name of an actual sample document
+    assert all(any(q["expected_source"] in name for name in documents) for q in questions)
+
+@pytest.mark.parametrize("content", ['{"query": "q"}', "[]", '[{"query": "q"}]', '[{"query": "", "expected_source": "a"}]'])
+def test_malformed_question_sets_are_refused(tmp_path, content):
+    path = tmp_path / "questions.json"
+    path.write_text(content, encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_questions(str(path))
+
+def test_rank_matches_the_source_file_name():
+    results = [hit("ResNet"), hit("Adam-A Method for Stochastic Optimization"), hit("Adam-A Method for Stochastic Optimization")]
+    assert rank_of(results, "Adam-A Method") == 2
+    assert rank_of(results, "Dropout") == 0
+    # Only the file name counts, not the directories above it
+    assert rank_of([{"metadata": {"source": "Dropout/ResNet.pdf"}}], "Dropout") == 0
+
+def test_recall_and_mrr():
+    questions = [{"query": "a", "expected_source": "A"}, {"query": "b", "expected_source": "B"},
+                 {"query": "c", "expected_source": "C"}]
+    ranked = {"a": [hit("A"), hit("X")], "b": [hit("X"), hit("Y"), hit("B")], "c": [hit("X")]}
+    retriever = SimpleNamespace(retrieve=lambda query, n_results: ranked[query][:n_results])
+    report = bench_retrieval(SimpleNamespace(retriever=retriever), questions, k_values=[1, 3], repeats=2,
+                             registry=MetricsRegistry())
+    assert report["queries"] == 6
+    assert report["recall"] == {"recall@1": 1 / 3, "recall@3": 2 / 3}
+    assert report["mrr"] == pytest.approx((1 + 1 / 3) / 3)
+    assert report["misses"] == ["c"]
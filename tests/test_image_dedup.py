@@ -0,0 +1,91 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.ingestion.image_dedup import PerceptualHashIndex
+
+def figure(seed, size=(320, 240)):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize(size, Image.Resampling.BILINEAR)
+
+def reencoded(image, size=(200, 150), quality=60):
+    buffer = io.BytesIO()
+    image.resize(size, Image.Resampling.LANCZOS).save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+def test_rescaled_jpeg_copy_is_a_near_duplicate(tmp_path):
+    index = PerceptualHashIndex(index_path=str(tmp_path / "phash.jsonl"), threshold=6)
+    index.add(index.compute_hash(figure(1)), "a_p1_0.png", "encoder stack", "a.pdf")
+
+    match = index.find(index.compute_hash(reencoded(figure(1))))
+    assert match["image_path"] == "a_p1_0.png" and match["ocr_text"] == "encoder stack"
+    assert match["distance"] <= 6
+    assert index.find(index.compute_hash(figure(2))) is None
+
+def test_entries_and_linked_embeddings_survive_a_reload(tmp_path):
+    path = str(tmp_path / "phash.jsonl")
+    index = PerceptualHashIndex(index_path=path)
+    phash = index.compute_hash(figure(1))
+    index.add(phash, "a_p1_0.png", "text", "a.pdf")
+    index.link_embedding("a_p1_0.png", "a.pdf_3_image_1")
+
+    reloaded = PerceptualHashIndex(index_path=path)
+    assert len(reloaded) == 1
+    assert reloaded.find(phash)["chunk_id"] == "a.pdf_3_image_1"
+    # Counts follow the file when another instance changes it
+    index.add(index.compute_hash(figure(2)), "b_p1_0.png", "text", "b.pdf")
+    assert len(reloaded) == 2
+
+def test_remove_sources_compacts_and_other_instances_see_it(tmp_path):
+    path = str(tmp_path / "phash.jsonl")
+    index = PerceptualHashIndex(index_path=path)
+    kept, removed = index.compute_hash(figure(1)), index.compute_hash(figure(2))
+    index.add(kept, "a_p1_0.png", "", "a.pdf")
+    index.add(removed, "b_p1_0.png", "", "b.pdf")
+    index.link_embedding("b_p1_0.png", "b.pdf_0_image_1")
+    other = PerceptualHashIndex(index_path=path)  # e.g. the ingest process next to the maintenance CLI
+
+    assert index.remove_sources(["b.pdf"]) == 1
+    assert index.remove_sources(["b.pdf"]) == 0
+    assert index.find(removed) is None and index.find(kept)
+    assert index.sources() == {"a.pdf"}
+    assert len(open(path, encoding="utf-8").read().splitlines()) == 1
+
+    assert other.find(removed) is None and other.find(kept)["image_path"] == "a_p1_0.png"
+    # Re-registering the removed image works as for a new one
+    other.add(removed, "b_p1_0.png", "", "b.pdf")
+    assert index.find(removed)["image_path"] == "b_p1_0.png"
+
+def test_snapshot_import_replaces_the_index_of_the_previous_collection(tmp_path, monkeypatch):
+    pytest.importorskip("langchain_chroma")
+    from src.vector_store.chroma_manager import ChromaManager
+    from src.vector_store.snapshot import export_snapshot, import_snapshot
+
+    monkeypatch.setenv("ANONYMIZED_TELEMETRY", "False")
+    primary_dir, replica_dir = tmp_path / "primary", tmp_path / "replica"
+    primary = ChromaManager(persist_directory=str(primary_dir / "chroma"), collection_name="test")
+    replica = ChromaManager(persist_directory=str(replica_dir / "chroma"), collection_name="test")
+    try:
+        new, old = figure(1), figure(2)
+        source_index = PerceptualHashIndex(index_path=str(primary_dir / "phash_index.jsonl"))
+        source_index.add(source_index.compute_hash(new), "a_p1_0.png", "encoder", "a.pdf")
+        source_index.link_embedding("a_p1_0.png", "a.pdf_0_image_1")
+        primary.add_embeddings(["a.pdf_0_image_1"], [[1.0, 0.0]], [{"source": "a.pdf", "content_type": "image"}], ["a"])
+        export_snapshot(primary, str(tmp_path / "index.ragsnap"), "model-a", processed_dir=str(primary_dir))
+
+        # The replica's ingest pipeline holds an index of chunks the import is about to drop
+        live = PerceptualHashIndex(index_path=str(replica_dir / "phash_index.jsonl"))
+        live.add(live.compute_hash(old), "b_p1_0.png", "decoder", "b.pdf")
+        live.link_embedding("b_p1_0.png", "b.pdf_0_image_1")
+        replica.add_embeddings(["b.pdf_0_image_1"], [[0.0, 1.0]], [{"source": "b.pdf", "content_type": "image"}], ["b"])
+
+        import_snapshot(replica, str(tmp_path / "index.ragsnap"), embedding_model="model-a", processed_dir=str(replica_dir))
+        assert live.find(live.compute_hash(reencoded(old))) is None
+        assert live.find(live.compute_hash(reencoded(new)))["chunk_id"] == "a.pdf_0_image_1"
+        assert live.sources() == {"a.pdf"}
+    finally:
+        primary.close()
+        replica.close()
@@ -0,0 +1,95 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.ingestion.image_normalizer import ImageNormalizer
+
+def encode(image, fmt="PNG"):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def noise(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8))
+
+def test_decodes_once_and_bounds_resolution():
+    normalizer = ImageNormalizer(max_side=256, min_bytes=1024, min_entropy=1.0)
+    normalized = normalizer.normalize(encode(noise(800, 400)), ".PNG")
+    assert (normalized["width"], normalized["height"]) == (800, 400)
+    assert normalized["image"].size == (256, 128) and normalized["array"].shape == (128, 256, 3)
+    assert normalized["gray"].mode == "L" and normalized["entropy"] > 5
+    assert normalizer.stats()["decodes"] == 1 and normalizer.stats()["accepted"] == 1
+
+def test_processor_drops_the_ocr_copy_once_used(tmp_path, monkeypatch):
+    processor_module = pytest.importorskip("src.ingestion.image_processor")
+    ocr_inputs = []
+
+    class Reader:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def readtext(self, image, detail=0):
+            ocr_inputs.append(image.shape)
+            return ["text"]
+
+    monkeypatch.setattr(processor_module.easyocr, "Reader", Reader)
+    monkeypatch.setenv("PROCESSED_DATA_PATH", str(tmp_path))
+    processor = processor_module.ImageProcessor(output_dir=str(tmp_path))
+    normalized = []
+    normalize_file = processor.normalizer.normalize_file
+    monkeypatch.setattr(processor.normalizer, "normalize_file", lambda path: normalized.append(normalize_file(path)) or normalized[-1])
+    path = tmp_path / "figure.png"
+    noise(300, 300).save(path)
+
+    chunk = processor.process_image(str(path))
+    assert chunk["ocr_text"] == "text" and ocr_inputs == [(300, 300, 3)]
+    assert "array" not in normalized[0] and chunk["image"] is normalized[0]["image"]
+
+def test_processor_drops_the_hashing_and_ocr_copies_once_used(tmp_path, monkeypatch):
+    processor_module = pytest.importorskip("src.ingestion.image_processor")
+
+    class Reader:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def readtext(self, image, detail=0):
+            return ["text"]
+
+    monkeypatch.setattr(processor_module.easyocr, "Reader", Reader)
+    monkeypatch.setenv("PROCESSED_DATA_PATH", str(tmp_path))
+    processor = processor_module.ImageProcessor(output_dir=str(tmp_path))
+    first = processor.normalizer.normalize(encode(noise(300, 300)), "png")
+    assert processor.find_duplicate(first) is None
+    assert "gray" not in first and "array" in first  # still needed for OCR
+    processor.dedup_index.add(first["phash"], str(tmp_path / "a.png"), processor.ocr_only(first.pop("array")), "a.pdf")
+
+    copy = processor.normalizer.normalize(encode(noise(300, 300), fmt="JPEG"), "jpeg")
+    assert processor.find_duplicate(copy) is not None
+    assert "gray" not in copy and "array" not in copy and copy["image"] is not None
+
+def test_rejects_logos_formats_corrupt_blank_and_flat_images():
+    normalizer = ImageNormalizer(max_side=256, min_bytes=1024, min_entropy=1.0)
+    assert normalizer.normalize(encode(noise(8, 8)), "png") is None  # too small: a logo or icon
+    assert normalizer.normalize(encode(noise(200, 200), "GIF"), "gif") is None
+    assert normalizer.normalize(b"\x89PNG" + b"\x00" * 4096, "png") is None
+    assert normalizer.normalize(encode(Image.new("RGB", (200, 200), "white")), "png", enforce_min_bytes=False) is None
+    flat = Image.fromarray(np.full((200, 200, 3), 128, dtype=np.uint8))
+    assert normalizer.normalize(encode(flat), "png", enforce_min_bytes=False) is None
+
+    stats = normalizer.stats()
+    # Only the blank and the flat image got as far as a decode
+    assert stats["accepted"] == 0 and stats["decodes"] == 2
+    assert stats["rejected"] == {"too_small": 1, "format": 1, "decode_error": 1, "brightness": 1, "low_entropy": 1}
+
+def test_standalone_files_skip_the_logo_threshold_and_thumbnails_are_jpeg(tmp_path):
+    path = tmp_path / "scan.png"
+    noise(64, 64).save(path)
+    normalizer = ImageNormalizer(max_side=256, min_bytes=10 ** 6, thumbnail_dir=str(tmp_path / "thumbs"))
+    normalized = normalizer.normalize_file(path)
+    assert normalized is not None
+    thumbnail = normalizer.save_thumbnail(normalized, "scan.png")
+    assert thumbnail.name == "scan.jpg" and Image.open(thumbnail).format == "JPEG"
+    assert normalizer.normalize_file(tmp_path / "missing.png") is None
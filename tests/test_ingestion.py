@@ -0,0 +1,112 @@
+import os
+import weakref
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("langchain_chroma")
+
+from benchmarks.fakes import HashingEmbedder
+from src.vector_store.chroma_manager import ChromaManager
+
+class TextParser:
+    """
+    Stands in for PDFParser: every "PDF" yields a fixed number of text chunks.
+    """
+    def __init__(self, output_dir, chunks):
+        self.output_dir = str(output_dir)
+        self.image_processor = None
+        self.chunks = chunks
+
+    def extract_content(self, file_path):
+        return [{"doc_id": os.path.basename(file_path), "page": i // 4 + 1, "type": "text", "content": f"paragraph {i}",
+                 "metadata": {"source": file_path, "page_number": i // 4 + 1, "content_type": "text"}}
+                for i in range(self.chunks)]
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANONYMIZED_TELEMETRY", "False")
+    manager = ChromaManager(persist_directory=str(tmp_path / "chroma"), collection_name="test")
+    yield manager
+    manager.close()
+
+def test_multi_batch_ingest_publishes_one_generation(store, tmp_path, monkeypatch):
+    pipeline_module = pytest.importorskip("src.ingestion.pipeline")
+    source = tmp_path / "doc.pdf"
+    source.write_bytes(b"%PDF")
+    pipeline = pipeline_module.IngestionPipeline(HashingEmbedder(dim=8), store,
+                                                 pdf_parser=TextParser(tmp_path / "processed", chunks=7))
+    pipeline.batch_size = 2
+    reader = ChromaManager(persist_directory=store.persist_directory, collection_name="test", read_only=True)
+
+    published = []
+    publish = store.publish
+    monkeypatch.setattr(store, "publish", lambda: (published.append(store.get_count()), publish()))
+    assert pipeline.process_file(str(source)) == 7
+
+    # Four batches, one generation, published after the last batch
+    assert published == [7]
+    assert reader.refresh() and not reader.refresh()
+    assert reader.get_count() == 7
+
+def test_ingest_job_publishes_after_its_last_file(store, tmp_path, monkeypatch):
+    pipeline_module = pytest.importorskip("src.ingestion.pipeline")
+    pipeline = pipeline_module.IngestionPipeline(HashingEmbedder(dim=8), store,
+                                                 pdf_parser=TextParser(tmp_path / "processed", chunks=3))
+    published = []
+    publish = store.publish
+    monkeypatch.setattr(store, "publish", lambda: (published.append(store.get_count()), publish()))
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF")
+        pipeline.process_file(str(tmp_path / name), publish=False)
+    assert published == []
+    store.publish()
+    assert published == [6]
+
+def test_file_larger_than_the_quota_room_is_refused_before_indexing(store, tmp_path):
+    pipeline_module = pytest.importorskip("src.ingestion.pipeline")
+    source = tmp_path / "doc.pdf"
+    source.write_bytes(b"%PDF")
+    embedder = HashingEmbedder(dim=8)
+    pipeline = pipeline_module.IngestionPipeline(embedder, store, pdf_parser=TextParser(tmp_path / "processed", chunks=7))
+    encode_text = embedder.encode_text
+    encoded = []
+    embedder.encode_text = lambda texts: (encoded.append(texts), encode_text(texts))[1]
+    with pytest.raises(pipeline_module.IndexQuotaExceeded):
+        pipeline.process_file(str(source), max_new_chunks=6)
+    assert store.get_count() == 0 and not encoded
+    assert pipeline.process_file(str(source), max_new_chunks=7) == 7
+
+def test_decoded_images_are_released_once_embedded(store, tmp_path):
+    pipeline_module = pytest.importorskip("src.ingestion.pipeline")
+    images = [Image.new("RGB", (32, 32), color) for color in ("red", "blue")]
+    released = [weakref.ref(image) for image in images]
+
+    class ImageParser(TextParser):
+        def extract_content(self, file_path):
+            return [{"doc_id": "doc.pdf", "page": 1, "type": "image", "content": f"img{i}.png", "image": images.pop(0),
+                     "ocr_text": "", "metadata": {"source": file_path, "page_number": 1, "content_type": "image",
+                                                  "image_path": f"img{i}.png"}}
+                    for i in range(2)]
+
+    class Embedder(HashingEmbedder):
+        def encode_image(self, image):
+            # By the second image the first is no longer held by the pipeline
+            alive.append(released[0]() is not None)
+            return super().encode_image(image)
+
+    alive = []
+    source = tmp_path / "doc.pdf"
+    source.write_bytes(b"%PDF")
+    pipeline = pipeline_module.IngestionPipeline(Embedder(dim=8), store, pdf_parser=ImageParser(tmp_path / "processed", 0))
+    pipeline.image_processor = type("Processor", (), {"dedup_index": type("Index", (), {"link_embedding": lambda *a: None})()})()
+    assert pipeline.process_file(str(source)) == 2
+    assert alive == [True, False] and released[1]() is None
+
+def test_unpublished_batches_do_not_bump_the_generation(store):
+    generation = store._read_generation()
+    store.add_embeddings(["a"], [[1.0, 0.0]], [{"source": "a.pdf"}], ["a"], publish=False)
+    store.add_embeddings(["b"], [[0.0, 1.0]], [{"source": "a.pdf"}], ["b"], publish=False)
+    assert store._read_generation() == generation
+    store.publish()
+    assert store._read_generation() != generation and store.get_count() == 2
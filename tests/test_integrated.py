@@ -44,3 +44,34 @@ def test_off_topic_guardrail():
     response = requests.post(f"{API_URL}/query", json=payload)
     assert response.status_code == 200
     assert "expertise is currently limited" in response.json()["answer"]
+
+def test_batch_query_endpoint():
+    """Verify batch queries return one result per input, in order."""
+    payload = {
+        "queries": [
+            {"query": "Explain the Transformer architecture.", "n_results": 2},
+            {"query": "How does Adam update weights?", "n_results": 2}
+        ]
+    }
+    response = requests.post(f"{API_URL}/query/batch", json=payload)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1]
+    assert all(r["error"] is None and r["answer"] for r in results)
+
+def test_retrieval_only_query():
+    """Verify retrieval-only mode skips generation and returns scored snippets."""
+    payload = {"query": "What is scaled dot-product attention?", "n_results": 3, "retrieval_only": True}
+    response = requests.post(f"{API_URL}/query", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["answer"] is None
+    assert data["sources"] and all(s["score"] is not None for s in data["sources"])
+
+def test_metrics_endpoint():
+    """Verify stage metrics are exposed and request IDs are propagated."""
+    requests.post(f"{API_URL}/query", json={"query": "What is dropout?", "n_results": 1})
+    response = requests.get(f"{API_URL}/metrics", headers={"X-Request-ID": "metrics-check"})
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == "metrics-check"
+    assert 'rag_stage_duration_seconds_count{stage="vector_search"}' in response.text
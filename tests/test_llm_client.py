@@ -0,0 +1,175 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.generation.providers import OpenAICompatibleProvider
+from src.generation.llm_client import (
+    ResilientLLMClient, CircuitBreaker, LLMError, LLMTimeoutError, LLMUnavailableError
+)
+
+PROMPT = [{"type": "text", "text": "What is attention?"}]
+
+class MockLLMServer:
+    """
+    Local OpenAI-compatible /chat/completions server. Each request pops the next
+    (status, delay_s) from the script; the last entry repeats.
+    """
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with lock:
+                    status, delay = server.script[min(server.requests, len(server.script) - 1)]
+                    server.requests += 1
+                time.sleep(delay)
+                body = json.dumps({"choices": [{"message": {"content": f"answer {status}"}}]}).encode()
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+@pytest.fixture
+def mock_llm():
+    servers = []
+
+    def start(*script):
+        server = MockLLMServer(script)
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.close()
+
+def make_client(server, **kwargs):
+    provider = OpenAICompatibleProvider(model_name="mock", base_url=server.url, timeout=5)
+    defaults = dict(deadline_s=5, max_retries=2, backoff_base_s=0.01, backoff_max_s=0.05, hedge_after_s=0)
+    defaults.update(kwargs)
+    return ResilientLLMClient(provider, **defaults)
+
+def test_retries_transient_errors(mock_llm):
+    """Verify 5xx and 429 responses are retried until an attempt succeeds."""
+    server = mock_llm((503, 0), (429, 0), (200, 0))
+    assert make_client(server).complete("system", PROMPT) == "answer 200"
+    assert server.requests == 3
+
+def test_client_errors_are_not_retried(mock_llm):
+    """Verify a 4xx response fails immediately without tripping the breaker."""
+    server = mock_llm((400, 0))
+    client = make_client(server)
+    with pytest.raises(LLMError):
+        client.complete("system", PROMPT)
+    assert server.requests == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+def test_deadline_bounds_slow_calls(mock_llm):
+    """Verify a hung backend is abandoned at the per-call deadline."""
+    server = mock_llm((200, 2.0))
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        make_client(server, deadline_s=0.3).complete("system", PROMPT)
+    assert time.monotonic() - started < 1.0
+
+def test_hedged_request_wins_over_slow_primary(mock_llm):
+    """Verify a hedge is sent after the threshold and its faster answer is used."""
+    server = mock_llm((200, 1.0), (200, 0))
+    started = time.monotonic()
+    assert make_client(server, hedge_after_s=0.05).complete("system", PROMPT) == "answer 200"
+    assert time.monotonic() - started < 0.8
+    assert server.requests == 2
+
+def test_circuit_opens_and_recovers(mock_llm):
+    """Verify the breaker sheds calls after repeated failures and closes after a successful trial."""
+    server = mock_llm((500, 0), (500, 0), (200, 0))
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=0.2, name="mock")
+    client = make_client(server, max_retries=1, breaker=breaker)
+    with pytest.raises(LLMError):
+        client.complete("system", PROMPT)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(LLMUnavailableError):
+        client.complete("system", PROMPT)
+    assert server.requests == 2
+
+    time.sleep(0.25)
+    assert client.complete("system", PROMPT) == "answer 200"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_in_flight_limit_sheds_excess_calls(mock_llm):
+    """Verify calls beyond the in-flight limit wait only the slot wait, not their deadline, before being shed."""
+    server = mock_llm((200, 0.5))
+    client = make_client(server, max_in_flight=1, deadline_s=2, slot_wait_s=0.1)
+    first = threading.Thread(target=client.complete, args=("system", PROMPT))
+    first.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        client.complete("system", PROMPT)
+    assert time.monotonic() - started < 0.4
+    first.join()
+    assert server.requests == 1
+
+def test_expired_deadline_fails_before_any_attempt(mock_llm):
+    """Verify a call whose deadline is gone once it holds a slot times out without reaching the provider."""
+    server = mock_llm((200, 0))
+    client = make_client(server, deadline_s=0)
+    timeouts = []
+    complete = client.provider.complete
+    client.provider.complete = lambda *args, timeout=None: timeouts.append(timeout) or complete(*args, timeout=timeout)
+    with pytest.raises(LLMTimeoutError):
+        client.complete("system", PROMPT)
+    assert timeouts == [] and server.requests == 0
+    # The slot was given back
+    client.deadline_s = 5
+    assert client.complete("system", PROMPT) == "answer 200"
+
+def test_abandoned_hedge_keeps_its_slot_until_it_ends(mock_llm):
+    """Verify a losing hedge's request still counts against the in-flight limit while it runs."""
+    server = mock_llm((200, 0.6), (200, 0))
+    client = make_client(server, max_in_flight=1, hedge_after_s=0.05)
+    assert client.complete("system", PROMPT) == "answer 200"
+
+    # The slow primary is still running on the provider: no slot for another call yet
+    client.deadline_s = 0.1
+    with pytest.raises(LLMUnavailableError):
+        client.complete("system", PROMPT)
+    time.sleep(0.7)
+    assert client.complete("system", PROMPT) == "answer 200"
+    assert server.requests == 3
+
+def test_groq_provider_passes_the_remaining_deadline(monkeypatch):
+    """Verify the Groq request timeout is the smaller of LLM_TIMEOUT and the caller's budget."""
+    pytest.importorskip("langchain_groq")
+    from src.generation.providers import GroqProvider
+
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    provider = GroqProvider(model_name="mock", timeout=30)
+    calls = []
+
+    class Answer:
+        content = "ok"
+
+    monkeypatch.setattr(type(provider.llm), "invoke", lambda self, messages, **kwargs: calls.append(kwargs) or Answer())
+    provider.complete("system", PROMPT, timeout=2.5)
+    provider.complete("system", PROMPT)
+    assert calls == [{"timeout": 2.5}, {"timeout": 30}]
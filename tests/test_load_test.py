@@ -0,0 +1,75 @@
+import asyncio
+import argparse
+
+import httpx
+import numpy as np
+import pytest
+
+from benchmarks.fakes import HashingEmbedder, InMemoryVectorStore, FakeIngestionPipeline, synthetic_corpus
+from benchmarks.load_test import LimitedASGITransport, parse_mix, main_async, BENCH_DIR
+
+QUESTIONS = [{"query": "How does Adam update weights?", "expected_source": "adam"},
+             {"query": "Explain the residual learning block.", "expected_source": "resnet"}]
+
+def test_parse_mix():
+    assert parse_mix("query=0.7,ingest") == [("query", 0.7), ("ingest", 1.0)]
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("delete=1")
+
+def test_hashing_embedder_is_deterministic_and_topical():
+    embedder = HashingEmbedder(dim=64)
+    a, b, c = embedder.encode_text(["adam update weights", "weights of adam", "residual block"])
+    assert np.allclose(embedder.encode_text("adam update weights")[0], a)
+    assert a @ b > a @ c
+
+def test_in_memory_store_filters_and_ranks_the_synthetic_corpus():
+    embedder = HashingEmbedder(dim=128)
+    store = InMemoryVectorStore()
+    synthetic_corpus(store, embedder, QUESTIONS, chunks_per_source=20)
+    assert store.get_count() == 40
+
+    query = embedder.encode_text(QUESTIONS[0]["query"]).tolist()
+    hits = store.query(query, n_results=3)
+    assert hits["metadatas"][0][0]["source"] == "sample_documents/adam.pdf"
+    assert hits["distances"][0] == sorted(hits["distances"][0])
+
+    images = store.query(query, n_results=10, where={"$and": [{"content_type": "image"}, {"source": {"$ne": "x"}}]})
+    assert len(images["ids"][0]) == 4 and all(m["content_type"] == "image" for m in images["metadatas"][0])
+    # Adjacency metadata is linked as in real ingestion
+    assert any("next_id" in m or "prev_id" in m for m in store.get_items().values() for m in [m["metadata"]])
+
+def test_fake_ingestion_reports_its_chunks():
+    assert FakeIngestionPipeline(latency_s=0, chunks_per_file=3).process_file("a.pdf", publish=False) == 3
+
+def test_in_process_transport_caps_requests_in_flight():
+    in_flight, peak = 0, 0
+
+    async def app(scope, receive, send):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def run():
+        transport = LimitedASGITransport(app, httpx.Limits(max_connections=3))
+        async with httpx.AsyncClient(transport=transport, base_url="http://in-process") as client:
+            responses = await asyncio.gather(*(client.get("/") for _ in range(12)))
+        assert all(r.status_code == 200 for r in responses)
+
+    asyncio.run(run())
+    assert peak == 3
+
+def test_in_process_run_against_the_real_app():
+    pytest.importorskip("src.api.main")
+    args = argparse.Namespace(
+        questions=str(BENCH_DIR / "questions.json"), mix="query=0.6,query_filtered=0.3,ingest=0.1", seed=0,
+        concurrency=4, rate=0.0, duration=0.5, n_results=3, retrieval_only=False, tenant=None, timeout=10.0,
+        in_process=True, url=None, llm_latency_ms=1.0, embed_latency_ms=0.0, search_latency_ms=0.0,
+        ingest_latency_ms=1.0, corpus_chunks=20,
+    )
+    report = asyncio.run(main_async(args))
+    assert report["overall"]["requests"] > 0 and report["overall"]["error_rate"] == 0.0
+    assert set(report["operations"]) <= {"query", "query_filtered", "ingest"}
@@ -0,0 +1,133 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+
+from src.vector_store.chroma_manager import ChromaManager, GENERATION_FILE
+from src.vector_store.maintenance import CollectionMaintenance
+from src.ingestion.image_dedup import PerceptualHashIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def chunk(source, page, content_type="text", **extra):
+    return {"source": source, "page_number": page, "content_type": content_type, **extra}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANONYMIZED_TELEMETRY", "False")
+    manager = ChromaManager(persist_directory=str(tmp_path / "chroma"), collection_name="test")
+    yield manager
+    manager.close()
+
+def add(store, ids, metadatas):
+    store.add_embeddings(ids, [[float(i + 1), 1.0, 0.0] for i in range(len(ids))], metadatas, [f"doc {i}" for i in ids])
+
+def run_elsewhere(persist_directory, code):
+    # Another process on the same database, like the maintenance CLI next to a running server
+    script = ("from src.vector_store.chroma_manager import ChromaManager\n"
+              f"store = ChromaManager(persist_directory={persist_directory!r}, collection_name='test')\n" + code)
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, capture_output=True,
+                   env={**os.environ, "ANONYMIZED_TELEMETRY": "False"})
+
+def test_writable_handle_reopens_after_rebuild_in_another_process(store):
+    add(store, ["a", "b", "c"], [chunk("a.pdf", 1)] * 3)
+    assert store.get_count() == 3
+
+    run_elsewhere(store.persist_directory, "store.delete(ids=['c'])\nstore.rebuild()")
+
+    # The rebuild dropped the collection this handle had open: it must reopen, not fail
+    assert store.get_count() == 2
+    assert store.query([[1.0, 1.0, 0.0]], n_results=1)["ids"] == [["a"]]
+    add(store, ["d"], [chunk("d.pdf", 1)])
+    assert sorted(store.get_items(ids=["a", "b", "c", "d"])) == ["a", "b", "d"]
+
+def test_rebuild_keeps_its_handle_when_another_process_publishes(store, monkeypatch):
+    add(store, [f"c{i}" for i in range(6)], [chunk("a.pdf", 1)] * 6)
+    iter_items = store.iter_items
+
+    def pages_with_concurrent_publish(*args, **kwargs):
+        for i, page in enumerate(iter_items(*args, **kwargs)):
+            if i == 1:
+                # Another process publishes mid-rebuild, and a query on this handle runs meanwhile
+                path = os.path.join(store.persist_directory, GENERATION_FILE)
+                with open(path + ".other", "w", encoding="utf-8") as f:
+                    f.write("other\n")
+                os.replace(path + ".other", path)
+                assert store.get_count() == 6
+            yield page
+
+    monkeypatch.setattr(store, "iter_items", pages_with_concurrent_publish)
+    assert store.rebuild(batch_size=2)["items"] == 6
+    assert store.get_count() == 6 and not store.refresh()
+
+def test_own_writes_do_not_reopen(store):
+    add(store, ["a"], [chunk("a.pdf", 1)])
+    assert not store.refresh()
+    store.rebuild()
+    assert not store.refresh()
+
+def test_stats_orphans_and_delete_document(store, tmp_path):
+    source = tmp_path / "kept.pdf"
+    source.write_bytes(b"%PDF")
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    (image_dir / "kept_p1_0.png").write_bytes(b"png")
+    (image_dir / "stray.png").write_bytes(b"png")
+    add(store, ["k1", "k2", "g1"], [
+        chunk(str(source), 1),
+        chunk(str(source), 1, "image", image_path=str(image_dir / "kept_p1_0.png")),
+        chunk(str(tmp_path / "gone.pdf"), 2),
+    ])
+    maintenance = CollectionMaintenance(store, processed_dir=str(tmp_path / "processed"), image_dir=str(image_dir))
+
+    stats = maintenance.stats()
+    assert stats["total"] == 3 and stats["modalities"] == {"text": 2, "image": 1}
+    assert stats["documents"][str(source)] == {"total": 2, "text": 1, "image": 1}
+
+    report = maintenance.find_orphans()
+    assert [o["id"] for o in report["orphans"]] == ["g1"] and report["unreferenced_images"] == ["stray.png"]
+    assert maintenance.delete_orphans()["deleted"] == 1
+
+    # Deleting by file name resolves the stored path
+    result = maintenance.delete_document("kept.pdf")
+    assert result["sources"] == [str(source)] and result["deleted"] == 2
+    assert store.get_count() == 0
+
+def test_delete_orphans_refuses_to_empty_the_collection(store, tmp_path):
+    add(store, ["x"], [chunk(str(tmp_path / "gone.pdf"), 1)])
+    maintenance = CollectionMaintenance(store, processed_dir=str(tmp_path / "processed"))
+    with pytest.raises(ValueError):
+        maintenance.delete_orphans()
+    assert maintenance.delete_orphans(force=True)["deleted"] == 1
+
+def test_rebuild_keeps_live_chunks(store, tmp_path):
+    add(store, ["a", "b", "c"], [chunk("a.pdf", 1), chunk("a.pdf", 2), chunk("b.pdf", 1)])
+    store.delete(where={"source": "b.pdf"})
+    result = CollectionMaintenance(store, processed_dir=str(tmp_path / "processed")).rebuild()
+    assert result["items"] == 2
+    assert sorted(store.get_items(where={"source": "a.pdf"})) == ["a", "b"]
+
+def test_reingest_after_delete_does_not_flag_own_images_as_duplicates(store, tmp_path):
+    processed = tmp_path / "processed"
+    # The ingest pipeline's index, registered when a.pdf was first ingested
+    dedup_index = PerceptualHashIndex(index_path=str(processed / "phash_index.jsonl"))
+    dedup_index.add(0x0F0F_F0F0_1234_5678, str(processed / "images" / "a_p1_0.png"), "figure", "a.pdf")
+    add(store, ["a_0_image_1"], [chunk("a.pdf", 1, "image", image_path=str(processed / "images" / "a_p1_0.png"))])
+
+    result = CollectionMaintenance(store, processed_dir=str(processed)).delete_document("a.pdf")
+    assert result["deleted"] == 1 and result["images"] == 1
+    # Re-ingesting a.pdf: its figure is new again, not a near-duplicate of the deleted one
+    assert dedup_index.find(0x0F0F_F0F0_1234_5678) is None
+
+def test_rebuild_forgets_images_of_documents_no_longer_indexed(store, tmp_path):
+    dedup_index = PerceptualHashIndex(index_path=str(tmp_path / "phash_index.jsonl"))
+    dedup_index.add(0x1, "a_p1_0.png", "", "a.pdf")
+    dedup_index.add(0xFFFF_0000_FFFF_0000, "b_p1_0.png", "", "b.pdf")
+    add(store, ["a", "b"], [chunk("a.pdf", 1), chunk("b.pdf", 1)])
+    store.delete(ids=["b"])  # e.g. orphans --delete
+
+    result = CollectionMaintenance(store, processed_dir=str(tmp_path), dedup_index=dedup_index).rebuild()
+    assert result["images_forgotten"] == 1 and dedup_index.sources() == {"a.pdf"}
@@ -0,0 +1,79 @@
+import json
+import time
+import logging
+
+import pytest
+
+from src.observability import metrics
+from src.observability.metrics import MetricsRegistry, span, request_id_var
+
+@pytest.fixture
+def registry(monkeypatch):
+    fresh = MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", fresh)
+    return fresh
+
+def test_render_is_prometheus_text(registry):
+    registry.describe("rag_requests_total", "Requests served.")
+    registry.inc("rag_requests_total", labels={"path": "/query", "status": 200})
+    registry.inc("rag_requests_total", 2, labels={"path": "/query", "status": 200})
+    registry.inc("rag_tenant_files_total", 7, labels={"tenant": 'a"b\n'})
+    for value in (0.0078125, 0.5, 20.0, 100.0):
+        registry.observe("rag_latency_seconds", value, buckets=(0.01, 1.0, 30.0))
+
+    lines = registry.render().splitlines()
+    assert lines[:3] == ["# HELP rag_requests_total Requests served.", "# TYPE rag_requests_total counter",
+                         'rag_requests_total{path="/query",status="200"} 3.0']
+    # Label values are escaped
+    assert 'rag_tenant_files_total{tenant="a\\"b\\n"} 7.0' in lines
+    # Buckets are cumulative and end with +Inf == count
+    assert "# TYPE rag_latency_seconds histogram" in lines
+    assert [line for line in lines if line.startswith("rag_latency_seconds_bucket")] == [
+        'rag_latency_seconds_bucket{le="0.01"} 1',
+        'rag_latency_seconds_bucket{le="1.0"} 2',
+        'rag_latency_seconds_bucket{le="30.0"} 3',
+        'rag_latency_seconds_bucket{le="+Inf"} 4',
+    ]
+    assert "rag_latency_seconds_count 4" in lines and "rag_latency_seconds_sum 120.5078125" in lines
+
+def test_nested_spans_record_each_stage_and_errors_only_where_raised(registry, caplog):
+    token = request_id_var.set("req-1")
+    try:
+        with caplog.at_level(logging.DEBUG, logger="rag.trace"):
+            with pytest.raises(ValueError):
+                with span("query"):
+                    with span("encode", modality="text"):
+                        time.sleep(0.01)
+                    with span("search"):
+                        raise ValueError("boom")
+    finally:
+        request_id_var.reset(token)
+
+    histograms = registry.snapshot()["histograms"]["rag_stage_duration_seconds"]
+    outer = histograms[(("stage", "query"),)]
+    inner = histograms[(("modality", "text"), ("stage", "encode"))]
+    assert outer["count"] == inner["count"] == 1 and outer["sum"] >= inner["sum"] >= 0.01
+    # The error is counted for the stage that raised and every stage it propagated through
+    errors = registry.snapshot()["counters"]["rag_stage_errors_total"]
+    assert errors == {(("stage", "search"),): 1.0, (("stage", "query"),): 1.0}
+
+    # Inner spans finish (and are logged) first, all with the request ID
+    records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "rag.trace"]
+    assert [r["stage"] for r in records] == ["encode", "search", "query"]
+    assert [r["status"] for r in records] == ["ok", "error", "error"]
+    assert {r["request_id"] for r in records} == {"req-1"}
+
+def test_metrics_endpoint_serves_the_registry(registry, monkeypatch, tmp_path):
+    # The API builds its index on import; keep it out of the working tree
+    monkeypatch.setenv("VECTOR_DB_PATH", str(tmp_path / "chroma"))
+    monkeypatch.setenv("PROCESSED_DATA_PATH", str(tmp_path / "processed"))
+    main = pytest.importorskip("src.api.main")
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main, "registry", registry)
+    client = TestClient(main.app)
+    assert client.get("/").status_code == 200
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    # Labelled by route template, with the request before this one already counted
+    assert 'rag_http_requests_total{method="GET",path="/",status="200"} 1.0' in response.text.splitlines()
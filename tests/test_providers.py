@@ -0,0 +1,86 @@
+import pytest
+
+from src.generation.providers import (
+    get_provider, GroqProvider, OpenAICompatibleProvider, StubProvider, LLMProvider
+)
+from src.generation.generator import MultimodalGenerator
+
+PROMPT = [{"type": "text", "text": "What is attention?"}]
+
+class RecordingProvider(StubProvider):
+    """
+    Stub provider that keeps the content parts of every call.
+    """
+    def __init__(self, model_name):
+        super().__init__(model_name=model_name, latency_s=0)
+        self.calls = []
+
+    def complete(self, system_prompt, human_content, timeout=None):
+        self.calls.append(human_content)
+        return super().complete(system_prompt, human_content, timeout)
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.content}}]}
+
+def test_provider_is_selected_by_name_then_env(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "stub")
+    assert isinstance(get_provider(), StubProvider)
+    monkeypatch.setenv("LLM_BASE_URL", "http://llm.local:8080/v1/")
+    provider = get_provider("OpenAI", model_name="qwen")
+    assert isinstance(provider, OpenAICompatibleProvider)
+    assert provider.base_url == "http://llm.local:8080/v1" and provider.model_name == "qwen"
+    with pytest.raises(ValueError, match="groq, openai, stub"):
+        get_provider("bedrock")
+
+def test_groq_is_the_default(monkeypatch):
+    pytest.importorskip("langchain_groq")
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    assert isinstance(get_provider(), GroqProvider)
+
+def test_vision_is_guessed_from_the_model_name_unless_overridden(monkeypatch):
+    monkeypatch.delenv("LLM_SUPPORTS_VISION", raising=False)
+    assert LLMProvider("meta-llama/llama-4-scout-17b").supports_vision
+    assert not LLMProvider("llama-3.1-8b-instant").supports_vision
+    monkeypatch.setenv("LLM_SUPPORTS_VISION", "true")
+    assert LLMProvider("llama-3.1-8b-instant").supports_vision
+    monkeypatch.setenv("LLM_SUPPORTS_VISION", "false")
+    assert not LLMProvider("gpt-4o").supports_vision
+
+def test_text_only_models_fall_back_to_the_ocr_text(tmp_path, monkeypatch):
+    monkeypatch.delenv("LLM_SUPPORTS_VISION", raising=False)
+    image = tmp_path / "figure.png"
+    image.write_bytes(b"\x89PNG")
+    items = [{"content": "", "metadata": {"source": "a.pdf", "page_number": 2, "content_type": "image",
+                                          "image_path": str(image), "ocr_text": "softmax(QK^T)"}}]
+    for model, parts in (("llama-3.1-8b-instant", ["text"]), ("llama-4-scout", ["text", "image_url"])):
+        provider = RecordingProvider(model)
+        answer = MultimodalGenerator(provider=provider).generate_answer("What is attention?", items)
+        assert answer["answer"].startswith("STUB ANSWER")
+        assert [part["type"] for part in provider.calls[0]] == parts
+        assert "softmax(QK^T)" in provider.calls[0][0]["text"]
+
+def test_openai_compatible_provider_sends_plain_text_as_a_string(monkeypatch):
+    provider = OpenAICompatibleProvider(model_name="local", base_url="http://llm.local/v1", timeout=30)
+    sent = []
+    monkeypatch.setattr(provider.session, "post", lambda url, json, timeout: (sent.append((url, json, timeout)),
+                                                                              Response("ok"))[1])
+    assert provider.complete("system", PROMPT, timeout=5) == "ok"
+    image_part = {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AAAA"}}
+    provider.complete("system", PROMPT + [image_part])
+
+    (url, text_only, timeout), (_, with_image, default_timeout) = sent
+    assert url == "http://llm.local/v1/chat/completions" and (timeout, default_timeout) == (5, 30)
+    assert text_only["messages"][1]["content"] == "What is attention?"
+    assert with_image["messages"][1]["content"] == PROMPT + [image_part]
+
+def test_stub_provider_is_deterministic():
+    provider = get_provider("stub", latency_s=0)
+    assert provider.complete("system", PROMPT) == provider.complete("other", PROMPT) == "STUB ANSWER\nWhat is attention?"
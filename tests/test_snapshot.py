@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+
+from src.vector_store import snapshot as snapshot_module
+from src.vector_store.chroma_manager import ChromaManager
+from src.vector_store.snapshot import SnapshotError, export_snapshot, import_snapshot, inspect_snapshot
+from src.vector_store.table_store import tables_path
+from src.ingestion.image_dedup import INDEX_FILENAME
+
+def phash_entry(image_path, source, chunk_id, phash=1):
+    return json.dumps({"hash": phash, "image_path": str(image_path), "ocr_text": "", "source": source,
+                       "chunk_id": chunk_id}) + "\n"
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANONYMIZED_TELEMETRY", "False")
+    managers = []
+
+    def open_store(name):
+        manager = ChromaManager(persist_directory=str(tmp_path / name / "chroma"), collection_name="test")
+        managers.append(manager)
+        return manager
+    yield open_store
+    for manager in managers:
+        manager.close()
+
+@pytest.fixture
+def snapshot(tmp_path, stores):
+    """
+    A primary with 2500 chunks (three item frames), one image, a table sidecar and a near-duplicate
+    index, exported with images.
+    """
+    primary = stores("primary")
+    processed = tmp_path / "primary" / "processed"
+    (processed / "images").mkdir(parents=True)
+    image = processed / "images" / "doc_p1_0.png"
+    image.write_bytes(b"primary image")
+    tables_path(str(processed)).write_text('{"table_id": "t1"}\n', encoding="utf-8")
+    (processed / INDEX_FILENAME).write_text(phash_entry(image, "doc.pdf", "c0"), encoding="utf-8")
+
+    ids = [f"c{i}" for i in range(2500)]
+    metadatas = [{"source": "doc.pdf", "page_number": 1, "content_type": "text"} for _ in ids]
+    metadatas[0] = {"source": "doc.pdf", "page_number": 1, "content_type": "image", "image_path": str(image)}
+    embeddings = [[float(i % 7), float(i % 11), 1.0] for i in range(len(ids))]
+    for start in range(0, len(ids), 500):
+        primary.add_embeddings(ids[start:start + 500], embeddings[start:start + 500],
+                               metadatas[start:start + 500], ids[start:start + 500])
+    path = tmp_path / "index.ragsnap"
+    export_snapshot(primary, str(path), "model-a", include_images=True, processed_dir=str(processed))
+    return path
+
+@pytest.fixture
+def replica(tmp_path, stores):
+    replica = stores("replica")
+    replica.add_embeddings(["old"], [[0.0, 0.0, 1.0]], [{"source": "old.pdf"}], ["old"])
+    processed = tmp_path / "replica" / "processed"
+    (processed / "images").mkdir(parents=True)
+    (processed / "images" / "doc_p1_0.png").write_bytes(b"replica image")
+    (processed / INDEX_FILENAME).write_text(phash_entry(processed / "images" / "old.png", "old.pdf", "old"), encoding="utf-8")
+    return replica, processed
+
+def test_round_trip(snapshot, replica):
+    store, processed = replica
+    assert inspect_snapshot(str(snapshot))["items"] == 2500
+
+    result = import_snapshot(store, str(snapshot), embedding_model="model-a", processed_dir=str(processed))
+    assert result["items"] == 2500 and store.get_count() == 2500
+    image = processed / "images" / "doc_p1_0.png"
+    assert image.read_bytes() == b"primary image"
+    assert store.get_items(ids=["c0"])["c0"]["metadata"]["image_path"] == str(image)
+    assert tables_path(str(processed)).read_text(encoding="utf-8") == '{"table_id": "t1"}\n'
+    # The near-duplicate index is the primary's, keyed by where its image now lives
+    assert (processed / INDEX_FILENAME).read_text(encoding="utf-8") == phash_entry(image, "doc.pdf", "c0")
+    assert not list(processed.glob(".snapshot*")) and not list(processed.glob("*.snapshot"))
+
+def test_files_are_streamed_in_blocks(tmp_path, stores, replica, monkeypatch):
+    monkeypatch.setattr(snapshot_module, "FILE_BLOCK_SIZE", 4)
+    primary = stores("primary")
+    processed = tmp_path / "primary" / "processed"
+    (processed / "images").mkdir(parents=True)
+    image = processed / "images" / "doc_p1_0.png"
+    image.write_bytes(bytes(range(256)) * 3)
+    primary.add_embeddings(["c0"], [[1.0, 0.0, 0.0]],
+                           [{"source": "doc.pdf", "page_number": 1, "content_type": "image", "image_path": str(image)}], ["c0"])
+    path = tmp_path / "blocks.ragsnap"
+    export_snapshot(primary, str(path), "model-a", include_images=True, processed_dir=str(processed))
+
+    store, replica_processed = replica
+    import_snapshot(store, str(path), embedding_model="model-a", processed_dir=str(replica_processed))
+    assert (replica_processed / "images" / "doc_p1_0.png").read_bytes() == image.read_bytes()
+    # The primary had no sidecars, so the replica's are gone rather than left pointing at removed chunks
+    assert not (replica_processed / INDEX_FILENAME).exists() and not tables_path(str(replica_processed)).exists()
+
+def assert_untouched(store, processed):
+    assert store.get_count() == 1 and list(store.get_items(ids=["old", "c0"])) == ["old"]
+    assert (processed / "images" / "doc_p1_0.png").read_bytes() == b"replica image"
+    assert not tables_path(str(processed)).exists()
+    assert (processed / INDEX_FILENAME).read_text(encoding="utf-8") == phash_entry(processed / "images" / "old.png", "old.pdf", "old")
+    assert not list(processed.glob(".snapshot*")) and not list(processed.glob("*.snapshot"))
+
+@pytest.mark.parametrize("damage", ["flip_vector_byte", "flip_image_byte", "flip_sha256", "truncate"])
+def test_corrupt_snapshot_is_rejected_and_live_index_unchanged(snapshot, replica, damage):
+    store, processed = replica
+    data = bytearray(snapshot.read_bytes())
+    if damage == "flip_vector_byte":
+        data[len(data) // 2] ^= 0xFF
+    elif damage == "flip_image_byte":
+        data[data.index(b"primary image")] ^= 0xFF
+    elif damage == "flip_sha256":
+        # Every frame passes its CRC; only the trailer catches it, after the image was read
+        data[-1] ^= 0xFF
+    else:
+        data = data[:-20]
+    snapshot.write_bytes(bytes(data))
+
+    with pytest.raises(SnapshotError):
+        import_snapshot(store, str(snapshot), embedding_model="model-a", processed_dir=str(processed))
+    assert_untouched(store, processed)
+
+def test_snapshot_of_another_model_is_rejected(snapshot, replica):
+    store, processed = replica
+    with pytest.raises(SnapshotError):
+        import_snapshot(store, str(snapshot), embedding_model="model-b", processed_dir=str(processed))
+    assert_untouched(store, processed)
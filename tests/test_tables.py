@@ -0,0 +1,167 @@
+import threading
+
+import pytest
+
+from src.ingestion.tables import parse_table_html, table_chunks, serialize_row, render_table, plausible_table
+from src.vector_store.table_store import TableStore
+
+HEADER = ["Model", "BLEU EN-DE", "BLEU EN-FR", "Training Cost (FLOPs) EN-DE", "Training Cost (FLOPs) EN-FR"]
+ROWS = [
+    ["ByteNet [18]", "23.75", "", "", ""],
+    ["GNMT + RL [38]", "24.6", "39.92", "2.3·10^19", "1.4·10^20"],
+    ["ConvS2S [9]", "25.16", "40.46", "9.6·10^18", "1.5·10^20"],
+    ["Transformer (base model)", "27.3", "38.1", "3.3·10^18", "3.3·10^18"],
+    ["Transformer (big)", "28.4", "41.8", "2.3·10^19", "2.3·10^19"],
+]
+CAPTION = "Table 2: The Transformer achieves better BLEU scores than previous state-of-the-art models."
+TABLE_ID = "attention.pdf_p8_tbl_0"
+
+def ingest_table(max_cells=8):
+    """
+    Table 2 of "Attention Is All You Need" as the pipeline indexes it: chunk IDs, row chunks
+    and the row-wise table for the table store.
+    """
+    chunks = table_chunks({"header": HEADER, "rows": ROWS}, "attention.pdf", 8, "attention.pdf", TABLE_ID,
+                          caption=CAPTION, max_cells=max_cells)
+    ids = [f"attention.pdf_{i}_table_8" for i in range(len(chunks))]
+    row_ids = {}
+    for chunk, chunk_id in zip(chunks, ids):
+        row_ids.setdefault(chunk["metadata"].get("row_index"), chunk_id)
+    table = dict(chunks[0]["table"], row_ids=[row_ids[i] for i in range(len(ROWS))])
+    return chunks, ids, table
+
+@pytest.fixture
+def store(tmp_path):
+    store = TableStore(str(tmp_path / "tables.jsonl"))
+    store.add_tables([ingest_table()[2]])
+    return store
+
+def test_parse_table_html_joins_stacked_headers_and_expands_spans():
+    html = ("<table><thead><tr><th>Model</th><th colspan='2'>BLEU</th></tr>"
+            "<tr><th></th><th>EN-DE</th><th>EN-FR</th></tr></thead>"
+            "<tbody><tr><td>Transformer (big)</td><td>28.4</td><td>41.8</td></tr></tbody></table>")
+    table = parse_table_html(html)
+    assert table == {"header": ["Model", "BLEU EN-DE", "BLEU EN-FR"], "rows": [["Transformer (big)", "28.4", "41.8"]]}
+    assert plausible_table(table)
+
+def test_rows_become_self_describing_chunks():
+    chunks, _, _ = ingest_table(max_cells=3)
+    summary, rows = chunks[0], chunks[1:]
+    assert summary["metadata"]["element_type"] == "Table" and summary["table"]["rows"] == ROWS
+    assert "Transformer (big)" in summary["content"]
+    # Five columns in groups of three cells: every group repeats the row label
+    big = [c["content"] for c in rows if c["metadata"]["row_index"] == 4]
+    assert big == [
+        serialize_row(["Model", "BLEU EN-DE", "BLEU EN-FR"], ["Transformer (big)", "28.4", "41.8"], CAPTION),
+        serialize_row(["Model", "Training Cost (FLOPs) EN-DE", "Training Cost (FLOPs) EN-FR"],
+                      ["Transformer (big)", "2.3·10^19", "2.3·10^19"], CAPTION),
+    ]
+    assert big[0].startswith("Model: Transformer (big); BLEU EN-DE: 28.4; BLEU EN-FR: 41.8 (Table 2:")
+    assert "..." in render_table({"caption": CAPTION, "header": HEADER, "rows": ROWS}, max_chars=150)
+
+def test_lookup_finds_the_cell(store):
+    best = store.lookup("BLEU score of Transformer big")[0]
+    assert (best["column"], best["value"], best["row"]) == ("BLEU EN-DE", "28.4", 4)
+    assert best["score"] == 0.75
+    best = store.lookup("What is the training cost of the big Transformer model?")[0]
+    assert (best["column"], best["value"]) == ("Training Cost (FLOPs) EN-DE", "2.3·10^19")
+    assert store.lookup("EN-FR BLEU of ConvS2S")[0]["value"] == "40.46"
+
+@pytest.mark.parametrize("query", [
+    "How does the Transformer model work?",
+    "Explain the Transformer model architecture",
+    "Summarize the big Transformer model",
+    "Why is ConvS2S slower than the Transformer?",
+])
+def test_prose_questions_about_a_listed_model_do_not_route(store, query):
+    # The label column ("Model") is not a metric: naming a model alone must not hit the table
+    assert store.lookup(query) == []
+
+def test_tables_persist_and_are_removed_per_document(store, tmp_path):
+    reopened = TableStore(str(tmp_path / "tables.jsonl"))
+    assert len(reopened) == 1 and reopened.lookup("BLEU EN-DE of ByteNet")[0]["value"] == "23.75"
+    assert store.remove_sources(["attention.pdf"]) == 1
+    # The other instance reloads the compacted file
+    assert len(reopened) == 0 and reopened.lookup("BLEU EN-DE of ByteNet") == []
+
+def test_retriever_merges_table_rows_with_vector_hits(store):
+    retriever_module = pytest.importorskip("src.retrieval.retriever")
+    from benchmarks.fakes import HashingEmbedder, InMemoryVectorStore
+
+    embedder, vector_store = HashingEmbedder(dim=64), InMemoryVectorStore()
+    chunks, ids, _ = ingest_table()
+    prose = ["The Transformer model relies entirely on attention to draw global dependencies.",
+             "The big Transformer model uses 6 layers with d_model 1024 and 16 attention heads."]
+    texts = [c["content"] for c in chunks] + prose
+    metadatas = [c["metadata"] for c in chunks] + [{"source": "attention.pdf", "page_number": 2, "content_type": "text"}] * 2
+    vector_store.add_embeddings(ids + ["prose_0", "prose_1"], embedder.encode_text(texts).tolist(), metadatas, texts)
+    retriever = retriever_module.MultimodalRetriever(embedder, vector_store, expand_mode="off", table_store=store,
+                                                     table_min_score=0.6)
+
+    # A prose question about a model named in the table goes through the vector path only
+    hits = retriever.retrieve("How does the Transformer model work?", n_results=3)
+    assert len(hits) == 3 and not any("table_cells" in hit for hit in hits)
+
+    # A table lookup puts the row first, keeps vector hits behind it and does not repeat the row chunk
+    hits = retriever.retrieve("BLEU score of Transformer big", n_results=4)
+    assert hits[0]["table_cells"][0] == {"column": "BLEU EN-DE", "value": "28.4"}
+    assert len(hits) == 4 and len({hit["id"] for hit in hits}) == 4
+    assert any("table_cells" not in hit for hit in hits)
+
+    batch = retriever.retrieve_batch(["How does the Transformer model work?", "BLEU score of Transformer big"], n_results=4)
+    assert not any("table_cells" in hit for hit in batch[0]) and "table_cells" in batch[1][0]
+
+def test_full_table_matches_skip_the_vector_search(store):
+    retriever_module = pytest.importorskip("src.retrieval.retriever")
+    from benchmarks.fakes import HashingEmbedder, InMemoryVectorStore
+
+    class CountingEmbedder(HashingEmbedder):
+        calls = []
+        def encode_text(self, texts):
+            self.calls.append(texts)
+            return super().encode_text(texts)
+
+    embedder, vector_store = CountingEmbedder(dim=64), InMemoryVectorStore()
+    vector_store.add_embeddings(["prose_0"], embedder.encode_text(["The Transformer model relies on attention."]).tolist(),
+                                [{"source": "attention.pdf", "page_number": 2, "content_type": "text"}], ["prose"])
+    embedder.calls.clear()
+    retriever = retriever_module.MultimodalRetriever(embedder, vector_store, expand_mode="off", table_store=store,
+                                                     table_min_score=0.6)
+
+    # Every term matched in a single table: the rows are the answer, nothing is encoded
+    hits = retriever.retrieve("BLEU EN-DE of Transformer big", n_results=4)
+    assert [hit["table_cells"][0]["value"] for hit in hits] == ["28.4", "27.3"] and embedder.calls == []
+
+    # A partial match still searches and merges
+    hits = retriever.retrieve("BLEU score of Transformer big", n_results=4)
+    assert embedder.calls == ["BLEU score of Transformer big"] and hits[-1]["id"] == "prose_0"
+
+    # In a batch only the queries without a full table answer are encoded, in one pass
+    embedder.calls.clear()
+    batch = retriever.retrieve_batch(["BLEU EN-DE of Transformer big", "How does the Transformer model work?"], n_results=4)
+    assert embedder.calls == [["How does the Transformer model work?"]]
+    assert batch[0][0]["table_cells"][0]["value"] == "28.4" and batch[1][0]["id"] == "prose_0"
+
+def test_lookup_during_concurrent_reindex_sees_a_consistent_table_set(store, tmp_path):
+    _, _, table = ingest_table()
+    other = dict(table, table_id="other.pdf_p1_tbl_0", source="other.pdf")
+    stop, errors = threading.Event(), []
+
+    def churn():
+        while not stop.is_set():
+            store.add_tables([other])
+            store.remove_sources(["other.pdf"])
+
+    writer = threading.Thread(target=churn)
+    writer.start()
+    try:
+        for _ in range(300):
+            try:
+                for cell in store.lookup("BLEU EN-DE of Transformer big", limit=8):
+                    assert cell["table"]["data"][0][cell["row"]].startswith("Transformer")
+            except KeyError as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join()
+    assert errors == []
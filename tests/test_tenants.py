@@ -0,0 +1,92 @@
+import time
+import threading
+
+import pytest
+
+from src.ingestion.scheduler import IngestScheduler, IngestQueueFull
+from src.vector_store.tenants import TenantPool, validate_tenant_id, DEFAULT_TENANT
+
+class Resource:
+    def __init__(self, tenant_id):
+        self.tenant_id = tenant_id
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_validate_tenant_id():
+    assert validate_tenant_id(None) == DEFAULT_TENANT
+    assert validate_tenant_id("acme-01") == "acme-01"
+    for bad in ("Acme", "-acme", "acme_", "a/b", "x" * 49):
+        with pytest.raises(ValueError):
+            validate_tenant_id(bad)
+
+def test_pool_evicts_least_recently_used_but_not_pinned_or_busy():
+    busy = {"b"}
+    pool = TenantPool(Resource, max_open=2, is_busy=lambda t: t in busy)
+    pool.pin(DEFAULT_TENANT, Resource(DEFAULT_TENANT))
+    a = pool.get("a")
+    b = pool.get("b")  # over the limit, but "a" is the only candidate
+    assert a.closed and pool.open_tenants() == [DEFAULT_TENANT, "b"]
+    pool.get("c")  # "b" is busy: nothing can be closed yet
+    assert not b.closed and pool.open_tenants() == [DEFAULT_TENANT, "b", "c"]
+    busy.clear()
+    pool.get("a")
+    assert b.closed and pool.open_tenants() == [DEFAULT_TENANT, "a"]
+
+def test_held_tenant_is_not_evicted_until_the_scheduler_has_it():
+    scheduler = IngestScheduler(lambda tenant_id, path: time.sleep(0.05), workers=1)
+    pool = TenantPool(Resource, max_open=1, is_busy=scheduler.busy)
+    with pool.hold("a") as a:
+        pool.get("b")  # another request opens a tenant before "a" has any queued work
+        assert not a.closed
+        scheduler.submit("a", ["a-0"])
+    pool.get("c")  # "a" is busy now, "b" goes instead
+    assert not a.closed and "a" in pool.open_tenants()
+    assert scheduler.wait(timeout=10)
+    pool.get("d")
+    assert a.closed
+
+def test_pool_opens_each_tenant_once_under_concurrency():
+    opened = []
+
+    def opener(tenant_id):
+        opened.append(tenant_id)
+        time.sleep(0.05)
+        return Resource(tenant_id)
+
+    pool = TenantPool(opener, max_open=4)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get("a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert opened == ["a"] and len({id(r) for r in results}) == 1
+
+def test_scheduler_interleaves_tenants_and_enforces_quota():
+    order = []
+    scheduler = IngestScheduler(lambda tenant_id, path: (time.sleep(0.01), order.append(path)), workers=1, max_queued=20)
+    scheduler.submit("big", [f"big-{i}" for i in range(10)])
+    scheduler.submit("small", ["small-0", "small-1"])
+    assert scheduler.submit("small", ["small-1"]) == []  # already waiting
+    with pytest.raises(IngestQueueFull):
+        scheduler.submit("big", [f"more-{i}" for i in range(15)])
+    assert scheduler.wait(timeout=10)
+    # The small tenant's files are not stuck behind the big tenant's backlog
+    assert order.index("small-1") <= 4
+    assert len(order) == 12 and not scheduler.busy("big")
+
+def test_scheduler_finishes_each_job_once_its_queue_is_drained():
+    events = []
+    scheduler = IngestScheduler(lambda tenant_id, path: (time.sleep(0.01), events.append(path)), workers=1,
+                                on_drained=lambda tenant_id: events.append(f"done-{tenant_id}"))
+    scheduler.submit("a", ["a-0", "a-1", "a-2"])
+    scheduler.submit("b", ["b-0"])
+    assert scheduler.wait(timeout=10)
+    # One finish per tenant, after that tenant's last file
+    assert events.count("done-a") == 1 and events.count("done-b") == 1
+    assert events.index("done-a") > events.index("a-2") and events.index("done-b") > events.index("b-0")
+    scheduler.submit("a", ["a-3"])
+    assert scheduler.wait(timeout=10)
+    assert events[-2:] == ["a-3", "done-a"]